@@ -1,52 +1,268 @@
 from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
+from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity, current_user
 from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 import os
 from dotenv import load_dotenv
-import random
 import json
+import csv
+import io
 from datetime import datetime, timedelta
+import math
 import time
 import threading
-import queue
+import click
+import hmac
+from functools import wraps
 from extensions import db
+from catalog import GameCatalog
+from dbpool import engine_options, pool_stats
+from metrics import Metrics
+import querybudget
+from querybudget import query_budget
+from events import EventHub
+from event_backends import EventBroker, create_backend
+from membership import RoomMembership
+from rooms import RoomEngine
+from passwords import PasswordHasher, PasswordHasherBusy
+from profiles import ProfileCache
+from replica import ReplicaGuard, read_replica
+import partitions
+from pagination import InvalidCursor, decode_cursor, encode_cursor, page_size
+import wheel
+import roulette_rules
 
 # Load environment variables from .env file
 load_dotenv()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
 
     # PostgreSQL configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Connection pool per worker process; see dbpool.engine_options
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a connection
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+    app.config['DB_STATEMENT_TIMEOUT'] = int(os.getenv('DB_STATEMENT_TIMEOUT', 30000))  # ms, 0 = none
+    # Connect through PgBouncer in transaction pooling mode
+    app.config['DB_PGBOUNCER'] = os.getenv('DB_PGBOUNCER', '0') == '1'
+    # Optional replica for the read-only routes (see replica.ReplicaGuard):
+    # a user's reads stay on the primary for REPLICA_READ_YOUR_WRITES seconds
+    # after their own write, and all reads do while it lags by more than
+    # REPLICA_MAX_LAG seconds
+    app.config['REPLICA_DATABASE_URI'] = os.getenv('REPLICA_DATABASE_URI')
+    app.config['REPLICA_READ_YOUR_WRITES'] = float(os.getenv('REPLICA_READ_YOUR_WRITES', 5))
+    app.config['REPLICA_MAX_LAG'] = float(os.getenv('REPLICA_MAX_LAG', 5))
+    app.config['REPLICA_LAG_CHECK_INTERVAL'] = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 1))
+    # Check requests against their route's @query_budget: raise (tests),
+    # warn (staging) or unset; QUERY_REPEAT_LIMIT flags N+1 loops
+    app.config['QUERY_BUDGETS'] = os.getenv('QUERY_BUDGETS')
+    app.config['QUERY_REPEAT_LIMIT'] = int(os.getenv('QUERY_REPEAT_LIMIT', querybudget.REPEAT_LIMIT))
+    # Shared secret for /internal/* (X-Internal-Token); unset = loopback only
+    app.config['INTERNAL_TOKEN'] = os.getenv('INTERNAL_TOKEN')
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key')  # Change in production
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+    app.config['HISTORY_PAGE_SIZE'] = int(os.getenv('HISTORY_PAGE_SIZE', 50))
+    app.config['HISTORY_MAX_PAGE_SIZE'] = int(os.getenv('HISTORY_MAX_PAGE_SIZE', 200))
+    # bcrypt work factor for new hashes; older hashes are upgraded on login
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    # Processes per worker for password hashing (0 = hash in the request)
+    # and how many logins may queue for them before /login answers 503.
+    # Every gunicorn worker has its own pool, so they share the CPUs
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv(
+        'PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 1) // int(os.getenv('WEB_CONCURRENCY', 1)))))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 0)) or None
+    app.config['PASSWORD_HASH_WAIT'] = float(os.getenv('PASSWORD_HASH_WAIT', 2))
+    # Seconds a cached profile (current_user) may be served, and how many
+    app.config['PROFILE_CACHE_TTL'] = float(os.getenv('PROFILE_CACHE_TTL', 2))
+    app.config['PROFILE_CACHE_SIZE'] = int(os.getenv('PROFILE_CACHE_SIZE', 10000))
+    app.config['USERS_PAGE_SIZE'] = int(os.getenv('USERS_PAGE_SIZE', 100))
+    app.config['USERS_MAX_PAGE_SIZE'] = int(os.getenv('USERS_MAX_PAGE_SIZE', 1000))
+    app.config['USERS_EXPORT_BATCH_SIZE'] = int(os.getenv('USERS_EXPORT_BATCH_SIZE', 1000))
+    app.config['SPIN_BATCH_MAX'] = int(os.getenv('SPIN_BATCH_MAX', 100))  # spins per play-batch request
+    app.config['GAME_CATALOG_CHECK_INTERVAL'] = float(os.getenv('GAME_CATALOG_CHECK_INTERVAL', 30))
+    app.config['GAME_CATALOG_MISS_INTERVAL'] = float(os.getenv('GAME_CATALOG_MISS_INTERVAL', 1))
+    app.config['SSE_HEARTBEAT_INTERVAL'] = float(os.getenv('SSE_HEARTBEAT_INTERVAL', 15))
+    app.config['SSE_QUEUE_SIZE'] = int(os.getenv('SSE_QUEUE_SIZE', 1000))
+    app.config['SSE_REPLAY_BUFFER'] = int(os.getenv('SSE_REPLAY_BUFFER', 256))  # events kept per room
+    app.config['EVENT_BACKEND'] = os.getenv('EVENT_BACKEND', 'local')  # local, postgres or unix
+    app.config['EVENT_BACKEND_URL'] = os.getenv('EVENT_BACKEND_URL')
+    app.config['EVENT_CHANNEL'] = os.getenv('EVENT_CHANNEL', 'game_events')
+    # Keep live roulette rounds in memory and checkpoint them in the
+    # background; single worker only (see rooms.RoomEngine), so it is opt-in
+    app.config['ROOM_WRITE_BEHIND'] = os.getenv('ROOM_WRITE_BEHIND', '0') == '1'
+    app.config['ROOM_CHECKPOINT_INTERVAL'] = float(os.getenv('ROOM_CHECKPOINT_INTERVAL', 0.05))
+
+    # Overrides for scripts and benchmarks (e.g. a scratch database URI)
+    if config:
+        app.config.update(config)
+    # The bet rollup is written with INSERT ... ON CONFLICT (see stats.py)
+    from stats import UPSERTS
+    backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend not in UPSERTS:
+        raise ValueError(f"Unsupported database {backend!r}; use one of: {', '.join(UPSERTS)}")
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    if app.config['REPLICA_DATABASE_URI']:
+        replica_config = dict(app.config, SQLALCHEMY_DATABASE_URI=app.config['REPLICA_DATABASE_URI'])
+        app.config.setdefault('SQLALCHEMY_BINDS', {}).setdefault('replica', {
+            'url': app.config['REPLICA_DATABASE_URI'],
+            **engine_options(replica_config),
+        })
 
     # Initialize extensions with app
     db.init_app(app)
+
+    # Request timings and SQL counts, served with the rest on /metrics
+    metrics = Metrics()
+    metrics.init_app(app)
+    app.extensions['metrics'] = metrics
+    querybudget.init_app(app)
     
     # Import models here to avoid circular imports
-    from models import User, Transaction, GameSession, Game, SpinAndWin, RussianRoulette, Multiplayer, BetHistory, Room, RoomSession
+    from models import User, GameSession, Game, SpinAndWin, RussianRoulette, Multiplayer, BetHistory, Room, RoomSession
+    from stats import user_stats, record_bet, record_bets, record_payouts, rebuild_user_game_stats, check_user_game_stats
+    import wallet
     
     migrate = Migrate(app, db)  # Add Flask-Migrate
-    bcrypt = Bcrypt(app)  # Add Flask-Bcrypt
     jwt = JWTManager(app)
     CORS(app)
 
-    # Game event management (replacing SocketIO)
-    game_events = {}  # Dictionary to store event queues for each game
+    # Games rarely change: serve lookups from a process-local catalog
+    game_catalog = GameCatalog(app.config['GAME_CATALOG_CHECK_INTERVAL'], app.config['GAME_CATALOG_MISS_INTERVAL'])
+    app.extensions['game_catalog'] = game_catalog
+
+    # Game event management (replacing SocketIO). The backend carries
+    # messages to every worker; the default only reaches this process.
+    event_hub = EventHub(app.config['SSE_HEARTBEAT_INTERVAL'], app.config['SSE_QUEUE_SIZE'],
+                         create_backend(app.config), app.config['SSE_REPLAY_BUFFER'])
+    app.extensions['event_hub'] = event_hub
+
+    # Who is in which room right now; broadcasts read this, not game_sessions
+    room_membership = RoomMembership()
+    room_membership.attach(event_hub)
+    app.extensions['room_membership'] = room_membership
+
+    # Each worker resolves the recipients against its own index: a room's
+    # events reach its members, the same users they are replayed to
+    event_hub.on('game', lambda payload: event_hub.deliver(
+        room_membership.game_members(payload['game_id']) if payload['room_id'] is None
+        else room_membership.room_members(payload['room_id']),
+        payload['event'], payload['id'], payload['room_id']))
+
+    # current_user is a cached profile snapshot, dropped on balance changes
+    profile_cache = ProfileCache(app.config['PROFILE_CACHE_TTL'], app.config['PROFILE_CACHE_SIZE'])
+    profile_cache.attach(event_hub)
+    app.extensions['profile_cache'] = profile_cache
+
+    @jwt.user_lookup_loader
+    def load_current_user(_jwt_header, jwt_data):
+        return profile_cache.get(jwt_data[app.config['JWT_IDENTITY_CLAIM']])
+
+    @jwt.user_lookup_error_loader
+    def current_user_not_found(_jwt_header, _jwt_data):
+        return jsonify({"msg": "User not found"}), 404
+
+    # Which reads the replica may serve; idle without REPLICA_DATABASE_URI
+    replica_guard = ReplicaGuard(app.config['REPLICA_READ_YOUR_WRITES'], app.config['REPLICA_MAX_LAG'],
+                                 app.config['REPLICA_LAG_CHECK_INTERVAL'])
+    replica_guard.attach(event_hub)
+    app.extensions['replica_guard'] = replica_guard
+
+    # bcrypt runs in a bounded process pool, off the request's worker
+    password_hasher = PasswordHasher(app.config['BCRYPT_LOG_ROUNDS'], app.config['PASSWORD_HASH_WORKERS'],
+                                     app.config['PASSWORD_HASH_MAX_PENDING'], app.config['PASSWORD_HASH_WAIT'])
+    app.extensions['password_hasher'] = password_hasher
+
+    def hasher_busy():
+        response = jsonify({'message': 'Too many logins right now, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    def internal_only(view):
+        """Operational endpoints: loopback, or X-Internal-Token if INTERNAL_TOKEN is set."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            token = app.config['INTERNAL_TOKEN']
+            if token:
+                # Prometheus sends it as a bearer token
+                sent = request.headers.get('X-Internal-Token') or request.headers.get('Authorization', '')[len('Bearer '):]
+                allowed = hmac.compare_digest(sent, token)
+            else:
+                allowed = request.remote_addr in ('127.0.0.1', '::1')
+            if not allowed:
+                return jsonify({"msg": "Forbidden"}), 403
+            return view(*args, **kwargs)
+        return wrapper
+
+    # Live Russian Roulette rounds; actions on one round run one at a time
+    room_engine = RoomEngine(app.config['ROOM_WRITE_BEHIND'], app.config['ROOM_CHECKPOINT_INTERVAL'])
+    app.extensions['room_engine'] = room_engine
+
+    @metrics.collector
+    def runtime_metrics():
+        yield ('gamehub_sse_connections', 'gauge', 'Open SSE connections.',
+               [({}, event_hub.connection_count())])
+        yield ('gamehub_sse_queued_events', 'gauge', 'Events waiting in SSE connection queues.',
+               [({}, sum(event_hub.queue_depths().values()))])
+        yield ('gamehub_sse_queue_depth_max', 'gauge', 'Events waiting in the longest SSE connection queue.',
+               [({}, event_hub.max_queue_depth())])
+        yield ('gamehub_password_hash_queue_depth', 'gauge', 'Password hashes waiting for or running in the pool.',
+               [({}, password_hasher.queue_depth())])
+        yield ('gamehub_password_hash_rejected_total', 'counter', 'Logins and registrations refused with 503.',
+               [({}, password_hasher.rejected)])
+        yield ('gamehub_profile_cache_hits_total', 'counter', 'current_user lookups served from the cache.',
+               [({}, profile_cache.hits)])
+        yield ('gamehub_profile_cache_misses_total', 'counter', 'current_user lookups read from the database.',
+               [({}, profile_cache.misses)])
+        yield ('gamehub_live_roulette_rounds', 'gauge', 'Russian Roulette rounds held by the room engine.',
+               [({}, room_engine.live_count())])
+        pools = [({'bind': key or 'default'}, pool_stats(engine)) for key, engine in db.engines.items()]
+        pools = [(labels, stats) for labels, stats in pools if 'checked_out' in stats]
+        for name, help_text in (('checked_out', 'Connections in use.'), ('checked_in', 'Idle connections.'),
+                                ('overflow', 'Connections open beyond pool_size.')):
+            yield (f'gamehub_db_pool_{name}', 'gauge', help_text, [(labels, stats[name]) for labels, stats in pools])
+        waits = [(labels, stats['wait_seconds']) for labels, stats in pools if 'wait_seconds' in stats]
+        yield ('gamehub_db_pool_wait_seconds', 'histogram', 'Time to check out a connection.', waits)
+        yield ('gamehub_db_pool_timeouts_total', 'counter', 'Checkouts that gave up after pool_timeout.',
+               [(labels, snapshot['timeouts']) for labels, snapshot in waits])
+
+    with app.app_context():
+        for engine in db.engines.values():
+            metrics.instrument(engine)
+        game_catalog.warm()
+        room_membership.warm()
+        room_engine.warm()
+    room_engine.start(app)
 
     # Root route to check if API is running
     @app.route('/', methods=['GET'])
+    @query_budget(0)
     def home():
         return jsonify({"message": "API is running"}), 200
 
+    @app.route('/metrics', methods=['GET'])
+    @query_budget(0)
+    @internal_only
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/internal/pool', methods=['GET'])
+    @query_budget(0)
+    @internal_only
+    def connection_pool_stats():
+        # Keyed by bind; the default database is "default"
+        return jsonify({key or 'default': pool_stats(engine) for key, engine in db.engines.items()}), 200
+
     # Authentication routes
     @app.route('/register', methods=['POST'])
+    @query_budget(2)
     def register():
         data = request.get_json()
         
@@ -63,6 +279,9 @@ def create_app():
         if existing_user:
             return jsonify({'message': 'User already exists with this email'}), 409
     
+        # Hand the connection back to the pool while bcrypt runs
+        db.session.rollback()
+    
         # Create new user
         new_user = User(
             username=data['username'],
@@ -70,7 +289,10 @@ def create_app():
         )
         
         # Hash the password
-        new_user.password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        try:
+            new_user.password = password_hasher.hash(data['password'])
+        except PasswordHasherBusy:
+            return hasher_busy()
         
         # Save to database
         db.session.add(new_user)
@@ -85,6 +307,7 @@ def create_app():
         return jsonify({'token': token}), 201
 
     @app.route('/login', methods=['POST'])
+    @query_budget(2)
     def login():
         data = request.get_json()
         
@@ -93,12 +316,27 @@ def create_app():
             return jsonify({'message': 'Email and password required'}), 400
         
         # Find user
-        user = User.query.filter_by(email=data['email']).first()
+        user = db.session.query(User.id, User.password, User.username, User.balance) \
+            .filter_by(email=data['email']).first()
+        # Hand the connection back to the pool while bcrypt runs
+        db.session.rollback()
         
         # Check if user exists and password is correct
-        if not user or not bcrypt.check_password_hash(user.password, data['password']):
+        try:
+            valid = user is not None and password_hasher.check(user.password, data['password'])
+        except PasswordHasherBusy:
+            return hasher_busy()
+        if not valid:
             return jsonify({'message': 'Invalid email or password'}), 401
         
+        # Upgrade hashes made with an older scheme or work factor
+        if password_hasher.needs_rehash(user.password):
+            try:
+                User.query.filter_by(id=user.id).update({'password': password_hasher.hash(data['password'])})
+                db.session.commit()
+            except PasswordHasherBusy:
+                pass  # upgraded on a later login
+        
         # Generate token using Flask-JWT-Extended
         access_token = create_access_token(identity=user.id)
         
@@ -109,39 +347,89 @@ def create_app():
             'balance': user.balance
         }), 200
 
-    # Route to get user by ID
+    # Columns /users exposes; never the password hash
+    def user_columns():
+        return db.select(User.id, User.username, User.email, User.balance, User.created_at)
+
+    def user_row(row):
+        return {
+            "id": row.id,
+            "username": row.username,
+            "email": row.email,
+            "balance": row.balance,
+            "created_at": row.created_at.isoformat() if row.created_at else None
+        }
+
+    # List users a page at a time, keyset-paginated on id
     @app.route('/users', methods=['GET'])
+    @query_budget(2)
     @jwt_required()  # Ensure the request is authenticated
+    @read_replica
     def get_all_users():
-        # Fetch all users from the database
-        users = User.query.all()
-
-        # If no users exist, return an empty list
-        if not users:
-            return jsonify([]), 200
-
-        # Return the list of users
-        user_list = []
-        for user in users:
-            user_list.append({
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "balance": user.balance,
-                "created_at": user.created_at.isoformat()
-            })
+        limit = page_size(request.args.get('limit'),
+                          app.config['USERS_PAGE_SIZE'], app.config['USERS_MAX_PAGE_SIZE'])
+
+        query = user_columns()
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                (after_id,) = decode_cursor(cursor, int)
+            except InvalidCursor:
+                return jsonify({"msg": "Invalid cursor"}), 400
+            query = query.where(User.id > after_id)
+
+        rows = db.session.execute(query.order_by(User.id).limit(limit + 1)).all()
+        response = jsonify([user_row(row) for row in rows[:limit]])
+
+        # The body stays a plain list; the next page is linked from a header
+        if len(rows) > limit:
+            next_cursor = encode_cursor(rows[limit - 1].id)
+            response.headers['Link'] = f'<{request.path}?limit={limit}&cursor={next_cursor}>; rel="next"'
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
+
+    # Stream every user as NDJSON or CSV with constant memory
+    @app.route('/users/export', methods=['GET'])
+    @query_budget(2)
+    @jwt_required()
+    @read_replica
+    def export_users():
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return jsonify({"msg": "format must be ndjson or csv"}), 400
 
-        return jsonify(user_list), 200
+        batch = app.config['USERS_EXPORT_BATCH_SIZE']
+        fields = ['id', 'username', 'email', 'balance', 'created_at']
+
+        def generate():
+            # yield_per streams from a server-side cursor, batch rows at a time
+            result = db.session.execute(user_columns().order_by(User.id).execution_options(yield_per=batch))
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fields) if export_format == 'csv' else None
+            if writer:
+                writer.writeheader()
+            for rows in result.partitions():
+                for row in rows:
+                    if writer:
+                        writer.writerow(user_row(row))
+                    else:
+                        buffer.write(json.dumps(user_row(row)) + '\n')
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+
+        mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename=users.{export_format}'
+        return response
     # User profile and balance routes
     @app.route('/profile', methods=['GET'])
+    @query_budget(1)
     @jwt_required()
     def get_profile():
-        user_id = get_jwt_identity()
-        user = db.session.get(User, user_id)
-
-        
-        if not user:
-            return jsonify({"msg": "User not found"}), 404
+        user = current_user
        
         return jsonify({
             "id": user.id,
@@ -152,6 +440,7 @@ def create_app():
         }), 200
 
     @app.route('/deposit', methods=['POST'])
+    @query_budget(3)
     @jwt_required()
     def deposit():
         user_id = get_jwt_identity()
@@ -168,26 +457,17 @@ def create_app():
         if amount <= 0:
             return jsonify({"msg": "Invalid amount"}), 400
     
-        user = User.query.get(user_id)
-    
-        if not user:
+        try:
+            new_balance = wallet.deposit(user_id, amount)
+        except wallet.UserNotFound:
             return jsonify({"msg": "User not found"}), 404
     
-        user.balance += amount
-    
-        transaction = Transaction(
-            user_id=user_id,
-            type='deposit',
-            amount=amount,
-            status='completed'
-        )
-    
-        db.session.add(transaction)
         db.session.commit()
     
-        return jsonify({"msg": "Deposit successful", "new_balance": user.balance}), 200
+        return jsonify({"msg": "Deposit successful", "new_balance": new_balance}), 200
 
     @app.route('/withdraw', methods=['POST'])
+    @query_budget(3)
     @jwt_required()
     def withdraw():
         user_id = get_jwt_identity()
@@ -201,30 +481,20 @@ def create_app():
         if amount <= 0:
             return jsonify({"msg": "Invalid amount"}), 400
        
-        user = db.session.get(User, user_id)
-        
-        if not user:
+        try:
+            new_balance = wallet.withdraw(user_id, amount)
+        except wallet.UserNotFound:
             return jsonify({"msg": "User not found"}), 404
-       
-        if user.balance < amount:
+        except wallet.InsufficientFunds:
             return jsonify({"msg": "Insufficient balance"}), 400
        
-        user.balance -= amount
-       
-        transaction = Transaction(
-            user_id=user_id,
-            type='withdraw',
-            amount=amount,
-            status='completed'
-        )
-       
-        db.session.add(transaction)
         db.session.commit()
        
-        return jsonify({"msg": "Withdrawal successful", "new_balance": user.balance}), 200
+        return jsonify({"msg": "Withdrawal successful", "new_balance": new_balance}), 200
 
     # Spin and Win game routes
     @app.route('/games/spin-and-win/play', methods=['POST'])
+    @query_budget(9)
     @jwt_required()
     def play_spin_and_win():
         user_id = get_jwt_identity()
@@ -238,47 +508,30 @@ def create_app():
         if bet_amount <= 0:
             return jsonify({"msg": "Invalid bet amount"}), 400
        
-        user = User.query.get(user_id)
+        game = game_catalog.by_name('Spin and Win')
         
-        if not user:
-            return jsonify({"msg": "User not found"}), 404
+        if not game:
+            return jsonify({"msg": "Game not found"}), 404
+       
+        # Determine result from the game's compiled paytable
+        win_amount = bet_amount * wheel.paytable_for(game).spin()
        
-        if user.balance < bet_amount:
+        # Settle the spin against the balance in one conditional update
+        try:
+            new_balance = wallet.adjust_balance(user_id, win_amount - bet_amount, required=bet_amount)
+        except wallet.UserNotFound:
+            return jsonify({"msg": "User not found"}), 404
+        except wallet.InsufficientFunds:
             return jsonify({"msg": "Insufficient balance"}), 400
        
-        # Create game session
-        game = Game.query.filter_by(name='Spin and Win').first()
-        
-        if not game:
-            return jsonify({"msg": "Game not found"}), 404
-            
         session = GameSession(
             user_id=user_id,
             game_id=game.id,
-            status='active'
+            status='completed'
         )
         db.session.add(session)
         db.session.flush()
        
-        # Determine result (simplified example)
-        segments = [
-            {'value': 0, 'probability': 0.6},  # Lose
-            {'value': bet_amount, 'probability': 0.2},  # Break even
-            {'value': bet_amount * 2, 'probability': 0.15},  # 2x
-            {'value': bet_amount * 5, 'probability': 0.05}  # 5x
-        ]
-       
-        # Weighted random choice
-        rand_val = random.random()
-        cumulative_prob = 0
-        win_amount = 0
-       
-        for segment in segments:
-            cumulative_prob += segment['probability']
-            if rand_val <= cumulative_prob:
-                win_amount = segment['value']
-                break
-       
         # Create spin and win record
         spin = SpinAndWin(
             session_id=session.id,
@@ -296,11 +549,8 @@ def create_app():
             net_result=win_amount - bet_amount
         )
        
-        # Update user balance
-        user.balance = user.balance - bet_amount + win_amount
-       
-        # Update session status
-        session.status = 'completed'
+        # Update stats rollup
+        record_bet(user_id, game.id, bet_amount, win_amount)
        
         db.session.add_all([spin, bet])
         db.session.commit()
@@ -308,52 +558,139 @@ def create_app():
         return jsonify({
             "result": spin.result,
             "win_amount": win_amount,
-            "new_balance": user.balance
+            "new_balance": new_balance
+        }), 200
+
+    @app.route('/games/spin-and-win/play-batch', methods=['POST'])
+    @query_budget(6)
+    @jwt_required()
+    def play_spin_and_win_batch():
+        """Play ``spins`` spins of ``bet_amount`` each in one transaction.
+
+        The balance must cover every stake up front; it is then moved by the
+        net result of the whole batch in a single update.
+        """
+        user_id = get_jwt_identity()
+        data = request.get_json()
+
+        if not data or 'bet_amount' not in data or 'spins' not in data:
+            return jsonify({"msg": "Missing bet amount or spins"}), 400
+
+        bet_amount = data.get('bet_amount', 0)
+        spins = data.get('spins', 0)
+
+        if not isinstance(bet_amount, (int, float)) or isinstance(bet_amount, bool) or bet_amount <= 0:
+            return jsonify({"msg": "Invalid bet amount"}), 400
+        if not isinstance(spins, int) or isinstance(spins, bool) \
+                or not 1 <= spins <= app.config['SPIN_BATCH_MAX']:
+            return jsonify({"msg": f"spins must be between 1 and {app.config['SPIN_BATCH_MAX']}"}), 400
+
+        game = game_catalog.by_name('Spin and Win')
+
+        if not game:
+            return jsonify({"msg": "Game not found"}), 404
+
+        wins = (wheel.paytable_for(game).draw(spins) * bet_amount).tolist()
+        total_bet = bet_amount * spins
+        total_win = sum(wins)
+
+        try:
+            new_balance = wallet.adjust_balance(user_id, total_win - total_bet, required=total_bet)
+        except wallet.UserNotFound:
+            return jsonify({"msg": "User not found"}), 404
+        except wallet.InsufficientFunds:
+            return jsonify({"msg": "Insufficient balance"}), 400
+
+        session = GameSession(user_id=user_id, game_id=game.id, status='completed')
+        db.session.add(session)
+        db.session.flush()
+
+        now = datetime.utcnow()
+        results = [wheel.result_label(win / bet_amount) for win in wins]
+        db.session.execute(db.insert(SpinAndWin), [{
+            'session_id': session.id,
+            'bet_amount': bet_amount,
+            'win_amount': win,
+            'result': result,
+            'created_at': now,
+        } for win, result in zip(wins, results)])
+        db.session.execute(db.insert(BetHistory), [{
+            'user_id': user_id,
+            'game_id': game.id,
+            'bet_amount': bet_amount,
+            'win_amount': win,
+            'net_result': win - bet_amount,
+            'status': 'completed',
+            'created_at': now,
+        } for win in wins])
+        record_bets(user_id, game.id, spins, total_bet, total_win)
+        db.session.commit()
+
+        return jsonify({
+            "spins": [{"result": result, "win_amount": win} for result, win in zip(results, wins)],
+            "total_bet": total_bet,
+            "total_win": total_win,
+            "new_balance": new_balance
+        }), 200
+
+    @app.route('/games/<int:game_id>/paytable', methods=['GET'])
+    @query_budget(1)
+    @jwt_required()
+    def get_paytable(game_id):
+        game = game_catalog.get(game_id)
+
+        if not game:
+            return jsonify({"msg": "Game not found"}), 404
+
+        paytable = wheel.paytable_for(game)
+        return jsonify({
+            "game": game.name,
+            "segments": paytable.to_json(),
+            "rtp": paytable.rtp
         }), 200
 
     # SSE endpoints to replace SocketIO functionality
     @app.route('/events/connect', methods=['GET'])
+    @query_budget(1)
     @jwt_required()
     def connect_to_events():
         user_id = get_jwt_identity()
-        
-        def event_stream():
-            # Create a queue for this user if it doesn't exist
-            if user_id not in game_events:
-                game_events[user_id] = queue.Queue()
-                
-            # Send initial connection event
-            yield f"data: {json.dumps({'type': 'connected', 'user_id': user_id})}\n\n"
-            
-            # Keep connection alive and send events as they occur
-            while True:
-                try:
-                    # Non-blocking queue check with timeout
-                    event = game_events[user_id].get(timeout=1)
-                    yield f"data: {json.dumps(event)}\n\n"
-                except queue.Empty:
-                    # Send heartbeat
-                    yield f"data: {json.dumps({'type': 'heartbeat'})}\n\n"
-                    time.sleep(30)  # Heartbeat interval
-                except Exception:
-                    break
-                    
-        return Response(stream_with_context(event_stream()), 
-                       mimetype="text/event-stream")
+
+        # EventSource sends the id of the last event it saw when it
+        # reconnects; replay what it missed in its rooms from memory
+        try:
+            last_event_id = int(request.headers.get('Last-Event-ID', request.args.get('last_event_id')))
+        except (TypeError, ValueError):
+            last_event_id = None
+
+        # The stream needs no app or request context, so it is not wrapped in
+        # stream_with_context and holds no DB session while the client idles
+        return Response(event_hub.stream(user_id, {'type': 'connected', 'user_id': user_id},
+                                         last_event_id, lambda: room_membership.rooms_of(user_id)),
+                        mimetype="text/event-stream")
 
     # Function to broadcast event to all users in a game
-    def broadcast_to_game(game_id, event_data):
-        # Find all users in this game
-        game_session = GameSession.query.filter_by(game_id=game_id).all()
-        user_ids = [session.user_id for session in game_session]
-        
-        # Add event to each user's queue
-        for user_id in user_ids:
-            if user_id in game_events:
-                game_events[user_id].put(event_data)
+    def broadcast_to_game(game_id, event_data, room_id=None):
+        # Every worker adds the event to the streams of its connected users
+        # who are currently in the room, or in the game for an event without
+        # a room. Events of a room get an id and are kept in that room's
+        # replay buffer.
+        event_hub.send('game', {
+            'id': event_hub.ids.next(),
+            'game_id': int(game_id),
+            'room_id': room_id,
+            'event': event_data
+        })
+
+    # Mark a finished room and its sessions in the same transaction
+    def close_room(room_id, status):
+        Room.query.filter_by(id=room_id).update({'status': status}, synchronize_session=False)
+        RoomSession.query.filter_by(room_id=room_id, status='active') \
+            .update({'status': status}, synchronize_session=False)
 
     # Russian Roulette (Multiplayer) game routes
     @app.route('/rooms/create', methods=['POST'])
+    @query_budget(6)
     @jwt_required()
     def create_room():
         user_id = get_jwt_identity()
@@ -365,41 +702,35 @@ def create_app():
         game_id = data.get('game_id')
 
         # Check if game exists
-        game = Game.query.get(game_id)
+        game = game_catalog.get(game_id)
         if not game:
             return jsonify({"msg": "Game not found"}), 404
 
-        # Create new room
+        # Create the room, its multiplayer game and the creator's room
+        # session in one transaction; the flush only fetches the room id
         room = Room(
-            game_id=game_id,
+            game_id=game.id,
             creator_id=user_id,
             status='waiting'
         )
         db.session.add(room)
-        db.session.commit()
-
-        # Create new multiplayer game for the room
-        room_id = room.id
-        room = Room.query.get(room_id)
+        db.session.flush()
 
         multiplayer = Multiplayer(
-            session_id=room_id,
+            session_id=room.id,
             game_id=game.id,
             max_players=6,  # For Russian Roulette
             current_players=1,
             status='waiting'
         )
-        db.session.add(multiplayer)
-        db.session.commit()
-
-        # Add user to room tracking
         room_session = RoomSession(
             user_id=user_id,
             room_id=room.id,
             status='active'
         )
-        db.session.add(room_session)
+        db.session.add_all([multiplayer, room_session])
         db.session.commit()
+        room_membership.join(game.id, user_id, room.id)
 
         # Notify about new room
         event_data = {
@@ -409,7 +740,7 @@ def create_app():
             'players': 1,
             'max_players': multiplayer.max_players
         }
-        broadcast_to_game(game_id, event_data)
+        broadcast_to_game(game_id, event_data, room.id)
 
         return jsonify({
             'room_id': room.id,
@@ -417,7 +748,78 @@ def create_app():
             'players': 1,
             'max_players': multiplayer.max_players
         }), 200
+
+    @app.route('/rooms/join', methods=['POST'])
+    @query_budget(4)
+    @jwt_required()
+    def join_room():
+        user_id = get_jwt_identity()
+        data = request.get_json()
+
+        if not data or 'room_id' not in data:
+            return jsonify({"msg": "Missing room ID"}), 400
+
+        try:
+            room_id = int(data.get('room_id'))
+        except (TypeError, ValueError):
+            return jsonify({"msg": "Invalid room ID"}), 400
+
+        already_in = db.session.query(RoomSession.id).filter_by(
+            room_id=room_id,
+            user_id=user_id,
+            status='active'
+        ).first()
+        if already_in:
+            return jsonify({"msg": "Already in this room"}), 409
+
+        # Take a seat only if one is free, in the same statement that checks it
+        seat = db.session.execute(
+            db.update(Multiplayer)
+            .where(Multiplayer.session_id == room_id,
+                   Multiplayer.status == 'waiting',
+                   Multiplayer.current_players < Multiplayer.max_players)
+            .values(current_players=Multiplayer.current_players + 1, updated_at=datetime.utcnow())
+            .returning(Multiplayer.game_id, Multiplayer.current_players, Multiplayer.max_players)
+            .execution_options(synchronize_session=False)
+        ).first()
+
+        if not seat:
+            multiplayer = Multiplayer.query.filter_by(session_id=room_id).first()
+            if not multiplayer:
+                return jsonify({"msg": "Room not found"}), 404
+            if multiplayer.status != 'waiting':
+                return jsonify({"msg": "Room is not open for joining"}), 400
+            return jsonify({"msg": "Room is full"}), 409
+
+        game_id, players, max_players = seat
+        db.session.add(RoomSession(user_id=user_id, room_id=room_id, status='active'))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent join by the same user got the seat first; this
+            # rollback also gives back the one taken above
+            db.session.rollback()
+            return jsonify({"msg": "Already in this room"}), 409
+        room_membership.join(game_id, user_id, room_id)
+
+        event_data = {
+            'type': 'player_joined',
+            'room_id': room_id,
+            'user_id': user_id,
+            'players': players,
+            'max_players': max_players
+        }
+        broadcast_to_game(game_id, event_data, room_id)
+
+        return jsonify({
+            'room_id': room_id,
+            'status': 'waiting',
+            'players': players,
+            'max_players': max_players
+        }), 200
+
     @app.route('/games/place-bet', methods=['POST'])
+    @query_budget(6)
     @jwt_required()
     def place_bet():
         user_id = get_jwt_identity()
@@ -433,54 +835,51 @@ def create_app():
         if bet_type not in ['survival', 'elimination']:
             return jsonify({"msg": "Invalid bet type"}), 400
         
-        user = User.query.get(user_id)
+        # A zero, negative or non-numeric stake would be a free bet or a credit
+        if isinstance(bet_amount, bool) or not isinstance(bet_amount, (int, float)) \
+                or not math.isfinite(bet_amount) or bet_amount <= 0:
+            return jsonify({"msg": "Invalid bet amount"}), 400
         
-        if not user:
-            return jsonify({"msg": "User not found"}), 404
+        # Hold the round so the bet cannot race its settlement
+        with room_engine.round(roulette_id) as live:
+            if not live:
+                return jsonify({"msg": "Roulette game not found"}), 404
             
-        if user.balance < bet_amount:
-            return jsonify({
-                'status': 'error',
-                'message': 'Insufficient balance'
-            }), 400
-        
-        # Record the bet
-        roulette = RussianRoulette.query.get(roulette_id)
-        
-        if not roulette:
-            return jsonify({"msg": "Roulette game not found"}), 404
+            if live.game_id is None or live.status != 'active':
+                return jsonify({"msg": "No active game session found"}), 404
             
-        multiplayer = Multiplayer.query.get(roulette.multiplayer_id)
-        
-        # Find game_id from an active session
-        game_session = GameSession.query.filter_by(
-            multiplayer_id=multiplayer.id,
-            status='active'
-        ).first()
-        
-        if not game_session:
-            return jsonify({"msg": "No active game session found"}), 404
+            game_id = live.game_id
+            room_id = live.room_id
             
-        game_id = game_session.game_id
-        
-        bet = BetHistory(
-            user_id=user_id,
-            game_id=game_id,
-            bet_amount=bet_amount,
-            bet_type=bet_type,
-            status='active'
-        )
-        db.session.add(bet)
-        
-        # Deduct balance
-        user.balance -= bet_amount
-        db.session.commit()
+            # Deduct balance
+            try:
+                new_balance = wallet.adjust_balance(user_id, -bet_amount)
+            except wallet.UserNotFound:
+                return jsonify({"msg": "User not found"}), 404
+            except wallet.InsufficientFunds:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Insufficient balance'
+                }), 400
+            
+            # Record the bet
+            bet = BetHistory(
+                user_id=user_id,
+                game_id=game_id,
+                roulette_id=live.roulette_id,
+                bet_amount=bet_amount,
+                bet_type=bet_type,
+                status='active'
+            )
+            db.session.add(bet)
+            record_bet(user_id, game_id, bet_amount)
+            db.session.commit()
         
         # Prepare response
         response = {
             'status': 'success',
             'bet_id': bet.id,
-            'new_balance': user.balance
+            'new_balance': new_balance
         }
         
         # Broadcast event to all players
@@ -490,11 +889,12 @@ def create_app():
             'bet_type': bet_type,
             'bet_amount': bet_amount
         }
-        broadcast_to_game(game_id, event_data)
+        broadcast_to_game(game_id, event_data, room_id)
         
         return jsonify(response), 200
 
     @app.route('/games/pull-trigger', methods=['POST'])
+    @query_budget(10)
     @jwt_required()
     def pull_trigger():
         user_id = get_jwt_identity()
@@ -505,94 +905,88 @@ def create_app():
             
         roulette_id = data.get('roulette_id')
         
-        roulette = RussianRoulette.query.get(roulette_id)
-        
-        if not roulette:
-            return jsonify({"msg": "Roulette game not found"}), 404
-            
-        multiplayer = Multiplayer.query.get(roulette.multiplayer_id)
-        
-        # Find game_id from an active session
-        game_session = GameSession.query.filter_by(
-            multiplayer_id=multiplayer.id,
-            status='active'
-        ).first()
-        
-        if not game_session:
-            return jsonify({"msg": "No active game session found"}), 404
+        # One action per round at a time; a pull that does not end the round
+        # only changes the room engine's state
+        with room_engine.round(roulette_id) as live:
+            if not live:
+                return jsonify({"msg": "Roulette game not found"}), 404
             
-        game_id = game_session.game_id
-        
-        # Check if it's a hit
-        is_hit = roulette.current_position == roulette.bullet_position
-        
-        # Update position
-        roulette.current_position += 1
-        
-        if is_hit or roulette.current_position > 6:
-            # Game over
-            roulette.status = 'completed'
-            multiplayer.status = 'completed'
+            if live.game_id is None or live.status != 'active':
+                return jsonify({"msg": "No active game session found"}), 404
             
-            # Update all related game sessions
-            GameSession.query.filter_by(
-                multiplayer_id=multiplayer.id,
-                status='active'
-            ).update({'status': 'completed'})
+            game_id = live.game_id
             
-            # Process all bets
-            bets = BetHistory.query.filter_by(
-                game_id=game_id,
-                status='active'
-            ).all()
+            # Check if it's a hit
+            is_hit, game_over = roulette_rules.trigger(live.current_position, live.bullet_position)
+            position = live.current_position
             
-            for bet in bets:
-                if (bet.bet_type == 'survival' and not is_hit) or (bet.bet_type == 'elimination' and is_hit):
-                    # Winner - calculate payout based on odds and number of players
-                    odds_multiplier = 2.0  # Simplified example
-                    win_amount = bet.bet_amount * odds_multiplier
-                    
-                    bet.win_amount = win_amount
-                    bet.net_result = win_amount - bet.bet_amount
-                    
-                    # Update user balance
-                    better = User.query.get(bet.user_id)
-                    if better:
-                        better.balance += win_amount
-                else:
-                    # Loser
-                    bet.win_amount = 0
-                    bet.net_result = -bet.bet_amount
+            if game_over:
+                # Game over: write the final state and settle synchronously
+                RussianRoulette.query.filter_by(id=live.roulette_id).update(
+                    {'current_position': position + 1, 'status': 'completed'}, synchronize_session=False)
+                Multiplayer.query.filter_by(id=live.multiplayer_id).update(
+                    {'status': 'completed'}, synchronize_session=False)
                 
-                bet.status = 'completed'
-            
-            db.session.commit()
-            
-            # Notify all players
-            event_data = {
-                'type': 'game_result',
-                'is_hit': is_hit,
-                'position': roulette.current_position - 1,
-                'bullet_position': roulette.bullet_position,
-                'game_over': True
-            }
-        else:
-            # Continue game
-            db.session.commit()
+                # Update all related game sessions
+                GameSession.query.filter_by(
+                    multiplayer_id=live.multiplayer_id,
+                    status='active'
+                ).update({'status': 'completed'}, synchronize_session=False)
+                close_room(live.room_id, 'completed')
+                
+                # Settle this round's bets set-based: credit the winners per
+                # user, then mark every bet of the round completed
+                round_bets = (BetHistory.roulette_id == live.roulette_id, BetHistory.status == 'active')
+                is_winner = BetHistory.bet_type == roulette_rules.winning_bet_type(is_hit)
+                payout = BetHistory.bet_amount * roulette_rules.ODDS_MULTIPLIER
+                winnings = db.select(BetHistory.user_id, BetHistory.game_id, db.func.sum(payout).label('amount')) \
+                    .where(*round_bets, is_winner) \
+                    .group_by(BetHistory.user_id, BetHistory.game_id)
+                wallet.credit_many(winnings)
+                record_payouts(winnings)
+                
+                win_amount = db.case((is_winner, payout), else_=0.0)
+                BetHistory.query.filter(*round_bets).update({
+                    'win_amount': win_amount,
+                    'net_result': win_amount - BetHistory.bet_amount,
+                    'status': 'completed'
+                }, synchronize_session=False)
+                
+                db.session.commit()
+                live.current_position = position + 1
+                live.status = 'completed'
+                room_engine.forget(live)
+                
+                # Notify all players
+                event_data = {
+                    'type': 'game_result',
+                    'is_hit': is_hit,
+                    'position': position,
+                    'bullet_position': live.bullet_position,
+                    'game_over': True
+                }
+            else:
+                # Continue game
+                live.current_position = position + 1
+                room_engine.checkpoint(live)
+                db.session.commit()
+                
+                # Notify all players
+                event_data = {
+                    'type': 'trigger_result',
+                    'is_hit': is_hit,
+                    'position': position,
+                    'game_over': False
+                }
             
-            # Notify all players
-            event_data = {
-                'type': 'trigger_result',
-                'is_hit': is_hit,
-                'position': roulette.current_position - 1,
-                'game_over': False
-            }
-        
-        broadcast_to_game(game_id, event_data)
+            broadcast_to_game(game_id, event_data, live.room_id)
+            if game_over:
+                room_membership.close_room(live.room_id)
         
         return jsonify(event_data), 200
 
     @app.route('/games/leave', methods=['POST'])
+    @query_budget(9)
     @jwt_required()
     def leave_game():
         user_id = get_jwt_identity()
@@ -610,27 +1004,71 @@ def create_app():
             status='active'
         ).first()
         
+        # Leave any rooms of this game the user is still in
+        left_rooms = [left for (left,) in db.session.execute(
+            db.update(RoomSession)
+            .where(RoomSession.user_id == user_id,
+                   RoomSession.status == 'active',
+                   RoomSession.room_id.in_(db.select(Room.id).where(Room.game_id == game_id)))
+            .values(status='left', updated_at=datetime.utcnow())
+            .returning(RoomSession.room_id)
+            .execution_options(synchronize_session=False)
+        )]
+        room_id = left_rooms[0] if left_rooms else None
+        abandoned_rooms = []
+
+        # Give back the seat /rooms/join took; the last player out abandons the room
+        for left in left_rooms:
+            seat = db.session.execute(
+                db.update(Multiplayer)
+                .where(Multiplayer.session_id == left,
+                       Multiplayer.status != 'completed',
+                       Multiplayer.current_players > 0)
+                .values(current_players=Multiplayer.current_players - 1,
+                        status=db.case((Multiplayer.current_players <= 1, 'abandoned'),
+                                       else_=Multiplayer.status),
+                        updated_at=datetime.utcnow())
+                .returning(Multiplayer.status)
+                .execution_options(synchronize_session=False)
+            ).first()
+            if seat and seat.status == 'abandoned':
+                abandoned_rooms.append(left)
+                close_room(left, 'abandoned')
+
         if game_session:
             game_session.status = 'left'
             
-            # If this is a multiplayer game, update player count
+            # A multiplayer session without a room session (joined before
+            # rooms had one) still holds a seat of its own
             if game_session.multiplayer_id:
                 multiplayer = Multiplayer.query.get(game_session.multiplayer_id)
-                if multiplayer and multiplayer.status != 'completed':
+                if multiplayer:
+                    room_id = multiplayer.session_id
+                if multiplayer and multiplayer.status not in ('completed', 'abandoned') \
+                        and multiplayer.session_id not in left_rooms:
                     multiplayer.current_players -= 1
                     
                     # If no players left, mark game as abandoned
                     if multiplayer.current_players <= 0:
                         multiplayer.status = 'abandoned'
-            
+                        abandoned_rooms.append(multiplayer.session_id)
+                        close_room(multiplayer.session_id, 'abandoned')
+
+        if game_session or left_rooms:
             db.session.commit()
+            room_membership.leave(game_id, user_id)
+            for abandoned in abandoned_rooms:
+                room_membership.close_room(abandoned)
+            # A held round must not take bets once its players are gone
+            for left in {*left_rooms, room_id} - {None}:
+                room_engine.revalidate(left)
             
             # Notify others that player has left
             event_data = {
                 'type': 'player_left',
                 'user_id': user_id
             }
-            broadcast_to_game(game_id, event_data)
+            broadcast_to_game(game_id, event_data, room_id)
             
             return jsonify({'status': 'success'}), 200
         else:
@@ -638,69 +1076,60 @@ def create_app():
 
     # Game stats and history routes
     @app.route('/history', methods=['GET'])
+    @query_budget(2)
     @jwt_required()
+    @read_replica
     def get_history():
         user_id = get_jwt_identity()
+        limit = page_size(request.args.get('limit'),
+                          app.config['HISTORY_PAGE_SIZE'], app.config['HISTORY_MAX_PAGE_SIZE'])
 
-        bets = BetHistory.query.filter_by(user_id=user_id).order_by(BetHistory.created_at.desc()).limit(50).all()
+        # Keyset pagination on (created_at, id): every page is an index range
+        # scan on ix_bet_history_user_id_created_at, however deep it is.
+        # Game names come from the catalog, so no join is needed.
+        query = BetHistory.query.filter(BetHistory.user_id == user_id)
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                created_at, bet_id = decode_cursor(cursor, datetime, int)
+            except InvalidCursor:
+                return jsonify({"msg": "Invalid cursor"}), 400
+            # The plain bound lets PostgreSQL prune the newer monthly
+            # partitions of bet_history, which the row comparison does not
+            query = query.filter(db.tuple_(BetHistory.created_at, BetHistory.id) < (created_at, bet_id),
+                                 BetHistory.created_at <= created_at)
+
+        rows = query.order_by(BetHistory.created_at.desc(), BetHistory.id.desc()).limit(limit + 1).all()
 
         history = []
-        for bet in bets:
-            game = Game.query.get(bet.game_id)
-            if game:
-                history.append({
-                    'id': bet.id,
-                    'gameType': game.name,
-                    'amount': bet.bet_amount,
-                    'result': bet.net_result,
-                    'winAmount': bet.win_amount,
-                    'created_at': bet.created_at.isoformat()
-                })
-
-        return jsonify({'gameHistory': history}), 200
+        for bet in rows[:limit]:
+            game_name = game_catalog.name_of(bet.game_id)
+            if not game_name:
+                continue
+            history.append({
+                'id': bet.id,
+                'gameType': game_name,
+                'amount': bet.bet_amount,
+                'result': bet.net_result,
+                'winAmount': bet.win_amount,
+                'created_at': bet.created_at.isoformat()
+            })
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+        return jsonify({'gameHistory': history, 'next_cursor': next_cursor}), 200
     @app.route('/stats', methods=['GET'])
+    @query_budget(2)
     @jwt_required()
+    @read_replica
     def get_stats():
         user_id = get_jwt_identity()
-        
-        # Get overall stats
-        bets = BetHistory.query.filter_by(user_id=user_id).all()
-        
-        total_bets = len(bets)
-        total_wagered = sum(bet.bet_amount for bet in bets)
-        total_won = sum(bet.win_amount for bet in bets)
-        net_profit = total_won - total_wagered
-        
-        # Get stats by game
-        games = Game.query.all()
-        games_stats = []
-        
-        for game in games:
-            game_bets = [bet for bet in bets if bet.game_id == game.id]
-            
-            if game_bets:
-                game_total_bets = len(game_bets)
-                game_total_wagered = sum(bet.bet_amount for bet in game_bets)
-                game_total_won = sum(bet.win_amount for bet in game_bets)
-                game_net_profit = game_total_won - game_total_wagered
-                
-                games_stats.append({
-                    'game': game.name,
-                    'total_bets': game_total_bets,
-                    'total_wagered': game_total_wagered,
-                    'total_won': game_total_won,
-                    'net_profit': game_net_profit
-                })
-        
-        return jsonify({
-            'overall': {
-                'total_bets': total_bets,
-                'total_wagered': total_wagered,
-                'total_won': total_won,
-                'net_profit': net_profit
-            },
-            'by_game': games_stats
-        }), 200
+
+        return jsonify(user_stats(user_id)), 200
 
     # Add error handlers
     @app.errorhandler(404)
@@ -717,6 +1146,153 @@ def create_app():
         """Clear existing data and create new tables."""
         db.create_all()
         print("Initialized the database.")
+
+    @app.cli.command("rebuild-stats")
+    @click.option('--batch-size', default=1000, help='Users per transaction.')
+    def rebuild_stats_command(batch_size):
+        """Rebuild the user_game_stats rollup from bet_history."""
+        rebuild_user_game_stats(batch_size)
+        print("Rebuilt user_game_stats.")
+
+    @app.cli.command("check-stats")
+    @click.option('--batch-size', default=1000, help='Users per batch.')
+    def check_stats_command(batch_size):
+        """Check the user_game_stats rollup against bet_history."""
+        mismatches = check_user_game_stats(batch_size)
+        for user_id, game_id, expected, actual in mismatches:
+            print(f"user {user_id} game {game_id}: expected {expected}, found {actual}")
+        if mismatches:
+            print(f"{len(mismatches)} mismatched rows; run `flask rebuild-stats` to repair.")
+            raise SystemExit(1)
+        print("user_game_stats is consistent with bet_history.")
+
+    @app.cli.command("partition-bet-history")
+    @click.option('--batch-size', default=10000, help='Bets copied per transaction.')
+    @click.option('--pause', default=0.0, help='Seconds to sleep between batches.')
+    @click.option('--months-ahead', default=3, help='Months to create partitions for beyond this one.')
+    @click.option('--start-id', type=int, default=None, help='Resume the copy from this bet id.')
+    @click.option('--verify/--no-verify', default=True, help='Count both tables before swapping them.')
+    @click.option('--abort', is_flag=True, help='Drop the copy of an unfinished run instead.')
+    def partition_bet_history_command(batch_size, pause, months_ahead, start_id, verify, abort):
+        """Move bet_history to monthly partitions with an online batched copy."""
+        try:
+            if abort:
+                partitions.abandon_partitioning()
+            else:
+                partitions.partition_bet_history(batch_size, pause, months_ahead, start_id, verify)
+        except partitions.PartitioningError as e:
+            raise click.ClickException(str(e))
+
+    @app.cli.command("create-partitions")
+    @click.option('--months-ahead', default=3, help='Months to create partitions for beyond this one.')
+    def create_partitions_command(months_ahead):
+        """Create the coming months' bet_history partitions (run from cron)."""
+        try:
+            created = partitions.ensure_partitions(months_ahead)
+        except partitions.PartitioningError as e:
+            raise click.ClickException(str(e))
+        print(f"{len(created)} partitions created.")
+
+    @app.cli.command("check-partitions")
+    @click.option('--months-ahead', default=1, help='Months beyond this one that must have a partition.')
+    @click.option('--user-id', type=int, default=None, help='User whose /history and /stats are explained.')
+    def check_partitions_command(months_ahead, user_id):
+        """Check bet_history's partitions and that /history and /stats prune them."""
+        try:
+            problems = partitions.check_partitions(app, months_ahead, user_id)
+        except partitions.PartitioningError as e:
+            raise click.ClickException(str(e))
+        for problem in problems:
+            print(problem)
+        if problems:
+            raise SystemExit(1)
+        print("bet_history partitions are in place and pruned.")
+
+    @app.cli.command("event-broker")
+    @click.option('--socket', 'path', default=None, help='Unix socket path (default EVENT_BACKEND_URL).')
+    def event_broker_command(path):
+        """Relay game events between local workers (EVENT_BACKEND=unix)."""
+        path = path or app.config['EVENT_BACKEND_URL'] or '/tmp/gamehub-events.sock'
+        print(f"Event broker listening on {path}")
+        EventBroker(path).serve_forever()
+
+    @app.cli.command("reload-games")
+    def reload_games_command():
+        """Bump the games version stamp so every worker reloads its catalog."""
+        Game.query.update({'updated_at': datetime.utcnow()})
+        db.session.commit()
+        game_catalog.refresh(force=True)
+        print("Game catalog reloaded.")
+
+    @app.cli.command("set-paytable")
+    @click.argument('game_name')
+    @click.argument('paytable_file', type=click.File('r'), required=False)
+    @click.option('--clear', is_flag=True, help='Go back to the default wheel.')
+    def set_paytable_command(game_name, paytable_file, clear):
+        """Validate and store a game's paytable from a JSON file.
+
+        The file holds a list of {"multiplier": ..., "probability": ...}.
+        """
+        game = Game.query.filter_by(name=game_name).first()
+        if not game:
+            raise click.ClickException(f"No game named {game_name!r}")
+        if clear:
+            game.paytable = None
+            paytable = wheel.DEFAULT_PAYTABLE
+        elif paytable_file is None:
+            raise click.UsageError("Give a PAYTABLE_FILE or --clear")
+        else:
+            try:
+                paytable = wheel.Paytable.from_json(json.load(paytable_file))
+            except (ValueError, wheel.InvalidPaytable) as e:
+                raise click.ClickException(f"Invalid paytable: {e}")
+            game.paytable = paytable.to_json()
+        game.updated_at = datetime.utcnow()
+        db.session.commit()
+        game_catalog.refresh(force=True)
+        print(f"{game.name}: {len(paytable.segments)} segments, theoretical RTP {paytable.rtp:.4%}")
+
+    @app.cli.command("simulate")
+    @click.argument('game_type', type=click.Choice(['spin-and-win', 'russian-roulette']))
+    @click.option('--game', 'game_name', default='Spin and Win', help='Game whose paytable to spin.')
+    @click.option('--bet-type', type=click.Choice(roulette_rules.BET_TYPES), default='survival',
+                  help='Roulette bet to simulate.')
+    @click.option('--rounds', default=10**8, help='Simulated bets for the RTP estimate.')
+    @click.option('--batch-size', default=1_000_000, help='Bets drawn per NumPy call.')
+    @click.option('--workers', default=1, help='Worker processes.')
+    @click.option('--bankroll', default=100.0, help='Starting bankroll for the risk-of-ruin curve.')
+    @click.option('--stake', default=1.0, help='Stake per round for the risk-of-ruin curve.')
+    @click.option('--paths', default=10000, help='Simulated players for the risk-of-ruin curve.')
+    @click.option('--horizon', default=10000, help='Rounds per simulated player.')
+    @click.option('--seed', type=int, default=None)
+    def simulate_command(game_type, game_name, bet_type, rounds, batch_size, workers,
+                         bankroll, stake, paths, horizon, seed):
+        """Estimate RTP, variance, hit frequency and risk of ruin by simulation."""
+        import simulate
+
+        if game_type == 'spin-and-win':
+            game = game_catalog.by_name(game_name)
+            if not game:
+                raise click.ClickException(f"No game named {game_name!r}")
+            paytable = wheel.paytable_for(game)
+            sampler = simulate.spin_sampler(paytable)
+            print(f"{game.name}: {len(paytable.segments)} segments, theoretical RTP {paytable.rtp:.4%}")
+        else:
+            sampler = simulate.roulette_sampler(bet_type)
+            print(f"Russian Roulette, {bet_type} bets paid {roulette_rules.ODDS_MULTIPLIER}x")
+
+        start = time.perf_counter()
+        result = simulate.estimate(sampler, rounds, batch_size, workers, seed)
+        elapsed = time.perf_counter() - start
+        print(f"rounds:         {result['rounds']:,} in {elapsed:.1f}s")
+        print(f"RTP:            {result['rtp']:.4%} (+/- {1.96 * result['rtp_std_error']:.4%})")
+        print(f"house edge:     {result['house_edge']:.4%}")
+        print(f"variance:       {result['variance']:.4f} (std dev {result['std_dev']:.4f} stakes)")
+        print(f"hit frequency:  {result['hit_frequency']:.4%}")
+
+        print(f"risk of ruin, bankroll {bankroll:g} at stake {stake:g}:")
+        for t, probability in simulate.risk_of_ruin(sampler, bankroll, stake, paths, horizon, seed=seed):
+            print(f"  after {t:>8,} rounds: {probability:.2%}")
         
     return app
 
@@ -0,0 +1,90 @@
+"""Check that events published in one worker process reach SSE subscribers
+in the others, and measure the cross-process delivery latency.
+
+Usage:
+    python benchmarks/event_bus.py --workers 4 --events 2000
+    python benchmarks/event_bus.py --backend postgres --url postgresql://...
+
+With the default unix backend the script starts its own EventBroker, so it
+runs without any external service. Worker 0 publishes; every other worker
+holds one subscription and must receive every event.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_backends import EventBroker, create_backend
+from events import EventHub
+
+
+def worker(index, config, events, ready, results):
+    hub = EventHub(backend=create_backend(config))
+    if index == 0:
+        ready.wait()
+        for i in range(events):
+            hub.publish(['listener'], {'type': 'bench', 'seq': i, 'sent': time.time()})
+            time.sleep(0.0005)
+        return
+
+    latencies = []
+    stream = hub.stream('listener', {'type': 'connected'})
+    next(stream)
+    time.sleep(0.5)  # let the backend connection settle before publishing starts
+    ready.wait()
+    for payload in stream:
+        event = json.loads(payload[len('data: '):])
+        if event['type'] != 'bench':
+            continue
+        latencies.append(time.time() - event['sent'])
+        if event['seq'] == events - 1:
+            break
+    results.put((index, latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['unix', 'postgres'], default='unix')
+    parser.add_argument('--url', help='socket path or Postgres URL')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--events', type=int, default=1000)
+    args = parser.parse_args()
+
+    config = {'EVENT_BACKEND': args.backend, 'EVENT_BACKEND_URL': args.url}
+    if args.backend == 'unix' and not args.url:
+        config['EVENT_BACKEND_URL'] = os.path.join(tempfile.mkdtemp(), 'events.sock')
+    if args.backend == 'unix':
+        threading.Thread(target=EventBroker(config['EVENT_BACKEND_URL']).serve_forever, daemon=True).start()
+        time.sleep(0.2)
+
+    ready = multiprocessing.Barrier(args.workers)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(i, config, args.events, ready, results))
+                 for i in range(args.workers)]
+    for process in processes:
+        process.start()
+
+    latencies = []
+    for _ in range(args.workers - 1):
+        index, received = results.get(timeout=120)
+        if len(received) != args.events:
+            raise SystemExit(f"worker {index} received {len(received)} of {args.events} events")
+        latencies.extend(received)
+    for process in processes:
+        process.join()
+
+    ms = sorted(x * 1000 for x in latencies)
+    print(f"backend: {args.backend}, {args.workers - 1} listening workers, {args.events} events each")
+    print(f"latency p50: {statistics.median(ms):.3f} ms")
+    print(f"latency p99: {ms[int(len(ms) * 0.99) - 1]:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
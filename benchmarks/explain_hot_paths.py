@@ -0,0 +1,121 @@
+"""Print query plans and timings for the hot lookup paths in app.py, with and
+without the indexes added in migrations c5d8e2f41a07 and d41b7a9c05e2.
+
+Usage:
+    python benchmarks/explain_hot_paths.py --database-url postgresql://... --bets 500000
+
+Point it at a scratch database: the script seeds it and drops/recreates the
+hot path indexes. On PostgreSQL plans come from EXPLAIN (ANALYZE, BUFFERS);
+on SQLite from EXPLAIN QUERY PLAN.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import db
+from seed import seed_database
+
+
+def hot_queries(ids):
+    """The statements app.py issues on its hot paths, built the same way."""
+    from models import BetHistory, GameSession
+
+    return {
+        '/history': db.select(BetHistory)
+            .filter_by(user_id=ids['user_id'])
+            .order_by(BetHistory.created_at.desc())
+            .limit(50),
+        'pull_trigger bets': db.select(BetHistory)
+            .filter_by(roulette_id=ids['roulette_id'], status='active'),
+        'active sessions': db.select(GameSession)
+            .filter_by(multiplayer_id=ids['multiplayer_id'], status='active'),
+        'broadcast_to_game': db.select(GameSession)
+            .filter_by(game_id=ids['roulette_game_id']),
+        'leave_game': db.select(GameSession)
+            .filter_by(user_id=ids['user_id'], game_id=ids['roulette_game_id'], status='active'),
+    }
+
+
+def hot_indexes():
+    from models import BetHistory, GameSession
+
+    return list(BetHistory.__table__.indexes) + list(GameSession.__table__.indexes)
+
+
+def explain(statement, repeat):
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+    else:
+        prefix = 'EXPLAIN QUERY PLAN '
+
+    plan = db.session.execute(db.text(prefix + sql)).all()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        db.session.execute(db.text(sql)).all()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    return [' '.join(str(col) for col in row) for row in plan], elapsed_ms
+
+
+def run(label, queries, repeat):
+    print(f"\n===== {label} =====")
+    timings = {}
+    for name, statement in queries.items():
+        plan, elapsed_ms = explain(statement, repeat)
+        timings[name] = elapsed_ms
+        print(f"\n--- {name}: {elapsed_ms:.3f} ms/query")
+        for line in plan:
+            print(f"    {line}")
+    db.session.commit()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--bets', type=int, default=200000)
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    config = {'SQLALCHEMY_DATABASE_URI': args.database_url} if args.database_url else None
+    app = create_app(config)
+
+    with app.app_context():
+        print(f"Seeding {args.bets} bets / {args.sessions} sessions on {db.engine.url.render_as_string()}")
+        ids = seed_database(users=args.users, bets=args.bets, sessions=args.sessions)
+        queries = hot_queries(ids)
+        indexes = hot_indexes()
+        analyze = 'ANALYZE' if db.engine.dialect.name in ('postgresql', 'sqlite') else None
+
+        with db.engine.begin() as conn:
+            for index in indexes:
+                index.drop(conn, checkfirst=True)
+            if analyze:
+                conn.execute(db.text(analyze))
+        before = run('before (no secondary indexes)', queries, args.repeat)
+
+        with db.engine.begin() as conn:
+            for index in indexes:
+                index.create(conn, checkfirst=True)
+            if analyze:
+                conn.execute(db.text(analyze))
+        after = run('after (hot path indexes)', queries, args.repeat)
+
+    print("\n===== summary (ms/query) =====")
+    print(f"{'query':<22}{'before':>12}{'after':>12}{'speedup':>10}")
+    for name in queries:
+        speedup = before[name] / after[name] if after[name] else float('inf')
+        print(f"{name:<22}{before[name]:>12.3f}{after[name]:>12.3f}{speedup:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Walk /history page by page for a heavy player, asserting the number of SQL
+statements per request and comparing first-page and deep-page latency.
+
+Usage:
+    python benchmarks/history_pagination.py --database-url postgresql://... --bets 100000 --limit 200
+
+Exits non-zero if any page issues more than --query-budget statements or if
+the pages do not cover the user's whole history exactly once.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from querybudget import QueryCounter
+from seed import add_bets, seed_database
+
+
+def timed_get(client, url, headers, counter):
+    counter.reset()
+    start = time.perf_counter()
+    response = client.get(url, headers=headers)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), elapsed_ms, counter.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--bets', type=int, default=100000)
+    parser.add_argument('--limit', type=int, default=200)
+    parser.add_argument('--query-budget', type=int, default=1)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/history_bench.db"
+    # current_user stays cached for the whole walk; the budget is for /history's own statements
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'HISTORY_MAX_PAGE_SIZE': args.limit,
+                      'PROFILE_CACHE_TTL': 3600})
+
+    with app.app_context():
+        ids = seed_database(users=1, bets=0, sessions=0, rooms=1)
+        add_bets([ids['user_id']] * args.bets, [ids['game_id'], ids['roulette_game_id']], random.Random(3))
+        db.session.commit()
+        app.extensions['game_catalog'].refresh(force=True)
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(ids['user_id']))}"}
+        counter = QueryCounter(db.engine).__enter__()
+
+    client = app.test_client()
+    client.get('/profile', headers=headers)
+    seen = set()
+    timings = []
+    cursor = None
+    while True:
+        url = f"/history?limit={args.limit}" + (f"&cursor={cursor}" if cursor else '')
+        page, elapsed_ms, queries = timed_get(client, url, headers, counter)
+        if queries > args.query_budget:
+            raise SystemExit(f"{url}: {queries} queries, budget is {args.query_budget}")
+        seen.update(bet['id'] for bet in page['gameHistory'])
+        timings.append(elapsed_ms)
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    if len(seen) != args.bets:
+        raise SystemExit(f"paged through {len(seen)} distinct bets, expected {args.bets}")
+
+    head = timings[:10]
+    tail = timings[-10:]
+    print(f"{len(timings)} pages of {args.limit}, <= {args.query_budget} queries each")
+    print(f"first pages: median {statistics.median(head):.2f} ms")
+    print(f"last pages:  median {statistics.median(tail):.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+"""Load-test the game API through create_app and report throughput and
+p50/p95/p99 latency per scenario as JSON, for comparing runs across commits.
+
+Usage:
+    python benchmarks/loadtest.py --output before.json
+    python benchmarks/loadtest.py --output after.json --compare before.json
+    python benchmarks/loadtest.py --database-url postgresql://... --workers 16 --iterations 50
+    python benchmarks/loadtest.py --gevent --scenarios sse --listeners 5000
+
+Scenarios, each run by --workers concurrent clients for --iterations rounds:
+
+    auth   POST /register with a new email, then POST /login with it
+    spin   POST /deposit, then --spins POST /games/spin-and-win/play
+    rooms  POST /rooms/create, two more players POST /rooms/join, every
+           player POST /games/place-bet, then POST /games/pull-trigger until
+           the round ends
+    sse    --listeners clients hold GET /events/connect open while --events
+           events are published to all of them
+
+No route starts a roulette round yet, so the rooms scenario starts it in the
+database between the joins and the bets, untimed. For sse, latency is
+connecting (request to the first event) and delivery (publish to the event
+read by each client).
+
+Requests go through the WSGI test client, so the numbers cover the app, its
+database and its event hub, not a server or the network. Without
+--database-url the database is a scratch SQLite file. Every run seeds the
+same data and draws bullet positions from --seed, so two runs on the same
+machine differ only by the code under test.
+"""
+import sys
+
+if '--gevent' in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from passwords import PasswordHasher
+from seed import seed_database
+
+SCENARIOS = ('auth', 'spin', 'rooms', 'sse')
+PLAYERS_PER_ROOM = 3
+PASSWORD = 'secret'
+
+
+def percentile(ms, q):
+    """Nearest-rank percentile of a sorted list."""
+    return ms[min(int(len(ms) * q), len(ms) - 1)]
+
+
+def summarize(latencies):
+    if not latencies:
+        return None
+    ms = sorted(x * 1000 for x in latencies)
+    return {
+        'p50': round(percentile(ms, 0.50), 3),
+        'p95': round(percentile(ms, 0.95), 3),
+        'p99': round(percentile(ms, 0.99), 3),
+        'max': round(ms[-1], 3),
+        'mean': round(sum(ms) / len(ms), 3),
+    }
+
+
+class Recorder:
+    """Latency and status of every request of a scenario, by step."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def observe(self, step, seconds, status=200):
+        with self._lock:
+            self.latencies[step].append(seconds)
+            self.statuses[step][status] += 1
+
+    def request(self, client, step, method, url, **kwargs):
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        self.observe(step, time.perf_counter() - start, response.status_code)
+        return response
+
+    def report(self, elapsed):
+        steps = {}
+        for step, latencies in self.latencies.items():
+            statuses = self.statuses[step]
+            steps[step] = {
+                'requests': len(latencies),
+                'errors': sum(count for status, count in statuses.items() if status >= 400),
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+                'latency_ms': summarize(latencies),
+            }
+        total = sum(step['requests'] for step in steps.values())
+        return {
+            'requests': total,
+            'errors': sum(step['errors'] for step in steps.values()),
+            'seconds': round(elapsed, 3),
+            'throughput': round(total / elapsed, 2) if elapsed else None,
+            'latency_ms': summarize([x for latencies in self.latencies.values() for x in latencies]),
+            'steps': steps,
+        }
+
+
+def bearer(user_id):
+    return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+
+def run_workers(target, workers):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def auth_scenario(app, args, recorder):
+    run_id = f"{int(time.time())}{os.getpid()}"
+
+    def worker(index):
+        client = app.test_client()
+        for i in range(args.iterations):
+            email = f"load_{run_id}_{index}_{i}@example.com"
+            recorder.request(client, 'register', 'POST', '/register',
+                             json={'username': f"load_{index}_{i}", 'email': email, 'password': PASSWORD})
+            recorder.request(client, 'login', 'POST', '/login', json={'email': email, 'password': PASSWORD})
+
+    return run_workers(worker, args.workers)
+
+
+def spin_scenario(app, args, recorder, users):
+    def worker(index):
+        client = app.test_client()
+        headers = users[index]
+        for _ in range(args.iterations):
+            recorder.request(client, 'deposit', 'POST', '/deposit', json={'amount': args.spins}, headers=headers)
+            for _ in range(args.spins):
+                recorder.request(client, 'play', 'POST', '/games/spin-and-win/play',
+                                 json={'bet_amount': 1}, headers=headers)
+
+    return run_workers(worker, args.workers)
+
+
+def start_round(room_id, user_ids, bullet_position):
+    """What a round start would do: seat everyone and load the chamber."""
+    from models import GameSession, Multiplayer, RussianRoulette
+
+    # Seeded rounds may share the session id, the room's own is the newest
+    multiplayer = Multiplayer.query.filter_by(session_id=room_id).order_by(Multiplayer.id.desc()).first()
+    multiplayer.status = 'active'
+    db.session.add_all([GameSession(user_id=user_id, game_id=multiplayer.game_id,
+                                    multiplayer_id=multiplayer.id, status='active') for user_id in user_ids])
+    roulette = RussianRoulette(multiplayer_id=multiplayer.id, game_id=multiplayer.game_id,
+                               bullet_position=bullet_position, current_position=1, status='active')
+    db.session.add(roulette)
+    db.session.commit()
+    return roulette.id
+
+
+def rooms_scenario(app, args, recorder, users, user_ids, game_id):
+    def worker(index):
+        client = app.test_client()
+        rng = random.Random(args.seed + index)
+        players = range(index * PLAYERS_PER_ROOM, (index + 1) * PLAYERS_PER_ROOM)
+        creator = players[0]
+        for _ in range(args.iterations):
+            response = recorder.request(client, 'create', 'POST', '/rooms/create',
+                                        json={'game_id': game_id}, headers=users[creator])
+            if response.status_code != 200:
+                continue
+            room_id = response.get_json()['room_id']
+            for player in players[1:]:
+                recorder.request(client, 'join', 'POST', '/rooms/join', json={'room_id': room_id}, headers=users[player])
+            with app.app_context():
+                roulette_id = start_round(room_id, [user_ids[player] for player in players], rng.randint(1, 6))
+            for n, player in enumerate(players):
+                recorder.request(client, 'place_bet', 'POST', '/games/place-bet', headers=users[player], json={
+                    'roulette_id': roulette_id, 'bet_amount': 1, 'bet_type': ('survival', 'elimination')[n % 2]})
+            for _ in range(6):
+                response = recorder.request(client, 'pull_trigger', 'POST', '/games/pull-trigger',
+                                            json={'roulette_id': roulette_id}, headers=users[creator])
+                if response.status_code != 200 or response.get_json()['game_over']:
+                    break
+
+    return run_workers(worker, args.workers)
+
+
+def sse_scenario(app, args, recorder, users, user_ids):
+    hub = app.extensions['event_hub']
+    connected = threading.Semaphore(0)
+    received = Counter()
+
+    def listen(index):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.get('/events/connect', headers=users[index], buffered=False)
+        try:
+            for chunk in response.response:
+                for line in chunk.decode().splitlines():
+                    if not line.startswith('data: '):
+                        continue
+                    event = json.loads(line[len('data: '):])
+                    if event['type'] == 'connected':
+                        recorder.observe('connect', time.perf_counter() - start, response.status_code)
+                        connected.release()
+                    elif event['type'] == 'load':
+                        recorder.observe('delivery', time.perf_counter() - event['sent'])
+                        received[index] += 1
+                        if event['last']:
+                            return
+        finally:
+            response.close()
+
+    threading.stack_size(256 * 1024)
+    listeners = [threading.Thread(target=listen, args=(i,), daemon=True) for i in range(args.listeners)]
+    start = time.perf_counter()
+    for listener in listeners:
+        listener.start()
+    for _ in listeners:
+        connected.acquire()
+    for i in range(args.events):
+        time.sleep(args.interval)
+        hub.publish(user_ids[:args.listeners], {'type': 'load', 'sent': time.perf_counter(),
+                                                'last': i == args.events - 1})
+    for listener in listeners:
+        listener.join(timeout=30)
+    elapsed = time.perf_counter() - start
+    missed = args.listeners * args.events - sum(received.values())
+    if missed:
+        recorder.statuses['delivery'][599] += missed  # counted as errors: never delivered
+    return elapsed
+
+
+def git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {'commit': commit, 'dirty': dirty}
+
+
+def compare(report, baseline):
+    print(f"{'scenario':<8} {'':<12} {'baseline':>10} {'this run':>10} {'change':>8}")
+    for name, scenario in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or not before['latency_ms'] or not scenario['latency_ms']:
+            continue
+        rows = [('throughput', before['throughput'], scenario['throughput'])]
+        rows += [(f'{q} ms', before['latency_ms'][q], scenario['latency_ms'][q]) for q in ('p50', 'p95', 'p99')]
+        for label, old, new in rows:
+            change = f"{(new - old) / old * 100:+.1f}%" if old else ''
+            print(f"{name:<8} {label:<12} {old:>10.2f} {new:>10.2f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gevent', action='store_true')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated, from ' + ', '.join(SCENARIOS))
+    parser.add_argument('--workers', type=int, default=8, help='concurrent clients per scenario')
+    parser.add_argument('--iterations', type=int, default=20, help='rounds per client')
+    parser.add_argument('--spins', type=int, default=5, help='plays per deposit')
+    parser.add_argument('--listeners', type=int, default=200, help='SSE connections held')
+    parser.add_argument('--events', type=int, default=20, help='events published to the SSE listeners')
+    parser.add_argument('--interval', type=float, default=0.05, help='seconds between SSE events')
+    parser.add_argument('--rounds', type=int, default=4,
+                        help='bcrypt work factor; low so auth measures the app rather than bcrypt')
+    parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON report here; "-" for stdout')
+    parser.add_argument('--compare', help='a previous JSON report to compare against')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/loadtest.db"
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'BCRYPT_LOG_ROUNDS': args.rounds,
+        'PASSWORD_HASH_WORKERS': args.hash_workers,
+        'SSE_HEARTBEAT_INTERVAL': 1.0,
+    })
+
+    from models import User
+
+    players = max(args.workers * PLAYERS_PER_ROOM, args.listeners if 'sse' in scenarios else 0)
+    with app.app_context():
+        ids = seed_database(users=players, bets=10000, sessions=1000, rooms=100, seed=args.seed)
+        user_ids = list(range(ids['user_id'], ids['user_id'] + players))
+        User.query.filter(User.id.in_(user_ids)).update(
+            {'password': PasswordHasher(args.rounds, workers=0).hash(PASSWORD), 'balance': 10**9},
+            synchronize_session=False)
+        db.session.commit()
+        app.extensions['game_catalog'].refresh(force=True)
+        users = [bearer(user_id) for user_id in user_ids]
+        dialect = db.engine.dialect.name
+
+    report = {
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'database': dialect,
+        'mode': 'gevent' if args.gevent else 'threads',
+        'options': {key: value for key, value in vars(args).items()
+                    if key not in ('database_url', 'output', 'compare')},
+        'scenarios': {},
+    }
+    for name in scenarios:
+        recorder = Recorder()
+        if name == 'auth':
+            elapsed = auth_scenario(app, args, recorder)
+        elif name == 'spin':
+            elapsed = spin_scenario(app, args, recorder, users)
+        elif name == 'rooms':
+            elapsed = rooms_scenario(app, args, recorder, users, user_ids, ids['roulette_game_id'])
+        else:
+            elapsed = sse_scenario(app, args, recorder, users, user_ids)
+        report['scenarios'][name] = result = recorder.report(elapsed)
+        if args.output != '-':
+            latency = result['latency_ms'] or {}
+            print(f"{name:<6} {result['requests']:>6} requests, {result['errors']} errors, "
+                  f"{result['throughput']}/s, p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, "
+                  f"p99 {latency.get('p99')} ms")
+    app.extensions['password_hasher'].shutdown()
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
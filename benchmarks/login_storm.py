@@ -0,0 +1,121 @@
+"""Measure game route latency while a storm of /login requests runs, with
+bcrypt in the request (PASSWORD_HASH_WORKERS=0) or in the process pool.
+
+Usage:
+    python benchmarks/login_storm.py --gevent --logins 32 --seconds 10
+    python benchmarks/login_storm.py --gevent --hash-workers 0   # inline bcrypt
+
+With --gevent every request is a greenlet on one OS thread, as under
+`gunicorn -k gevent`, so inline bcrypt stalls every other request of the
+worker. One player spins /games/spin-and-win/play in a loop throughout; its
+latency is reported before and during the storm, with the login throughput,
+the 503s from backpressure and the deepest hashing queue seen.
+"""
+import sys
+
+if '--gevent' in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from passwords import PasswordHasher
+from seed import seed_database
+
+
+def percentiles(latencies):
+    if not latencies:
+        return "no request completed"
+    ms = sorted(x * 1000 for x in latencies)
+    return f"p50 {statistics.median(ms):.1f} ms, p99 {ms[min(int(len(ms) * 0.99), len(ms) - 1)]:.1f} ms, max {ms[-1]:.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gevent', action='store_true')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--logins', type=int, default=32, help='concurrent login loops')
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/login_bench.db"
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'BCRYPT_LOG_ROUNDS': args.rounds,
+        'PASSWORD_HASH_WORKERS': args.hash_workers,
+    })
+    hasher = app.extensions['password_hasher']
+
+    from models import User
+
+    with app.app_context():
+        ids = seed_database(users=args.logins + 1, bets=0, sessions=0, rooms=1)
+        pw_hash = PasswordHasher(args.rounds, workers=0).hash('secret')
+        User.query.update({'password': pw_hash, 'balance': 10**9})
+        db.session.commit()
+        app.extensions['game_catalog'].refresh(force=True)
+        player = {'Authorization': f"Bearer {create_access_token(identity=str(ids['user_id']))}"}
+        emails = [f"bench_{ids['user_id'] + i}@example.com" for i in range(1, args.logins + 1)]
+    hasher.check(pw_hash, 'secret')  # start the pool before timing
+
+    # Loops stop on a deadline rather than an event: under gevent with inline
+    # bcrypt a login greenlet may never yield to whoever would set it
+    storm = threading.Event()
+    deadline = [float('inf')]
+    latencies = {'before': [], 'during': []}
+    outcomes = {}
+    depth = [0]
+
+    def play():
+        client = app.test_client()
+        while time.perf_counter() < deadline[0]:
+            start = time.perf_counter()
+            response = client.post('/games/spin-and-win/play', json={'bet_amount': 1}, headers=player)
+            assert response.status_code == 200, response.get_json()
+            latencies['during' if storm.is_set() else 'before'].append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    def login(email):
+        client = app.test_client()
+        while time.perf_counter() < deadline[0]:
+            status = client.post('/login', json={'email': email, 'password': 'secret'}).status_code
+            outcomes[status] = outcomes.get(status, 0) + 1
+            depth[0] = max(depth[0], hasher.queue_depth())
+
+    player_thread = threading.Thread(target=play)
+    player_thread.start()
+    time.sleep(min(args.seconds, 2))
+    storm.set()
+    start = time.perf_counter()
+    deadline[0] = start + args.seconds
+    loops = [threading.Thread(target=login, args=(email,)) for email in emails]
+    for loop in loops:
+        loop.start()
+    for thread in loops + [player_thread]:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    hasher.shutdown()
+
+    mode = f"{args.hash_workers} hashing processes" if args.hash_workers else "inline bcrypt"
+    print(f"{'gevent' if args.gevent else 'threads'}, {mode}, work factor {args.rounds}, {args.logins} login loops")
+    print(f"game latency before storm: {percentiles(latencies['before'])}")
+    print(f"game latency during storm: {percentiles(latencies['during'])}")
+    print(f"logins: {outcomes.get(200, 0) / elapsed:.1f}/s ok, {outcomes.get(503, 0)} shed with 503, "
+          f"deepest queue {depth[0]}")
+
+
+if __name__ == '__main__':
+    main()
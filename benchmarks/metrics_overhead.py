@@ -0,0 +1,97 @@
+"""Measure what the /metrics instrumentation adds to a request.
+
+Usage:
+    python benchmarks/metrics_overhead.py --requests 2000
+
+Times the request hooks and the per-statement engine listeners of
+metrics.Metrics directly, which is the cost added to each request. Then
+times GET /profile with the profile cache off (one statement) through the
+test client with the instrumentation on and off, alternating rounds and
+keeping the best, as a check that nothing else was added.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from seed import seed_database
+
+
+def per_request_us(client, url, headers, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        client.get(url, headers=headers)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def hooks_us(app, metrics, count):
+    response = app.response_class()
+    context = type('Context', (), {})()
+    with app.test_request_context('/profile'):
+        start = time.perf_counter()
+        for _ in range(count):
+            metrics._before_request()
+            metrics._before_cursor_execute(None, None, None, None, context, False)
+            metrics._after_cursor_execute(None, None, None, None, context, False)
+            metrics._after_request(response)
+        return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/metrics_bench.db"
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'PROFILE_CACHE_TTL': 0})
+    metrics = app.extensions['metrics']
+
+    with app.app_context():
+        user_id = seed_database(users=1, bets=0, sessions=0, rooms=1)['user_id']
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+        engine = db.engine
+
+    print(f"request hooks + one statement: {hooks_us(app, metrics, args.requests * 10):.2f} us per request")
+
+    hooks = [
+        (app.before_request_funcs[None], metrics._before_request),
+        (app.after_request_funcs[None], metrics._after_request),
+    ]
+    listeners = [
+        ('before_cursor_execute', metrics._before_cursor_execute),
+        ('after_cursor_execute', metrics._after_cursor_execute),
+    ]
+
+    def instrumented(on):
+        for funcs, hook in hooks:
+            if on:
+                funcs.insert(0, hook)
+            else:
+                funcs.remove(hook)
+        for name, listener in listeners:
+            (event.listen if on else event.remove)(engine, name, listener)
+
+    client = app.test_client()
+    best = {True: float('inf'), False: float('inf')}
+    for _ in range(5):
+        for on in (False, True):
+            if not on:
+                instrumented(False)
+            best[on] = min(best[on], per_request_us(client, '/profile', headers, args.requests))
+            if not on:
+                instrumented(True)
+    print(f"GET /profile: {best[False]:.1f} us without metrics, {best[True]:.1f} us with")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Drive /games/spin-and-win/play from more threads than the connection pool
+has connections and report what /internal/pool saw.
+
+Usage:
+    python benchmarks/pool_pressure.py --database-url postgresql://... --threads 32 --pool-size 5 --max-overflow 10
+
+Each thread plays --spins spins as its own user. Prints throughput, the pool
+state at the end and how long checkouts waited for a connection, from the
+wait histogram.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from seed import seed_database
+
+
+def bucket_quantile(buckets, count, q):
+    """Upper bound of the bucket holding the q-quantile of the waits."""
+    for bound, cumulative in buckets:
+        if cumulative >= q * count:
+            return bound
+    return '+Inf'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--spins', type=int, default=50)
+    parser.add_argument('--pool-size', type=int, default=5)
+    parser.add_argument('--max-overflow', type=int, default=10)
+    parser.add_argument('--pool-timeout', type=float, default=10)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/pool_bench.db"
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'DB_POOL_SIZE': args.pool_size,
+        'DB_MAX_OVERFLOW': args.max_overflow,
+        'DB_POOL_TIMEOUT': args.pool_timeout,
+    })
+
+    with app.app_context():
+        ids = seed_database(users=args.threads, bets=0, sessions=0, rooms=1)
+        app.extensions['game_catalog'].refresh(force=True)
+        headers = [{'Authorization': f'Bearer {create_access_token(identity=str(ids["user_id"] + i))}'}
+                   for i in range(args.threads)]
+
+    statuses = {}
+    lock = threading.Lock()
+
+    def play(header):
+        client = app.test_client()
+        for _ in range(args.spins):
+            status = client.post('/games/spin-and-win/play', json={'bet_amount': 1}, headers=header).status_code
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=play, args=(header,)) for header in headers]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats = app.test_client().get('/internal/pool').get_json()['default']
+    waits = stats['wait_seconds']
+    print(f"{args.threads} threads, pool_size {args.pool_size} + overflow {args.max_overflow}: "
+          f"{sum(statuses.values()) / elapsed:.0f} requests/s, statuses {statuses}")
+    print(f"pool now: {stats['checked_out']} checked out, {stats['checked_in']} idle, overflow {stats['overflow']}")
+    print(f"checkout waits: {waits['count']}, mean {waits['sum'] / waits['count'] * 1000:.2f} ms, "
+          f"p50 <= {bucket_quantile(waits['buckets'], waits['count'], 0.5)} s, "
+          f"p99 <= {bucket_quantile(waits['buckets'], waits['count'], 0.99)} s, {waits['timeouts']} timeouts")
+
+
+if __name__ == '__main__':
+    main()
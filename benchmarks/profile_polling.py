@@ -0,0 +1,83 @@
+"""Count the users reads of clients polling /profile while they play, with
+and without the profile cache behind current_user.
+
+Usage:
+    python benchmarks/profile_polling.py --database-url postgresql://... --users 50 --polls 2000
+
+Each step a random user polls /profile, and every --spin-every steps one of
+them spins. Prints statements against users per /profile request and its
+latency, once with PROFILE_CACHE_TTL=0 and once with --ttl. Exits non-zero
+if a poll right after a spin does not show the balance the spin returned.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from seed import seed_database
+
+
+def run(database_url, ttl, args):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'PROFILE_CACHE_TTL': ttl})
+    rng = random.Random(11)
+    reads = [0]
+
+    def count_users_reads(conn, cursor, statement, *rest):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM users' in statement:
+            reads[0] += 1
+
+    with app.app_context():
+        ids = seed_database(users=args.users, bets=0, sessions=0, rooms=1)
+        app.extensions['game_catalog'].refresh(force=True)
+        headers = [{'Authorization': f'Bearer {create_access_token(identity=str(ids["user_id"] + i))}'}
+                   for i in range(args.users)]
+        event.listen(db.engine, 'before_cursor_execute', count_users_reads)
+
+    client = app.test_client()
+    latencies = []
+    profile_reads = 0
+    for step in range(args.polls):
+        user = rng.randrange(args.users)
+        if step % args.spin_every == 0:
+            spun = client.post('/games/spin-and-win/play', json={'bet_amount': 1}, headers=headers[user]).get_json()
+        else:
+            spun = None
+        reads[0] = 0
+        start = time.perf_counter()
+        profile = client.get('/profile', headers=headers[user]).get_json()
+        latencies.append((time.perf_counter() - start) * 1000)
+        profile_reads += reads[0]
+        if spun is not None and 'new_balance' in spun and profile['balance'] != spun['new_balance']:
+            raise SystemExit(f"ttl {ttl}: /profile shows {profile['balance']} after a spin left {spun['new_balance']}")
+    return profile_reads / args.polls, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--polls', type=int, default=2000)
+    parser.add_argument('--spin-every', type=int, default=20)
+    parser.add_argument('--ttl', type=float, default=2.0)
+    args = parser.parse_args()
+
+    for ttl in (0, args.ttl):
+        database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/profile_bench.db"
+        per_request, median_ms = run(database_url, ttl, args)
+        label = 'no cache' if not ttl else f'ttl {ttl:g}s'
+        print(f"{label:>10}: {per_request:.2f} users reads per /profile, median {median_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Check which database serves /history, /stats and /users with a replica
+bind, including right after the user's own write.
+
+Usage:
+    python benchmarks/replica_routing.py
+    python benchmarks/replica_routing.py --database-url postgresql://primary/... --replica-url postgresql://standby/...
+
+Without URLs the primary is a scratch SQLite file, seeded and then copied
+to a second file that plays a replica that stopped replaying. A Postgres
+--replica-url must be a streaming standby of --database-url. Counts the
+statements each engine ran per request and exits non-zero if a read went
+to the wrong one.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from seed import seed_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--replica-url', default=os.getenv('REPLICA_DATABASE_URI'))
+    parser.add_argument('--read-your-writes', type=float, default=1.0)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    database_url = args.database_url or f"sqlite:///{scratch}/primary.db"
+    if not args.replica_url:
+        seeder = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+        with seeder.app_context():
+            seed_database(users=2, bets=200, sessions=0, rooms=1)
+            db.session.commit()
+            db.engine.dispose()
+        shutil.copy(f"{scratch}/primary.db", f"{scratch}/replica.db")
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'REPLICA_DATABASE_URI': args.replica_url or f"sqlite:///{scratch}/replica.db",
+        'REPLICA_READ_YOUR_WRITES': args.read_your_writes,
+        'PROFILE_CACHE_TTL': 3600,
+    })
+    counts = {'primary': 0, 'replica': 0}
+
+    with app.app_context():
+        if args.replica_url:
+            seed_database(users=2, bets=200, sessions=0, rooms=1)
+            db.session.commit()
+            time.sleep(1)  # let the standby replay the seed
+        from models import User
+        first, second = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id.desc()).limit(2)][::-1]
+        app.extensions['game_catalog'].refresh(force=True)
+        headers = {user_id: {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+                   for user_id in (first, second)}
+        for name, engine in (('primary', db.engines[None]), ('replica', db.engines['replica'])):
+            event.listen(engine, 'before_cursor_execute',
+                         lambda *rest, name=name: counts.__setitem__(name, counts[name] + 1))
+
+    client = app.test_client()
+    errors = []
+
+    def served_by(url, user_id, expected):
+        client.get('/profile', headers=headers[user_id])  # current_user is cached from here on
+        before = dict(counts)
+        response = client.get(url, headers=headers[user_id])
+        assert response.status_code == 200, response.get_json()
+        used = {name: counts[name] - before[name] for name in counts}
+        source = 'replica' if used['replica'] and not used['primary'] else 'primary'
+        print(f"{url:<12} user {user_id}: {used['primary']} primary / {used['replica']} replica statements")
+        if source != expected:
+            errors.append(f"{url} for user {user_id} went to the {source}, expected the {expected}")
+        return response
+
+    for url in ('/history', '/stats', '/users?limit=10'):
+        served_by(url, first, 'replica')
+
+    print(f"user {first} spins")
+    client.post('/games/spin-and-win/play', json={'bet_amount': 1}, headers=headers[first])
+    history = served_by('/history', first, 'primary').get_json()['gameHistory']
+    served_by('/history', second, 'replica')
+    if not args.replica_url and history[0]['gameType'] != 'Spin and Win':
+        errors.append("the primary read after the spin does not show it")
+
+    time.sleep(args.read_your_writes)
+    print(f"after {args.read_your_writes:g}s")
+    served_by('/history', first, 'replica')
+
+    if errors:
+        raise SystemExit("\n".join(errors))
+    print("every read was routed as expected")
+
+
+if __name__ == '__main__':
+    main()
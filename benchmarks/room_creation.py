@@ -0,0 +1,114 @@
+"""Compare room creations per second with the old three-commit create_room
+and the single-transaction one, then race many users for the seats of one
+room through /rooms/join.
+
+Usage:
+    python benchmarks/room_creation.py --database-url postgresql://... --rooms 2000 --joiners 50
+
+The old flow is registered on the benchmark app as /bench/legacy-create so
+both run through the same request stack. Exits non-zero if a room ends up
+with more players than seats or with player counts that disagree with its
+room sessions.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import jsonify, request
+from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+
+from app import create_app
+from extensions import db
+from seed import seed_database
+
+
+def legacy_create_room():
+    """create_room as it was before the single transaction, minus broadcasts."""
+    from models import Multiplayer, Room, RoomSession
+
+    user_id = get_jwt_identity()
+    game_id = request.get_json()['game_id']
+
+    room = Room(game_id=game_id, creator_id=user_id, status='waiting')
+    db.session.add(room)
+    db.session.commit()
+
+    room_id = room.id
+    room = Room.query.get(room_id)
+
+    multiplayer = Multiplayer(session_id=room_id, game_id=game_id, max_players=6, current_players=1, status='waiting')
+    db.session.add(multiplayer)
+    db.session.commit()
+
+    db.session.add(RoomSession(user_id=user_id, room_id=room.id, status='active'))
+    db.session.commit()
+    return jsonify({'room_id': room.id}), 200
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--joiners', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/rooms_bench.db"
+    config = {'SQLALCHEMY_DATABASE_URI': database_url}
+    if database_url.startswith('sqlite'):
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 60}}
+    app = create_app(config)
+    app.add_url_rule('/bench/legacy-create', 'legacy_create_room', jwt_required()(legacy_create_room),
+                     methods=['POST'])
+
+    from models import Multiplayer, RoomSession
+
+    with app.app_context():
+        ids = seed_database(users=args.joiners + 1, bets=0, sessions=0, rooms=1)
+        app.extensions['game_catalog'].refresh(force=True)
+        user_ids = list(range(ids['user_id'], ids['user_id'] + args.joiners + 1))
+        tokens = [create_access_token(identity=str(user_id)) for user_id in user_ids]
+    headers = [{'Authorization': f'Bearer {token}'} for token in tokens]
+    client = app.test_client()
+
+    rates = {}
+    for name, url in (('three commits', '/bench/legacy-create'), ('one transaction', '/rooms/create')):
+        start = time.perf_counter()
+        for _ in range(args.rooms):
+            response = client.post(url, json={'game_id': ids['roulette_game_id']}, headers=headers[0])
+            assert response.status_code == 200, response.get_json()
+        elapsed = time.perf_counter() - start
+        rates[name] = args.rooms / elapsed
+        print(f"{name:<16} {args.rooms} rooms in {elapsed:.2f}s: {rates[name]:.0f} rooms/s")
+    print(f"speedup: {rates['one transaction'] / rates['three commits']:.1f}x")
+
+    room_id = client.post('/rooms/create', json={'game_id': ids['roulette_game_id']},
+                          headers=headers[0]).get_json()['room_id']
+
+    def join(i):
+        return app.test_client().post('/rooms/join', json={'room_id': room_id}, headers=headers[i]).status_code
+
+    with ThreadPoolExecutor(args.threads) as pool:
+        outcomes = Counter(pool.map(join, range(1, args.joiners + 1)))
+    print(f"{args.joiners} users joining a 6-seat room: {dict(outcomes)}")
+
+    with app.app_context():
+        multiplayer = Multiplayer.query.filter_by(session_id=room_id).one()
+        sessions = RoomSession.query.filter_by(room_id=room_id, status='active').count()
+        members = len(app.extensions['room_membership'].room_members(room_id))
+    if not (multiplayer.current_players == sessions == members <= multiplayer.max_players) \
+            or outcomes[200] != multiplayer.current_players - 1:
+        raise SystemExit(f"players {multiplayer.current_players}, sessions {sessions}, members {members}, "
+                         f"seats {multiplayer.max_players}")
+    print(f"room filled to {multiplayer.current_players}/{multiplayer.max_players}; "
+          "sessions and membership agree")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Measure /games/pull-trigger latency with the room engine in write-behind
+and in write-through mode, and check that checkpoints survive a restart.
+
+Usage:
+    python benchmarks/room_engine.py --database-url postgresql://... --rounds 500
+
+Every round has its bullet in the last chamber, so each one gets five pulls
+that keep it running before the pull that ends it. Only the running pulls
+are timed, since ending a round settles its bets in the request either way.
+The engine step (lock, trigger, queue checkpoint) is also timed on its own,
+without HTTP, JWT or database work.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from rooms import RoomEngine
+from seed import seed_database
+
+
+def add_rounds(count, game_id, user_id):
+    from models import GameSession, Multiplayer, RussianRoulette
+
+    ids = []
+    for i in range(count):
+        multiplayer = Multiplayer(session_id=i + 1, game_id=game_id, max_players=6, current_players=1, status='active')
+        db.session.add(multiplayer)
+        db.session.flush()
+        db.session.add(GameSession(user_id=user_id, game_id=game_id, multiplayer_id=multiplayer.id, status='active'))
+        roulette = RussianRoulette(multiplayer_id=multiplayer.id, game_id=game_id,
+                                   bullet_position=6, current_position=1, status='active')
+        db.session.add(roulette)
+        db.session.flush()
+        ids.append(roulette.id)
+    db.session.commit()
+    return ids
+
+
+def engine_step(engine, count):
+    """Time the room engine's part of a pull that keeps a round running."""
+    import roulette_rules
+    from rooms import LiveRound
+
+    engine._rounds[0] = LiveRound(0, 0, 0, 0, roulette_rules.CHAMBERS + 1, 1, 'active')
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        with engine.round(0) as live:
+            is_hit, game_over = roulette_rules.trigger(live.current_position, live.bullet_position)
+            live.current_position = 1
+            engine.checkpoint(live)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    engine.forget(live)
+    return sorted(latencies)
+
+
+def run(app, roulette_ids, headers):
+    client = app.test_client()
+    latencies = []
+    for roulette_id in roulette_ids:
+        for _ in range(5):
+            start = time.perf_counter()
+            response = client.post('/games/pull-trigger', json={'roulette_id': roulette_id}, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200 and not response.get_json()['game_over'], response.get_json()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--rounds', type=int, default=500)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/rooms_bench.db"
+    from models import RussianRoulette
+
+    results = {}
+    for mode, write_behind in (('write-through', False), ('write-behind', True)):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'ROOM_WRITE_BEHIND': write_behind})
+        with app.app_context():
+            ids = seed_database(users=1, bets=0, sessions=0, rooms=1)
+            roulette_ids = add_rounds(args.rounds, ids['roulette_game_id'], ids['user_id'])
+            app.extensions['room_engine'].warm()
+            headers = {'Authorization': f"Bearer {create_access_token(identity=str(ids['user_id']))}"}
+
+        latencies = sorted(run(app, roulette_ids, headers))
+        results[mode] = latencies
+        print(f"{mode:<14} {len(latencies)} pulls: p50 {statistics.median(latencies):.3f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.3f} ms")
+
+        engine = app.extensions['room_engine']
+        engine.flush()
+        with app.app_context():
+            positions = dict(db.session.query(RussianRoulette.id, RussianRoulette.current_position)
+                             .filter(RussianRoulette.id.in_(roulette_ids)))
+            if any(position != 6 for position in positions.values()):
+                raise SystemExit(f"{mode}: checkpoints missing from the database")
+            restarted = RoomEngine()
+            restarted.rebuild()
+            if any(restarted._rounds[i].current_position != 6 for i in roulette_ids):
+                raise SystemExit(f"{mode}: rebuilt rounds do not match the checkpoints")
+
+    steps = engine_step(RoomEngine(), 100000)
+    print(f"engine step alone: p50 {statistics.median(steps):.1f} us, p99 {steps[int(len(steps) * 0.99) - 1]:.1f} us")
+
+    speedup = statistics.median(results['write-through']) / statistics.median(results['write-behind'])
+    print(f"median speedup: {speedup:.1f}x; checkpoints persisted and rebuilt after restart")
+
+
+if __name__ == '__main__':
+    main()
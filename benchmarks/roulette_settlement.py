@@ -0,0 +1,149 @@
+"""Time the settlement of a Russian Roulette round with many spectator bets,
+per-bet (as pull_trigger used to) and set-based (as it does now).
+
+Usage:
+    python benchmarks/roulette_settlement.py --database-url postgresql://... --bets 10000 --other-bets 50000
+
+One room of 6 players gets --bets active bets from --spectators users, while
+--other-bets active bets sit on other open rounds of the same game. The old
+per-bet loop runs first and is rolled back; then the round is ended through
+/games/pull-trigger. Exits non-zero if balances, bets or the stats rollup do
+not match the expected payouts, or if bets of other rounds were touched.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from querybudget import REPEAT_LIMIT, QueryCounter
+from seed import _insert_batched, seed_database
+import roulette_rules
+
+
+def legacy_settle(game_id, is_hit):
+    """The per-bet loop pull_trigger ran before set-based settlement."""
+    from models import BetHistory, User
+
+    bets = BetHistory.query.filter_by(game_id=game_id, status='active').all()
+    for bet in bets:
+        if (bet.bet_type == 'survival' and not is_hit) or (bet.bet_type == 'elimination' and is_hit):
+            win_amount = bet.bet_amount * 2.0
+            bet.win_amount = win_amount
+            bet.net_result = win_amount - bet.bet_amount
+            better = User.query.get(bet.user_id)
+            if better:
+                better.balance += win_amount
+        else:
+            bet.win_amount = 0
+            bet.net_result = -bet.bet_amount
+        bet.status = 'completed'
+    db.session.flush()
+    return len(bets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--bets', type=int, default=10000)
+    parser.add_argument('--spectators', type=int, default=1000)
+    parser.add_argument('--other-bets', type=int, default=50000)
+    parser.add_argument('--other-rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/settlement_bench.db"
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    rng = random.Random(7)
+
+    from models import BetHistory, GameSession, RussianRoulette, User, UserGameStats
+
+    with app.app_context():
+        ids = seed_database(users=6 + args.spectators, bets=0, sessions=0, rooms=args.other_rounds + 1)
+        app.extensions['game_catalog'].refresh(force=True)
+        game_id, roulette_id = ids['roulette_game_id'], ids['roulette_id']
+        players = list(range(ids['user_id'], ids['user_id'] + 6))
+        spectators = list(range(ids['user_id'] + 6, ids['user_id'] + 6 + args.spectators))
+        other_rounds = list(range(roulette_id - args.other_rounds, roulette_id))
+
+        roulette = db.session.get(RussianRoulette, roulette_id)
+        roulette.current_position = roulette.bullet_position  # the next pull ends the round
+        db.session.add_all([GameSession(user_id=user_id, game_id=game_id, multiplayer_id=ids['multiplayer_id'],
+                                        status='active') for user_id in players])
+
+        def bets(count, rounds):
+            rows = []
+            for _ in range(count):
+                bet_amount = float(rng.randint(1, 100))
+                rows.append({
+                    'user_id': rng.choice(spectators),
+                    'game_id': game_id,
+                    'roulette_id': rng.choice(rounds),
+                    'bet_amount': bet_amount,
+                    'bet_type': rng.choice(roulette_rules.BET_TYPES),
+                    'status': 'active',
+                })
+            return rows
+
+        _insert_batched(BetHistory, bets(args.bets, [roulette_id]))
+        _insert_batched(BetHistory, bets(args.other_bets, other_rounds))
+        db.session.commit()
+
+        expected = defaultdict(float)
+        for user_id, bet_type, bet_amount in db.session.query(
+                BetHistory.user_id, BetHistory.bet_type, BetHistory.bet_amount).filter_by(roulette_id=roulette_id):
+            expected[user_id] += roulette_rules.payout(bet_type, bet_amount, True)
+        balances = dict(db.session.query(User.id, User.balance))
+
+        with QueryCounter(db.engine) as legacy:
+            start = time.perf_counter()
+            settled = legacy_settle(game_id, True)
+            legacy_ms = (time.perf_counter() - start) * 1000
+        db.session.rollback()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(players[0]))}'}
+        app_engine = db.engine
+
+    client = app.test_client()
+    with QueryCounter(app_engine) as counter:
+        start = time.perf_counter()
+        response = client.post('/games/pull-trigger', json={'roulette_id': roulette_id}, headers=headers)
+        set_based_ms = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200 and response.get_json()['game_over'], response.get_json()
+
+    print(f"round with {args.bets} bets, {args.other_bets} active bets on {args.other_rounds} other rounds")
+    print(f"per-bet loop (game-scoped): {settled} bets settled, {legacy.count} statements "
+          f"({len(legacy.repeated())} run more than {REPEAT_LIMIT} times), {legacy_ms:.1f} ms")
+    print(f"set-based pull_trigger:     {args.bets} bets settled, {counter.count} statements "
+          f"({len(counter.repeated())} run more than {REPEAT_LIMIT} times), {set_based_ms:.1f} ms")
+
+    errors = []
+    with app.app_context():
+        for user_id, balance in db.session.query(User.id, User.balance):
+            if not math.isclose(balance, balances[user_id] + expected[user_id], abs_tol=1e-6):
+                errors.append(f"user {user_id}: balance {balance}, expected {balances[user_id] + expected[user_id]}")
+        for user_id, total_won in db.session.query(UserGameStats.user_id, UserGameStats.total_won):
+            if not math.isclose(total_won, expected[user_id], abs_tol=1e-6):
+                errors.append(f"user {user_id}: rollup total_won {total_won}, expected {expected[user_id]}")
+        unsettled = BetHistory.query.filter_by(roulette_id=roulette_id, status='active').count()
+        wrong = BetHistory.query.filter(BetHistory.roulette_id == roulette_id,
+                                        BetHistory.net_result != BetHistory.win_amount - BetHistory.bet_amount).count()
+        others = BetHistory.query.filter(BetHistory.roulette_id.in_(other_rounds), BetHistory.status == 'active').count()
+        if unsettled or wrong:
+            errors.append(f"{unsettled} bets of the round still active, {wrong} with a wrong net_result")
+        if others != args.other_bets:
+            errors.append(f"only {others} of {args.other_bets} bets on other rounds are still active")
+    if errors:
+        raise SystemExit("\n".join(errors))
+    print("balances, bets and stats rollup match the expected payouts")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Seed a scratch database with synthetic users, games, sessions and bets.
+
+Shared by the scripts in this directory. Rows are written with Core bulk
+inserts so seeding a million bets takes seconds rather than minutes.
+"""
+import random
+from datetime import datetime, timedelta
+
+from extensions import db
+
+BATCH_SIZE = 10000
+
+GAMES = [
+    {'name': 'Spin and Win', 'description': 'Spin the wheel', 'min_bet': 1.0, 'max_bet': 1000.0},
+    {'name': 'Russian Roulette', 'description': 'Multiplayer roulette', 'min_bet': 1.0, 'max_bet': 1000.0},
+]
+
+
+def _insert_batched(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(db.insert(model), rows[start:start + BATCH_SIZE])
+
+
+def add_bets(user_ids, game_ids, rng, status_active=0.001, rounds=None):
+    """Insert one bet per entry of ``user_ids``, oldest first.
+
+    ``rounds`` maps a game id to the roulette rounds its bets are spread over.
+    """
+    from models import BetHistory
+
+    rounds = rounds or {}
+
+    now = datetime.utcnow()
+    total = len(user_ids)
+    rows = []
+    for i, user_id in enumerate(user_ids):
+        bet_amount = float(rng.randint(1, 100))
+        win_amount = bet_amount * rng.choice([0, 0, 0, 1, 2, 5])
+        game_id = rng.choice(game_ids)
+        rows.append({
+            'user_id': user_id,
+            'game_id': game_id,
+            'roulette_id': rng.choice(rounds[game_id]) if rounds.get(game_id) else None,
+            'bet_amount': bet_amount,
+            'win_amount': win_amount,
+            'net_result': win_amount - bet_amount,
+            'bet_type': None,
+            'status': 'active' if rng.random() < status_active else 'completed',
+            'created_at': now - timedelta(seconds=total - i),
+        })
+        if len(rows) == BATCH_SIZE:
+            _insert_batched(BetHistory, rows)
+            rows = []
+    _insert_batched(BetHistory, rows)
+
+
+def seed_database(users=100, bets=10000, sessions=10000, rooms=100, seed=42):
+    """Create tables (if missing) and fill them with synthetic rows.
+
+    Bets are spread over ``users`` with a skew towards low user ids so a few
+    heavy players own most of the history, like in production. Returns a dict
+    with the ids the benchmarks query for.
+    """
+    from models import User, Game, GameSession, Multiplayer, RussianRoulette
+
+    rng = random.Random(seed)
+    db.create_all()
+
+    now = datetime.utcnow()
+    base_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    _insert_batched(User, [{
+        'username': f'bench_{base_user + i}',
+        'email': f'bench_{base_user + i}@example.com',
+        'password': 'x',
+        'balance': 1000.0,
+        'created_at': now,
+        'updated_at': now,
+    } for i in range(users)])
+    user_ids = list(range(base_user, base_user + users))
+
+    game_ids = []
+    for game in GAMES:
+        existing = Game.query.filter_by(name=game['name']).first()
+        if not existing:
+            existing = Game(**game)
+            db.session.add(existing)
+            db.session.flush()
+        game_ids.append(existing.id)
+
+    base_mp = (db.session.query(db.func.max(Multiplayer.id)).scalar() or 0) + 1
+    _insert_batched(Multiplayer, [{
+        'session_id': base_mp + i,
+        'game_id': game_ids[-1],
+        'max_players': 6,
+        'current_players': 6,
+        'status': 'completed' if i < rooms - 1 else 'active',
+        'created_at': now,
+        'updated_at': now,
+    } for i in range(rooms)])
+    multiplayer_ids = list(range(base_mp, base_mp + rooms))
+
+    base_round = (db.session.query(db.func.max(RussianRoulette.id)).scalar() or 0) + 1
+    _insert_batched(RussianRoulette, [{
+        'multiplayer_id': multiplayer_id,
+        'game_id': game_ids[-1],
+        'bullet_position': rng.randint(1, 6),
+        'current_position': 1,
+        'status': 'completed' if i < rooms - 1 else 'active',
+        'created_at': now,
+        'updated_at': now,
+    } for i, multiplayer_id in enumerate(multiplayer_ids)])
+    roulette_ids = list(range(base_round, base_round + rooms))
+
+    def heavy_user():
+        return user_ids[min(int(rng.expovariate(5.0 / users)), users - 1)]
+
+    _insert_batched(GameSession, [{
+        'user_id': heavy_user(),
+        'game_id': rng.choice(game_ids),
+        'multiplayer_id': rng.choice(multiplayer_ids),
+        'status': 'active' if rng.random() < 0.01 else 'completed',
+        'created_at': now,
+        'updated_at': now,
+    } for _ in range(sessions)])
+
+    add_bets([heavy_user() for _ in range(bets)], game_ids, rng, rounds={game_ids[-1]: roulette_ids})
+    db.session.commit()
+
+    return {
+        'user_id': user_ids[0],
+        'game_id': game_ids[0],
+        'roulette_game_id': game_ids[-1],
+        'multiplayer_id': multiplayer_ids[-1],
+        'roulette_id': roulette_ids[-1],
+    }
@@ -0,0 +1,73 @@
+"""Compare per-spin throughput of /games/spin-and-win/play and play-batch.
+
+Usage:
+    python benchmarks/spin_batch.py --database-url postgresql://... --spins 2000 --batch 100
+
+Plays the same number of spins both ways for one user and prints spins per
+second, and checks that the balance moved by exactly the reported results.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from seed import seed_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--spins', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=100)
+    parser.add_argument('--bet', type=float, default=1.0)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/spin_bench.db"
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'SPIN_BATCH_MAX': args.batch})
+
+    from models import User
+
+    with app.app_context():
+        user_id = seed_database(users=1, bets=0, sessions=0, rooms=1)['user_id']
+        db.session.get(User, user_id).balance = args.spins * args.bet * 10
+        db.session.commit()
+        app.extensions['game_catalog'].refresh(force=True)
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+    client = app.test_client()
+
+    def balance():
+        return client.get('/profile', headers=headers).get_json()['balance']
+
+    rates = {}
+    for name in ('single', 'batch'):
+        before = balance()
+        net = 0.0
+        start = time.perf_counter()
+        if name == 'single':
+            for _ in range(args.spins):
+                body = client.post('/games/spin-and-win/play', json={'bet_amount': args.bet}, headers=headers).get_json()
+                net += body['win_amount'] - args.bet
+        else:
+            for _ in range(args.spins // args.batch):
+                body = client.post('/games/spin-and-win/play-batch',
+                                   json={'bet_amount': args.bet, 'spins': args.batch}, headers=headers).get_json()
+                assert len(body['spins']) == args.batch
+                net += body['total_win'] - body['total_bet']
+        elapsed = time.perf_counter() - start
+        rates[name] = args.spins / elapsed
+        assert abs(balance() - before - net) < 1e-6, f"{name}: balance does not match the results"
+        print(f"{name:<6} {args.spins} spins in {elapsed:.2f}s: {rates[name]:.0f} spins/s")
+
+    print(f"speedup: {rates['batch'] / rates['single']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Hold many idle SSE connections on one EventHub and measure how quickly a
+published event reaches all of them.
+
+Usage:
+    python benchmarks/sse_fanout.py --gevent --connections 10000 --events 50
+    python benchmarks/sse_fanout.py --connections 1000   # one OS thread each
+
+With --gevent every connection is a greenlet, as under `gunicorn -k gevent`.
+Reports connections held by the process, memory per connection and
+p50/p99/max delivery latency (publish call to payload read by the client).
+"""
+import sys
+
+if '--gevent' in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import EventHub
+
+
+def rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def consume(hub, user_id, latencies, ready):
+    stream = hub.stream(user_id, {'type': 'connected'})
+    next(stream)
+    ready.release()
+    for payload in stream:
+        event = json.loads(payload[len('data: '):])
+        if event['type'] == 'bench':
+            latencies.append(time.perf_counter() - event['sent'])
+            if event['last']:
+                break
+    stream.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gevent', action='store_true')
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    if not args.gevent:
+        threading.stack_size(256 * 1024)
+
+    hub = EventHub(heartbeat_interval=1.0)
+    latencies = []
+    ready = threading.Semaphore(0)
+    base_rss = rss_mib()
+
+    consumers = [threading.Thread(target=consume, args=(hub, i, latencies, ready), daemon=True)
+                 for i in range(args.connections)]
+    for consumer in consumers:
+        consumer.start()
+    for _ in consumers:
+        ready.acquire()
+    held = hub.connection_count()
+    per_connection_kib = (rss_mib() - base_rss) * 1024 / max(held, 1)
+
+    user_ids = range(args.connections)
+    start = time.perf_counter()
+    for i in range(args.events):
+        time.sleep(args.interval)
+        hub.publish(user_ids, {'type': 'bench', 'sent': time.perf_counter(), 'last': i == args.events - 1})
+    for consumer in consumers:
+        consumer.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ms = [x * 1000 for x in latencies]
+    print(f"mode:            {'gevent' if args.gevent else 'threads'}")
+    print(f"connections:     {held} held, ~{per_connection_kib:.1f} KiB RSS each")
+    print(f"deliveries:      {len(ms)} in {elapsed:.2f}s")
+    print(f"latency p50:     {statistics.median(ms):.2f} ms")
+    print(f"latency p99:     {ms[int(len(ms) * 0.99) - 1]:.2f} ms")
+    print(f"latency max:     {ms[-1]:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Compare the old Python-side /stats aggregation with the grouped SQL query
+over bet_history and with the user_game_stats rollup, for one heavy player.
+
+Usage:
+    python benchmarks/stats_aggregation.py --database-url postgresql://... --sizes 10000 100000 1000000
+
+Bets are added to one user incrementally, so each size reuses the rows of the
+previous one. Defaults to a throwaway SQLite file when no URL is given.
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import db
+from seed import add_bets, seed_database
+from stats import aggregate_stats, rebuild_user_game_stats, user_stats
+
+
+def legacy_stats(user_id):
+    """get_stats() as it was before the aggregate query."""
+    from models import BetHistory, Game
+
+    bets = BetHistory.query.filter_by(user_id=user_id).all()
+
+    total_bets = len(bets)
+    total_wagered = sum(bet.bet_amount for bet in bets)
+    total_won = sum(bet.win_amount for bet in bets)
+    net_profit = total_won - total_wagered
+
+    games = Game.query.all()
+    games_stats = []
+
+    for game in games:
+        game_bets = [bet for bet in bets if bet.game_id == game.id]
+
+        if game_bets:
+            game_total_bets = len(game_bets)
+            game_total_wagered = sum(bet.bet_amount for bet in game_bets)
+            game_total_won = sum(bet.win_amount for bet in game_bets)
+            game_net_profit = game_total_won - game_total_wagered
+
+            games_stats.append({
+                'game': game.name,
+                'total_bets': game_total_bets,
+                'total_wagered': game_total_wagered,
+                'total_won': game_total_won,
+                'net_profit': game_net_profit
+            })
+
+    return {
+        'overall': {
+            'total_bets': total_bets,
+            'total_wagered': total_wagered,
+            'total_won': total_won,
+            'net_profit': net_profit
+        },
+        'by_game': games_stats
+    }
+
+
+def measure(fn, user_id, repeat):
+    """Median wall time (ms) and peak traced allocation (MiB) of fn(user_id)."""
+    timings = []
+    peak = 0
+    for _ in range(repeat):
+        db.session.expunge_all()
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        db.session.rollback()
+    return statistics.median(timings), peak / 2 ** 20, result
+
+
+def same_totals(a, b):
+    def flat(stats):
+        rows = [('overall', stats['overall'])] + [(g['game'], g) for g in stats['by_game']]
+        return {name: (row['total_bets'], row['total_wagered'], row['total_won']) for name, row in rows}
+
+    fa, fb = flat(a), flat(b)
+    return fa.keys() == fb.keys() and all(
+        fa[k][0] == fb[k][0] and all(math.isclose(x, y, rel_tol=1e-9) for x, y in zip(fa[k][1:], fb[k][1:]))
+        for k in fa
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/stats_bench.db"
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+
+    with app.app_context():
+        ids = seed_database(users=1, bets=0, sessions=0, rooms=1)
+        game_ids = [ids['game_id'], ids['roulette_game_id']]
+        rng = random.Random(7)
+        seeded = 0
+
+        approaches = [('legacy', legacy_stats), ('sql', aggregate_stats), ('rollup', user_stats)]
+        print(f"{'bets':>10}" + ''.join(f"{name + ' ms':>12}{name + ' MiB':>12}" for name, _ in approaches))
+        for size in sorted(args.sizes):
+            add_bets([ids['user_id']] * (size - seeded), game_ids, rng)
+            db.session.commit()
+            rebuild_user_game_stats(echo=lambda message: None)
+            seeded = size
+
+            line = f"{size:>10}"
+            baseline = None
+            for name, fn in approaches:
+                elapsed_ms, peak_mib, result = measure(fn, ids['user_id'], args.repeat)
+                baseline = baseline or result
+                if not same_totals(baseline, result):
+                    raise SystemExit(f"{name} differs at {size} bets:\n{baseline}\n{result}")
+                line += f"{elapsed_ms:>12.1f}{peak_mib:>12.2f}"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
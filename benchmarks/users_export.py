@@ -0,0 +1,105 @@
+"""Compare peak memory of the old all-in-one /users response with the
+streamed /users/export, and check that paging /users covers every user.
+
+Usage:
+    python benchmarks/users_export.py --database-url postgresql://... --users 200000
+
+Peak memory is Python allocations traced while one response is built and
+read. The export should stay flat as --users grows; the old response grows
+with it.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import jsonify
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from seed import seed_database
+
+
+def legacy_users():
+    """get_all_users() as it was before pagination."""
+    from models import User
+
+    users = User.query.all()
+    return jsonify([{
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "balance": user.balance,
+        "created_at": user.created_at.isoformat()
+    } for user in users])
+
+
+def traced(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--limit', type=int, default=1000)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/users_bench.db"
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'USERS_MAX_PAGE_SIZE': args.limit})
+
+    with app.app_context():
+        ids = seed_database(users=args.users, bets=0, sessions=0, rooms=1)
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(ids['user_id']))}"}
+    client = app.test_client()
+
+    def old():
+        with app.test_request_context():
+            return len(json.loads(legacy_users().get_data()))
+
+    def export(export_format):
+        def read():
+            response = client.get(f'/users/export?format={export_format}', headers=headers, buffered=False)
+            rows = 0
+            for chunk in response.response:
+                text = chunk.decode() if isinstance(chunk, bytes) else chunk
+                if export_format == 'csv':
+                    rows += sum(1 for _ in csv.reader(io.StringIO(text)))
+                else:
+                    rows += text.count('\n')
+            response.close()
+            return rows - (export_format == 'csv')  # header row
+        return read
+
+    def paged():
+        seen, url = 0, f'/users?limit={args.limit}'
+        while url:
+            response = client.get(url, headers=headers)
+            seen += len(response.get_json())
+            link = response.headers.get('Link')
+            url = link[1:link.index('>')] if link else None
+        return seen
+
+    for name, fn in (('old /users', old), ('export ndjson', export('ndjson')),
+                     ('export csv', export('csv')), (f'paged /users ({args.limit})', paged)):
+        rows, elapsed, peak = traced(fn)
+        print(f"{name:<22} {rows} users in {elapsed:.2f}s, peak {peak:.1f} MiB")
+        if rows != args.users:
+            raise SystemExit(f"{name}: got {rows} users, expected {args.users}")
+
+
+if __name__ == '__main__':
+    main()
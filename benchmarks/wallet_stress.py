@@ -0,0 +1,115 @@
+"""Hammer the wallet endpoints from many threads and check that no update was
+lost and no balance went negative.
+
+Usage:
+    python benchmarks/wallet_stress.py --database-url postgresql://... --threads 32 --requests 5000
+
+A few users with small balances get a random mix of deposits, withdrawals
+and spins, so many requests race for the same row and plenty of debits are
+refused. Afterwards every final balance must equal the starting balance plus
+the transactions and bet results recorded in the database, and plus the
+amounts the successful responses reported. Exits non-zero otherwise.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from extensions import db
+from seed import seed_database
+
+START_BALANCE = 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/wallet_bench.db"
+    config = {'SQLALCHEMY_DATABASE_URI': database_url}
+    if database_url.startswith('sqlite'):
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 60}}
+    app = create_app(config)
+
+    from models import BetHistory, Transaction, User
+
+    with app.app_context():
+        first = seed_database(users=args.users, bets=0, sessions=0, rooms=1)['user_id']
+        user_ids = list(range(first, first + args.users))
+        app.extensions['game_catalog'].refresh(force=True)
+        tokens = {user_id: create_access_token(identity=str(user_id)) for user_id in user_ids}
+
+    client = app.test_client()
+    lock = threading.Lock()
+    expected = defaultdict(float)
+    outcomes = Counter()
+
+    def one_request(seed):
+        rng = random.Random(seed)
+        user_id = rng.choice(user_ids)
+        headers = {'Authorization': f'Bearer {tokens[user_id]}'}
+        kind = rng.choice(['deposit', 'withdraw', 'spin', 'spin'])
+        amount = rng.randint(50, 400)
+        if kind == 'deposit':
+            response = client.post('/deposit', json={'amount': amount}, headers=headers)
+            delta = amount
+        elif kind == 'withdraw':
+            response = client.post('/withdraw', json={'amount': amount}, headers=headers)
+            delta = -amount
+        else:
+            response = client.post('/games/spin-and-win/play', json={'bet_amount': amount}, headers=headers)
+            delta = (response.get_json() or {}).get('win_amount', 0) - amount
+        with lock:
+            if response.status_code == 200:
+                expected[user_id] += delta
+                outcomes[kind] += 1
+            elif response.status_code == 400:
+                outcomes[f'{kind} refused'] += 1
+            else:
+                outcomes[f'{kind} failed ({response.status_code})'] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    errors = []
+    with app.app_context():
+        for user_id in user_ids:
+            balance = db.session.get(User, user_id).balance
+            transactions = db.session.query(db.func.coalesce(db.func.sum(db.case(
+                (Transaction.type == 'deposit', Transaction.amount), else_=-Transaction.amount)), 0.0)) \
+                .filter(Transaction.user_id == user_id).scalar()
+            bets = db.session.query(db.func.coalesce(db.func.sum(BetHistory.net_result), 0.0)) \
+                .filter(BetHistory.user_id == user_id).scalar()
+            recorded = START_BALANCE + transactions + bets
+            reported = START_BALANCE + expected[user_id]
+            print(f"user {user_id}: balance {balance:.2f}, recorded {recorded:.2f}, responses {reported:.2f}")
+            if balance < 0 or abs(balance - recorded) > 1e-6 or abs(balance - reported) > 1e-6:
+                errors.append(user_id)
+
+    print(f"{args.requests} requests on {args.threads} threads in {elapsed:.2f}s "
+          f"({args.requests / elapsed:.0f} req/s)")
+    for kind, count in sorted(outcomes.items()):
+        print(f"  {kind:<24} {count}")
+    failed = sum(count for kind, count in outcomes.items() if 'failed' in kind)
+    if errors or failed:
+        raise SystemExit(f"balance mismatch for users {errors}, {failed} failed requests")
+
+
+if __name__ == '__main__':
+    main()
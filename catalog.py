@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+
+# Immutable snapshot of a games row; safe to share across sessions and threads
+CachedGame = namedtuple('CachedGame', ['id', 'name', 'description', 'min_bet', 'max_bet', 'paytable', 'updated_at'])
+
+
+class GameCatalog:
+    """Process-local cache of the games table, keyed by id and by name.
+
+    The table almost never changes, so lookups are served from memory. At
+    most once every ``check_interval`` seconds a lookup compares the
+    catalog's version stamp (row count and latest updated_at) with the
+    database and reloads if it moved. ``flask reload-games`` bumps the stamp
+    so every worker picks up edits on its next check. A lookup miss also
+    checks the stamp, so newly added games are found straight away, but at
+    most once every ``miss_interval`` seconds: a page of bets on deleted
+    games or a flood of bad ids must not query once per lookup.
+    """
+
+    def __init__(self, check_interval=30, miss_interval=1.0):
+        self.check_interval = check_interval
+        self.miss_interval = miss_interval
+        self._by_id = {}
+        self._by_name = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _current_version():
+        from models import Game
+
+        return tuple(db.session.query(db.func.count(Game.id), db.func.max(Game.updated_at)).one())
+
+    def load(self):
+        """(Re)load every game from the database."""
+        from models import Game
+
+        with self._lock:
+            version = self._current_version()
+            games = [CachedGame(g.id, g.name, g.description, g.min_bet, g.max_bet, g.paytable, g.updated_at)
+                     for g in Game.query.order_by(Game.id).all()]
+            by_name = {}
+            for game in games:
+                by_name.setdefault(game.name, game)
+            self._by_id = {game.id: game for game in games}
+            self._by_name = by_name
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def warm(self):
+        """Load the catalog if the database is reachable; otherwise stay empty
+        and load lazily (e.g. before `flask db upgrade` has created games)."""
+        try:
+            self.load()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.warning("Game catalog not warmed: %s", e)
+
+    def refresh(self, force=False):
+        """Reload if the version stamp changed (or unconditionally with force)."""
+        if force or self._version is None:
+            self.load()
+            return
+        self._checked_at = time.monotonic()
+        if self._current_version() != self._version:
+            self.load()
+
+    def _maybe_refresh(self):
+        if self.check_interval is not None and time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+
+    def _refresh_on_miss(self):
+        """Check the stamp for a key not in the catalog; False if checked too recently."""
+        if self._version is not None and time.monotonic() - self._checked_at < self.miss_interval:
+            return False
+        self.refresh()
+        return True
+
+    def get(self, game_id):
+        """Game by id, or None."""
+        try:
+            game_id = int(game_id)
+        except (TypeError, ValueError):
+            return None
+        self._maybe_refresh()
+        game = self._by_id.get(game_id)
+        if game is None and self._refresh_on_miss():
+            game = self._by_id.get(game_id)
+        return game
+
+    def by_name(self, name):
+        """Game by name, or None."""
+        self._maybe_refresh()
+        game = self._by_name.get(name)
+        if game is None and self._refresh_on_miss():
+            game = self._by_name.get(name)
+        return game
+
+    def name_of(self, game_id):
+        game = self.get(game_id)
+        return game.name if game else None
+
+
+def get_catalog():
+    return current_app.extensions['game_catalog']
@@ -0,0 +1,103 @@
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from extensions import db
+from metrics import Histogram
+
+
+class WaitHistogram(Histogram):
+    """How long checkouts waited, in seconds, and how many timed out."""
+
+    def __init__(self):
+        super().__init__()
+        self.timeouts = 0
+
+    def timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        return {**super().snapshot(), 'timeouts': self.timeouts}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection,
+    including opening a new one."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = WaitHistogram()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            self.waits.timed_out()
+            raise
+        finally:
+            self.waits.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() replaces the pool; keep counting into the same histogram
+        pool = super().recreate()
+        pool.waits = self.waits
+        return pool
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings.
+
+    With DB_PGBOUNCER the database is reached through PgBouncer in
+    transaction pooling mode: no startup parameters are sent (PgBouncer
+    rejects them), so the statement timeout is set with SET LOCAL at the
+    start of each transaction instead.
+    """
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}  # one shared in-memory database; keep SQLAlchemy's pool for it
+
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT'] and not config['DB_PGBOUNCER']:
+        options['connect_args'] = {'options': f"-c statement_timeout={int(config['DB_STATEMENT_TIMEOUT'])}"}
+    return options
+
+
+@event.listens_for(db.session, 'after_begin')
+def _set_local_statement_timeout(session, transaction, connection):
+    if not has_app_context():
+        return
+    config = current_app.config
+    if config.get('DB_PGBOUNCER') and config.get('DB_STATEMENT_TIMEOUT') and connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(config['DB_STATEMENT_TIMEOUT'])}")
+
+
+def pool_stats(engine):
+    """Live state of an engine's connection pool."""
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            # negative until the pool has opened pool_size connections
+            'overflow': max(pool.overflow(), 0),
+        })
+    else:
+        stats['status'] = pool.status()
+    if isinstance(pool, InstrumentedQueuePool):
+        stats['wait_seconds'] = pool.waits.snapshot()
+    return stats
@@ -0,0 +1,215 @@
+"""Pub/sub backends that carry EventHub messages between worker processes.
+
+Every backend implements start(dispatch) and publish(message). publish()
+must hand the message to dispatch() in every process, including the sender.
+The in-process default, LocalBackend, lives in events.py.
+"""
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+
+from events import LocalBackend
+
+logger = logging.getLogger(__name__)
+
+
+def _safe_dispatch(dispatch, data):
+    try:
+        dispatch(json.loads(data))
+    except Exception:
+        logger.exception("Failed to dispatch event message")
+
+
+class PostgresBackend:
+    """LISTEN/NOTIFY on a channel of the application database.
+
+    Needs a direct (session pooled) connection: LISTEN does not work through
+    a transaction-pooling PgBouncer.
+    """
+
+    MAX_PAYLOAD = 7999  # NOTIFY payloads must be shorter than 8000 bytes
+
+    def __init__(self, dsn, channel='game_events', reconnect_delay=1.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._publisher = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def start(self, dispatch):
+        self._dispatch = dispatch
+        threading.Thread(target=self._listen_loop, name='pg-listen', daemon=True).start()
+
+    def publish(self, message):
+        import psycopg2
+
+        data = json.dumps(message)
+        if len(data.encode('utf-8')) > self.MAX_PAYLOAD:
+            logger.error("Event message too large for NOTIFY (%d bytes), dropped", len(data))
+            return
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None or self._publisher.closed:
+                        self._publisher = self._connect()
+                    with self._publisher.cursor() as cur:
+                        cur.execute("SELECT pg_notify(%s, %s)", (self.channel, data))
+                    return
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    self._publisher = None
+                    if attempt:
+                        logger.exception("Could not publish event message")
+
+    def _listen_loop(self):
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+                while True:
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        _safe_dispatch(self._dispatch, conn.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("LISTEN connection lost; reconnecting")
+                if conn is not None:
+                    conn.close()
+                time.sleep(self.reconnect_delay)
+
+
+class UnixSocketBackend:
+    """Client of an EventBroker listening on a local Unix socket."""
+
+    def __init__(self, path, reconnect_delay=0.5):
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _connected(self):
+        with self._lock:
+            if self._sock is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.path)
+                self._sock = sock
+            return self._sock
+
+    def _drop(self, sock):
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+        sock.close()
+
+    def start(self, dispatch):
+        self._dispatch = dispatch
+        threading.Thread(target=self._read_loop, name='event-broker-client', daemon=True).start()
+
+    def publish(self, message):
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        for attempt in range(2):
+            sock = None
+            try:
+                sock = self._connected()
+                with self._lock:
+                    sock.sendall(data)
+                return
+            except OSError:
+                # A dead socket would fail every publish until the reader
+                # noticed; drop it so the retry reconnects
+                if sock is not None:
+                    self._drop(sock)
+                if attempt:
+                    logger.exception("Could not publish event message to %s", self.path)
+
+    def _read_loop(self):
+        while True:
+            try:
+                sock = self._connected()
+            except OSError:
+                time.sleep(self.reconnect_delay)
+                continue
+            try:
+                for line in sock.makefile('rb'):
+                    _safe_dispatch(self._dispatch, line)
+            except OSError:
+                pass
+            self._drop(sock)
+            time.sleep(self.reconnect_delay)
+
+
+class EventBroker:
+    """Relays newline-delimited messages to every connected worker.
+
+    A stand-in for Postgres LISTEN/NOTIFY when running several workers on
+    one host: run `flask event-broker` and set EVENT_BACKEND=unix.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def serve_forever(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(128)
+        while True:
+            client, _ = server.accept()
+            with self._lock:
+                self._clients[client] = threading.Lock()
+            threading.Thread(target=self._relay, args=(client,), daemon=True).start()
+
+    def _relay(self, client):
+        try:
+            for line in client.makefile('rb'):
+                with self._lock:
+                    targets = list(self._clients.items())
+                for target, target_lock in targets:
+                    try:
+                        with target_lock:
+                            target.sendall(line)
+                    except OSError:
+                        with self._lock:
+                            self._clients.pop(target, None)
+                        target.close()
+        except OSError:
+            pass
+        with self._lock:
+            self._clients.pop(client, None)
+        client.close()
+
+
+def create_backend(config):
+    """Backend selected by EVENT_BACKEND: local (default), postgres or unix."""
+    kind = config.get('EVENT_BACKEND', 'local')
+    if kind == 'local':
+        return LocalBackend()
+    if kind == 'postgres':
+        if config.get('DB_PGBOUNCER') and not config.get('EVENT_BACKEND_URL'):
+            raise ValueError("EVENT_BACKEND=postgres behind PgBouncer needs EVENT_BACKEND_URL "
+                             "pointing at the database itself (LISTEN needs a session)")
+        url = config.get('EVENT_BACKEND_URL') or config['SQLALCHEMY_DATABASE_URI']
+        dsn = make_url(url).set(drivername='postgresql').render_as_string(hide_password=False)
+        return PostgresBackend(dsn, config.get('EVENT_CHANNEL', 'game_events'))
+    if kind == 'unix':
+        return UnixSocketBackend(config.get('EVENT_BACKEND_URL') or '/tmp/gamehub-events.sock')
+    raise ValueError(f"Unknown EVENT_BACKEND {kind!r}")
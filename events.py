@@ -0,0 +1,272 @@
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def format_sse(event, event_id=None):
+    if event_id is not None:
+        return f"id: {event_id}\ndata: {json.dumps(event)}\n\n"
+    return f"data: {json.dumps(event)}\n\n"
+
+
+HEARTBEAT = format_sse({'type': 'heartbeat'})
+
+
+class Subscription:
+    """One SSE connection's pending events.
+
+    Waiting on the condition costs nothing while the connection is idle. When
+    the app runs on a cooperative worker (gunicorn -k gevent), each waiting
+    connection is a parked greenlet rather than an OS thread.
+    """
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.closed = False
+        self._events = deque()
+        self._maxsize = maxsize
+        self._cond = threading.Condition(threading.Lock())
+
+    def push(self, payload):
+        """Queue an already formatted payload. Returns False once closed; a
+        consumer that falls maxsize events behind is closed so it reconnects."""
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self._events) >= self._maxsize:
+                self.closed = True
+                self._cond.notify()
+                return False
+            self._events.append(payload)
+            self._cond.notify()
+            return True
+
+    def prefill(self, payloads):
+        """Queue payloads before the subscription is registered (replay)."""
+        with self._cond:
+            self._events.extend(payloads[-self._maxsize:])
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def next(self):
+        """Block until a payload is available; None once closed and drained."""
+        with self._cond:
+            while not self._events and not self.closed:
+                self._cond.wait()
+            if self._events:
+                return self._events.popleft()
+            return None
+
+    def __len__(self):
+        return len(self._events)
+
+
+class RoomHistory:
+    """Recent (event id, payload) pairs of a room, and the newest evicted id."""
+
+    __slots__ = ('events', 'evicted')
+
+    def __init__(self):
+        self.events = deque()
+        self.evicted = 0
+
+
+class EventIdClock:
+    """Monotonically increasing event ids.
+
+    Ids are microseconds since the epoch, bumped past any id this process has
+    issued or received from another worker, so ids from different workers
+    are ordered as closely as their clocks allow.
+    """
+
+    def __init__(self):
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            self._last = max(self._last + 1, time.time_ns() // 1000)
+            return self._last
+
+    def observe(self, event_id):
+        with self._lock:
+            if event_id > self._last:
+                self._last = event_id
+
+
+class LocalBackend:
+    """Default pub/sub backend: messages only reach the current process."""
+
+    def start(self, dispatch):
+        self._dispatch = dispatch
+
+    def publish(self, message):
+        self._dispatch(message)
+
+
+class EventHub:
+    """Fans game events out to the SSE connections of the users concerned.
+
+    deliver() formats an event once and appends it to every matching local
+    subscription, so delivery is immediate. Heartbeats come from one shared
+    timer thread instead of a timeout per connection.
+
+    Messages that must reach every worker go through send(kind, payload):
+    the backend (see event_backends) hands them to each process, including
+    this one, which runs the handler registered for that kind with on().
+
+    Room events carry an id and are kept in a bounded ring buffer per room,
+    so a reconnecting client that sends Last-Event-ID gets only the events
+    it missed, straight from memory.
+    """
+
+    def __init__(self, heartbeat_interval=15.0, queue_size=1000, backend=None,
+                 replay_size=256, replay_rooms=10000):
+        self.heartbeat_interval = heartbeat_interval
+        self.queue_size = queue_size
+        self.replay_size = replay_size
+        self.replay_rooms = replay_rooms
+        self.ids = EventIdClock()
+        self._subscribers = {}
+        self._history = OrderedDict()  # room_id -> deque of (event id, payload)
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        self._handlers = {'users': lambda payload: self.deliver(payload['user_ids'], payload['event'])}
+        self.backend = backend or LocalBackend()
+        self.backend.start(self.dispatch)
+
+    def on(self, kind, handler):
+        """Run handler(payload) for every message of this kind sent by any worker."""
+        self._handlers[kind] = handler
+
+    def send(self, kind, payload):
+        self.backend.publish({'kind': kind, 'payload': payload})
+
+    def dispatch(self, message):
+        payload = message['payload']
+        if 'id' in payload:
+            self.ids.observe(payload['id'])
+        handler = self._handlers.get(message.get('kind'))
+        if handler is not None:
+            handler(payload)
+
+    def subscribe(self, user_id, last_event_id=None, rooms=()):
+        """Register a connection; with last_event_id, first queue the events
+        of the given rooms it missed. Both happen under the hub lock, so each
+        event is either replayed or delivered live, never both or neither."""
+        sub = Subscription(str(user_id), self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                sub.prefill(self._missed(rooms, last_event_id))
+            self._subscribers.setdefault(sub.user_id, set()).add(sub)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='sse-heartbeat', daemon=True)
+                self._heartbeat.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.close()
+        with self._lock:
+            subs = self._subscribers.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.user_id]
+
+    def _subscriptions(self, user_ids=None):
+        with self._lock:
+            return self._subscriptions_locked(user_ids)
+
+    def _subscriptions_locked(self, user_ids=None):
+        if user_ids is None:
+            return [sub for subs in self._subscribers.values() for sub in subs]
+        return [sub for user_id in {str(u) for u in user_ids}
+                for sub in self._subscribers.get(user_id, ())]
+
+    def _remember(self, room_id, event_id, payload):
+        history = self._history.get(room_id)
+        if history is None:
+            history = self._history[room_id] = RoomHistory()
+            if len(self._history) > self.replay_rooms:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(room_id)
+        if len(history.events) >= self.replay_size:
+            history.evicted = history.events.popleft()[0]
+        history.events.append((event_id, payload))
+
+    def _missed(self, rooms, last_event_id):
+        resync = []
+        missed = []
+        for room_id in rooms:
+            history = self._history.get(room_id)
+            if history is None:
+                continue
+            if history.evicted > last_event_id:
+                # Some missed events are gone already: the client must refetch
+                resync.append(format_sse({'type': 'resync', 'room_id': room_id}))
+            missed.extend(entry for entry in history.events if entry[0] > last_event_id)
+        missed.sort(key=lambda entry: entry[0])
+        return resync + [payload for _, payload in missed]
+
+    def _deliver(self, subs, payload):
+        for sub in subs:
+            if not sub.push(payload):
+                self.unsubscribe(sub)
+
+    def deliver(self, user_ids, event, event_id=None, room_id=None):
+        """Send event to this process's connections of the given users, and
+        keep it for replay if it belongs to a room."""
+        payload = format_sse(event, event_id)
+        with self._lock:
+            if room_id is not None and event_id is not None:
+                self._remember(room_id, event_id, payload)
+            subs = self._subscriptions_locked(user_ids)
+        if subs:
+            self._deliver(subs, payload)
+
+    def publish(self, user_ids, event):
+        """Send event to every connection of the given users, on any worker."""
+        self.send('users', {'user_ids': [str(u) for u in user_ids], 'event': event})
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            self._deliver(self._subscriptions(), HEARTBEAT)
+
+    def stream(self, user_id, initial=None, last_event_id=None, rooms=()):
+        """SSE body for one connection of user_id.
+
+        Subscribes when the response starts streaming and unsubscribes when
+        the client goes away (the server closes the generator). rooms may be
+        a callable, evaluated at that point.
+        """
+        sub = self.subscribe(user_id, last_event_id, rooms() if callable(rooms) else rooms)
+        try:
+            if initial is not None:
+                yield format_sse(initial)
+            while True:
+                payload = sub.next()
+                if payload is None:
+                    break
+                yield payload
+        finally:
+            self.unsubscribe(sub)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def queue_depths(self):
+        """Pending events per connected user."""
+        with self._lock:
+            return {user_id: sum(len(sub) for sub in subs) for user_id, subs in self._subscribers.items()}
+
+    def max_queue_depth(self):
+        """Pending events of the fullest single connection."""
+        with self._lock:
+            return max((len(sub) for subs in self._subscribers.values() for sub in subs), default=0)
@@ -0,0 +1,24 @@
+# gunicorn -c gunicorn.conf.py app:app
+#
+# SSE connections are long-lived and mostly idle, so workers are gevent
+# based: each connection parks a greenlet instead of holding a thread.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 10000))
+# More than one worker needs EVENT_BACKEND=postgres (or unix with
+# `flask event-broker`) so events reach clients on every worker
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Live roulette rounds are read and written through the database on each
+# action. ROOM_WRITE_BEHIND=1 holds them in memory instead, which is only
+# correct when one process serves every request for them
+if workers != 1 and os.environ.get('ROOM_WRITE_BEHIND') == '1':
+    raise RuntimeError(f'ROOM_WRITE_BEHIND=1 needs a single worker, WEB_CONCURRENCY is {workers}')
+timeout = 60
+
+
+def post_fork(server, worker):
+    # Make psycopg2 yield to the gevent loop while waiting on Postgres
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
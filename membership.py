@@ -0,0 +1,156 @@
+import threading
+from collections import Counter, OrderedDict
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+
+
+class RoomMembership:
+    """In-memory index of who is currently in each room and game.
+
+    broadcast_to_game reads it instead of querying game_sessions, so the cost
+    of a broadcast depends on the current listeners only. It is updated by
+    the routes that change membership and rebuilt from the database (active
+    room and game sessions of unfinished rooms) after a restart.
+
+    Once attached to an EventHub, changes are sent through the hub so the
+    index of every worker sees them, in order with the events that follow.
+    """
+
+    def __init__(self):
+        self._rooms = {}        # room_id -> set of user ids
+        self._room_game = {}    # room_id -> game_id
+        self._games = {}        # game_id -> Counter of user id -> memberships
+        self._user_rooms = {}   # user id -> set of room_ids
+        self._last_closed = OrderedDict()  # user id -> their latest finished room
+        self._lock = threading.Lock()
+        self._hub = None
+
+    def attach(self, hub):
+        self._hub = hub
+        hub.on('membership', lambda payload: self._apply(payload['op'], payload['args']))
+
+    def _change(self, op, *args):
+        if self._hub is not None:
+            self._hub.send('membership', {'op': op, 'args': list(args)})
+        else:
+            self._apply(op, args)
+
+    def _apply(self, op, args):
+        {'join': self._join, 'leave': self._leave, 'close_room': self._close_room}[op](*args)
+
+    def _add(self, game_id, user_id, room_id=None):
+        if room_id is not None:
+            members = self._rooms.setdefault(room_id, set())
+            if user_id in members:
+                return
+            members.add(user_id)
+            self._room_game[room_id] = game_id
+            self._user_rooms.setdefault(user_id, set()).add(room_id)
+        self._games.setdefault(game_id, Counter())[user_id] += 1
+
+    def _remove(self, game_id, user_id):
+        counts = self._games.get(game_id)
+        if counts is None:
+            return
+        counts[user_id] -= 1
+        if counts[user_id] <= 0:
+            del counts[user_id]
+        if not counts:
+            del self._games[game_id]
+
+    def join(self, game_id, user_id, room_id=None):
+        """Add user_id to a game, and to one of its rooms if room_id is given."""
+        self._change('join', int(game_id), str(user_id), room_id)
+
+    def leave(self, game_id, user_id):
+        """Remove user_id from a game and from every room of that game."""
+        self._change('leave', int(game_id), str(user_id))
+
+    def close_room(self, room_id):
+        """Forget a finished room and its members."""
+        self._change('close_room', room_id)
+
+    def _join(self, game_id, user_id, room_id):
+        with self._lock:
+            self._add(game_id, user_id, room_id)
+
+    def _leave(self, game_id, user_id):
+        with self._lock:
+            for room_id, members in list(self._rooms.items()):
+                if self._room_game.get(room_id) == game_id and user_id in members:
+                    members.discard(user_id)
+                    self._discard_user_room(user_id, room_id)
+                    if not members:
+                        del self._rooms[room_id]
+                        del self._room_game[room_id]
+            counts = self._games.get(game_id)
+            if counts is not None:
+                counts.pop(user_id, None)
+                if not counts:
+                    del self._games[game_id]
+
+    def _close_room(self, room_id):
+        with self._lock:
+            members = self._rooms.pop(room_id, set())
+            game_id = self._room_game.pop(room_id, None)
+            for user_id in members:
+                self._remove(game_id, user_id)
+                self._discard_user_room(user_id, room_id)
+                self._last_closed[user_id] = room_id
+                self._last_closed.move_to_end(user_id)
+            while len(self._last_closed) > 10000:
+                self._last_closed.popitem(last=False)
+
+    def _discard_user_room(self, user_id, room_id):
+        rooms = self._user_rooms.get(user_id)
+        if rooms is not None:
+            rooms.discard(room_id)
+            if not rooms:
+                del self._user_rooms[user_id]
+
+    def game_members(self, game_id):
+        with self._lock:
+            return list(self._games.get(int(game_id), ()))
+
+    def rooms_of(self, user_id):
+        """Rooms user_id is in, plus the last finished room they were in."""
+        user_id = str(user_id)
+        with self._lock:
+            rooms = set(self._user_rooms.get(user_id, ()))
+            if user_id in self._last_closed:
+                rooms.add(self._last_closed[user_id])
+            return rooms
+
+    def room_members(self, room_id):
+        with self._lock:
+            return list(self._rooms.get(room_id, ()))
+
+    def rebuild(self):
+        """Reload the index from active room sessions and game sessions."""
+        from models import GameSession, Multiplayer, Room, RoomSession
+
+        room_rows = db.session.query(Room.game_id, RoomSession.user_id, Room.id) \
+            .join(RoomSession, RoomSession.room_id == Room.id) \
+            .filter(RoomSession.status == 'active', Room.status.notin_(['completed', 'abandoned'])) \
+            .all()
+        session_rows = db.session.query(GameSession.game_id, GameSession.user_id, Multiplayer.session_id) \
+            .join(Multiplayer, Multiplayer.id == GameSession.multiplayer_id) \
+            .filter(GameSession.status == 'active', Multiplayer.status.notin_(['completed', 'abandoned'])) \
+            .all()
+
+        fresh = RoomMembership()
+        for game_id, user_id, room_id in room_rows + session_rows:
+            fresh._add(game_id, str(user_id), room_id)
+        with self._lock:
+            self._rooms, self._room_game, self._games = fresh._rooms, fresh._room_game, fresh._games
+            self._user_rooms = fresh._user_rooms
+
+    def warm(self):
+        try:
+            self.rebuild()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.warning("Room membership not rebuilt: %s", e)
@@ -0,0 +1,164 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import request
+from sqlalchemy import event
+
+# [started_at, statements, seconds in the database] of the current request
+_request_state = ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    """Counts of observations in buckets; snapshot() gives cumulative
+    [upper bound, count] pairs ending with '+Inf', as Prometheus expects."""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(buckets) if buckets is not None else self.BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            buckets.append([bound, cumulative])
+        return {'buckets': buckets, 'count': cumulative, 'sum': total}
+
+
+class RouteMetrics:
+    __slots__ = ('latency', 'db_seconds', 'queries', 'statuses')
+
+    QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.db_seconds = Histogram()
+        self.queries = Histogram(self.QUERY_BUCKETS)
+        self.statuses = {}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Per-process request metrics, rendered in the Prometheus text format.
+
+    For every endpoint and method it keeps a latency histogram, counts by
+    status, and histograms of the statements run and the time spent in the
+    database per request. The per-request work is a few counter updates;
+    statements are counted with engine events into a context variable.
+
+    Anything else (pools, SSE, hashing) is read when /metrics is scraped,
+    from the collectors added with collector(). Each gunicorn worker keeps
+    and serves its own numbers.
+    """
+
+    def __init__(self, prefix='gamehub'):
+        self.prefix = prefix
+        self._routes = {}  # (endpoint, method) -> RouteMetrics
+        self._lock = threading.Lock()
+        self._collectors = []
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def instrument(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def collector(self, fn):
+        """Register fn() -> iterable of (name, type, help, [(labels, value)])."""
+        self._collectors.append(fn)
+        return fn
+
+    @staticmethod
+    def _before_request():
+        _request_state.set([time.perf_counter(), 0, 0.0])
+
+    def _after_request(self, response):
+        state = _request_state.get()
+        if state is None:
+            return response
+        _request_state.set(None)
+        key = (request.endpoint or 'unmatched', request.method)
+        route = self._routes.get(key)
+        if route is None:
+            with self._lock:
+                route = self._routes.setdefault(key, RouteMetrics())
+        route.latency.observe(time.perf_counter() - state[0])
+        route.queries.observe(state[1])
+        route.db_seconds.observe(state[2])
+        status = response.status_code
+        with self._lock:
+            route.statuses[status] = route.statuses.get(status, 0) + 1
+        return response
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _request_state.get() is not None:
+            context._metrics_started = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        state = _request_state.get()
+        started = getattr(context, '_metrics_started', None)
+        if state is not None and started is not None:
+            state[1] += 1
+            state[2] += time.perf_counter() - started
+
+    def _families(self):
+        with self._lock:
+            routes = list(self._routes.items())
+            statuses = {key: dict(route.statuses) for key, route in routes}
+        p = self.prefix
+        yield (f'{p}_http_requests_total', 'counter', 'Requests by endpoint, method and status.',
+               [({'endpoint': endpoint, 'method': method, 'status': status}, count)
+                for (endpoint, method), counts in statuses.items() for status, count in counts.items()])
+        for attr, name, help_text in (
+                ('latency', 'http_request_duration_seconds', 'Time to produce the response.'),
+                ('queries', 'http_request_db_statements', 'SQL statements run per request.'),
+                ('db_seconds', 'http_request_db_seconds', 'Time spent in SQL statements per request.')):
+            yield (f'{p}_{name}', 'histogram', help_text,
+                   [({'endpoint': endpoint, 'method': method}, getattr(route, attr).snapshot())
+                    for (endpoint, method), route in routes])
+        for collect in self._collectors:
+            yield from collect()
+
+    def render(self):
+        lines = []
+        for name, kind, help_text, samples in self._families():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                if kind != 'histogram':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                for bound, count in value['buckets']:
+                    lines.append(f'{name}_bucket{_labels({**labels, "le": bound})} {count}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value["sum"])}')
+                lines.append(f'{name}_count{_labels(labels)} {value["count"]}')
+        return '\n'.join(lines) + '\n'
@@ -22,6 +22,13 @@ fileConfig(config.config_file_name)
 # Set the MetaData object that Alembic will use for migrations
 target_metadata = db.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave bet_history's monthly partitions (see partitions.py) alone."""
+    if type_ == 'table' and reflected and compare_to is None and name.startswith('bet_history_'):
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -35,6 +42,7 @@ def run_migrations_offline():
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -53,7 +61,8 @@ def run_migrations_online():
     with connectable.connect() as connection:
         context.configure(
             connection=connection, 
-            target_metadata=target_metadata
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
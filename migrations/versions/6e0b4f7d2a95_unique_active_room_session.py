@@ -0,0 +1,45 @@
+"""unique active room session
+
+Revision ID: 6e0b4f7d2a95
+Revises: f2a6c3d8b917
+Create Date: 2026-10-17 18:42:09.318554
+
+join_room checks for an active seat and then takes one; two joins racing
+between the two would both get in. The index makes the second commit fail.
+Duplicate active sessions left by that race are closed first, keeping the
+oldest.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e0b4f7d2a95'
+down_revision: Union[str, None] = 'f2a6c3d8b917'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ACTIVE = sa.text("status = 'active'")
+
+
+def upgrade() -> None:
+    op.execute("""
+        UPDATE room_sessions SET status = 'left'
+        WHERE status = 'active' AND EXISTS (
+            SELECT 1 FROM room_sessions AS older
+            WHERE older.room_id = room_sessions.room_id
+              AND older.user_id = room_sessions.user_id
+              AND older.status = 'active'
+              AND older.id < room_sessions.id)
+    """)
+    op.create_index('ix_room_sessions_room_id_user_id_active', 'room_sessions',
+                    ['room_id', 'user_id'], unique=True,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_room_sessions_room_id_user_id_active', table_name='room_sessions')
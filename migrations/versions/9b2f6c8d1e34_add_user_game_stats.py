@@ -0,0 +1,39 @@
+"""add user_game_stats rollup
+
+Revision ID: 9b2f6c8d1e34
+Revises: c5d8e2f41a07
+Create Date: 2026-10-17 11:40:27.905113
+
+The table starts empty; fill it with `flask rebuild-stats` after upgrading.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2f6c8d1e34'
+down_revision: Union[str, None] = 'c5d8e2f41a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_game_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('bet_count', sa.Integer(), nullable=False),
+    sa.Column('total_wagered', sa.Float(), nullable=False),
+    sa.Column('total_won', sa.Float(), nullable=False),
+    sa.Column('net_profit', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['games.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'game_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_game_stats')
@@ -0,0 +1,29 @@
+"""add games.paytable
+
+Revision ID: a7c3e9f2b481
+Revises: 9b2f6c8d1e34
+Create Date: 2026-10-17 14:12:08.331764
+
+Existing games keep the default wheel until a paytable is set with
+`flask set-paytable`.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9f2b481'
+down_revision: Union[str, None] = '9b2f6c8d1e34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('games', sa.Column('paytable', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('games', 'paytable')
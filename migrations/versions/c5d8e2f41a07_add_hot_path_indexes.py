@@ -0,0 +1,45 @@
+"""add hot path indexes
+
+Revision ID: c5d8e2f41a07
+Revises: e23f69c91468
+Create Date: 2026-10-17 09:12:04.318220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8e2f41a07'
+down_revision: Union[str, None] = 'e23f69c91468'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ACTIVE = sa.text("status = 'active'")
+
+
+def upgrade() -> None:
+    op.create_index('ix_bet_history_user_id_created_at', 'bet_history',
+                    ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_bet_history_game_id_active', 'bet_history',
+                    ['game_id'], unique=False,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+    op.create_index('ix_game_sessions_game_id', 'game_sessions',
+                    ['game_id'], unique=False)
+    op.create_index('ix_game_sessions_multiplayer_id_active', 'game_sessions',
+                    ['multiplayer_id'], unique=False,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+    op.create_index('ix_game_sessions_user_id_game_id_active', 'game_sessions',
+                    ['user_id', 'game_id'], unique=False,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_game_sessions_user_id_game_id_active', table_name='game_sessions')
+    op.drop_index('ix_game_sessions_multiplayer_id_active', table_name='game_sessions')
+    op.drop_index('ix_game_sessions_game_id', table_name='game_sessions')
+    op.drop_index('ix_bet_history_game_id_active', table_name='bet_history')
+    op.drop_index('ix_bet_history_user_id_created_at', table_name='bet_history')
@@ -0,0 +1,43 @@
+"""scope roulette bets to their round
+
+Revision ID: d41b7a9c05e2
+Revises: a7c3e9f2b481
+Create Date: 2026-10-17 15:03:47.520118
+
+pull_trigger now settles bets by roulette_id. Bets still active from before
+the upgrade have no round and are not settled; let open rounds finish first.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41b7a9c05e2'
+down_revision: Union[str, None] = 'a7c3e9f2b481'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ACTIVE = sa.text("status = 'active'")
+
+
+def upgrade() -> None:
+    op.add_column('bet_history', sa.Column('roulette_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('bet_history_roulette_id_fkey', 'bet_history', 'russian_roulette',
+                          ['roulette_id'], ['id'])
+    op.create_index('ix_bet_history_roulette_id_active', 'bet_history',
+                    ['roulette_id'], unique=False,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+    op.drop_index('ix_bet_history_game_id_active', table_name='bet_history')
+
+
+def downgrade() -> None:
+    op.create_index('ix_bet_history_game_id_active', 'bet_history',
+                    ['game_id'], unique=False,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+    op.drop_index('ix_bet_history_roulette_id_active', table_name='bet_history')
+    op.drop_constraint('bet_history_roulette_id_fkey', 'bet_history', type_='foreignkey')
+    op.drop_column('bet_history', 'roulette_id')
@@ -0,0 +1,28 @@
+"""add room lookup indexes
+
+Revision ID: f2a6c3d8b917
+Revises: d41b7a9c05e2
+Create Date: 2026-10-17 16:20:31.604512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6c3d8b917'
+down_revision: Union[str, None] = 'd41b7a9c05e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_multiplayer_session_id', 'multiplayer', ['session_id'], unique=False)
+    op.create_index('ix_room_sessions_room_id_user_id', 'room_sessions', ['room_id', 'user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_room_sessions_room_id_user_id', table_name='room_sessions')
+    op.drop_index('ix_multiplayer_session_id', table_name='multiplayer')
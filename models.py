@@ -36,6 +36,9 @@ class Game(db.Model):
     description = db.Column(db.Text)
     min_bet = db.Column(db.Float, default=0.0)
     max_bet = db.Column(db.Float)
+    # Spin and Win wheel as [{"multiplier": 2.0, "probability": 0.15}, ...];
+    # NULL uses wheel.SEGMENTS. Set it with `flask set-paytable`.
+    paytable = db.Column(db.JSON, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -55,6 +58,19 @@ class GameSession(db.Model):
     
     spin_and_win = db.relationship('SpinAndWin', backref='session', lazy=True)
 
+    __table_args__ = (
+        # broadcast_to_game: sessions by game
+        db.Index('ix_game_sessions_game_id', 'game_id'),
+        # place_bet / pull_trigger: active sessions of a multiplayer game
+        db.Index('ix_game_sessions_multiplayer_id_active', 'multiplayer_id',
+                 postgresql_where=db.text("status = 'active'"),
+                 sqlite_where=db.text("status = 'active'")),
+        # leave_game: a user's active session in a game
+        db.Index('ix_game_sessions_user_id_game_id_active', 'user_id', 'game_id',
+                 postgresql_where=db.text("status = 'active'"),
+                 sqlite_where=db.text("status = 'active'")),
+    )
+
 
 class RoomSession(db.Model):
     __tablename__ = 'room_sessions'
@@ -66,6 +82,15 @@ class RoomSession(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # join_room / close_room: sessions of a room, and a user's in it
+        db.Index('ix_room_sessions_room_id_user_id', 'room_id', 'user_id'),
+        # join_room: one active seat per user and room, even for racing joins
+        db.Index('ix_room_sessions_room_id_user_id_active', 'room_id', 'user_id', unique=True,
+                 postgresql_where=db.text("status = 'active'"),
+                 sqlite_where=db.text("status = 'active'")),
+    )
+
 class SpinAndWin(db.Model):
     __tablename__ = 'spin_and_win'
     
@@ -97,6 +122,11 @@ class Multiplayer(db.Model):
             backref=db.backref('multiplayer_games', lazy=True)
         )
 
+        __table_args__ = (
+            # join_room: the multiplayer game of a room
+            db.Index('ix_multiplayer_session_id', 'session_id'),
+        )
+
 class RussianRoulette(db.Model):
     __tablename__ = 'russian_roulette'
     
@@ -121,6 +151,8 @@ class Room(db.Model):
 class BetHistory(db.Model):
     __tablename__ = 'bet_history'
     
+    # On PostgreSQL the table may be partitioned by month on created_at
+    # (partitions.py); its primary key is then (id, created_at)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     game_id = db.Column(db.Integer, db.ForeignKey('games.id'), nullable=False)
@@ -128,5 +160,29 @@ class BetHistory(db.Model):
     win_amount = db.Column(db.Float, default=0.0)
     net_result = db.Column(db.Float, default=0.0)
     bet_type = db.Column(db.String(20), nullable=True)  # For different bet types in games
+    # Russian Roulette round the bet is on; settled together when it ends
+    roulette_id = db.Column(db.Integer, db.ForeignKey('russian_roulette.id'), nullable=True)
     status = db.Column(db.String(20), default='completed')  # active, completed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # /history and /stats: a user's bets, newest first
+        db.Index('ix_bet_history_user_id_created_at', 'user_id', 'created_at', 'id'),
+        # pull_trigger: unsettled bets of a round
+        db.Index('ix_bet_history_roulette_id_active', 'roulette_id',
+                 postgresql_where=db.text("status = 'active'"),
+                 sqlite_where=db.text("status = 'active'")),
+    )
+
+class UserGameStats(db.Model):
+    __tablename__ = 'user_game_stats'
+
+    # Running per-user/per-game totals, kept in step with bet_history by
+    # stats.record_bet / stats.record_payouts in the same transaction
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('games.id'), primary_key=True)
+    bet_count = db.Column(db.Integer, nullable=False, default=0)
+    total_wagered = db.Column(db.Float, nullable=False, default=0.0)
+    total_won = db.Column(db.Float, nullable=False, default=0.0)
+    net_profit = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
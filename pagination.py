@@ -0,0 +1,41 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    """Opaque keyset cursor for the sort key of the last row on a page."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, *types):
+    """Decode a cursor from encode_cursor, converting each value with types.
+
+    Raises InvalidCursor if the cursor is malformed or has the wrong arity.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise InvalidCursor(cursor)
+        return [
+            datetime.fromisoformat(v) if t is datetime else t(v)
+            for t, v in zip(types, values)
+        ]
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def page_size(value, default, maximum):
+    """Parse a ?limit= value, clamped to 1..maximum."""
+    if value is None:
+        return default
+    try:
+        return max(1, min(int(value), maximum))
+    except ValueError:
+        return default
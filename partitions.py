@@ -0,0 +1,418 @@
+"""Monthly range partitions of bet_history on created_at (PostgreSQL).
+
+bet_history is created as a plain table, by migrations or db.create_all,
+and converted once with `flask partition-bet-history`. That command builds
+a partitioned copy next to the live table and copies the rows over in id
+batches, one transaction each. A trigger mirrors every write to the live
+table into the copy while that runs. It then swaps the two tables in one
+short transaction. The old table is kept as bet_history_unpartitioned
+until it is dropped by hand.
+
+Inserts fail for a month that has no partition. There is deliberately no
+DEFAULT partition: it would stop the planner from reading the partitions
+in order for /history, and later months could not be added while it held
+rows. `flask create-partitions` adds the coming months and runs from cron.
+`flask check-partitions` fails when too few months are ready, or when the
+/history and /stats queries read partitions they should have pruned.
+
+The ORM maps bet_history by id alone. The table's primary key becomes
+(id, created_at), because a partitioned table can only enforce keys that
+include the partition key.
+"""
+import re
+import time
+from datetime import date, datetime
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from pagination import decode_cursor
+
+PARENT = 'bet_history'
+STAGING = 'bet_history_partitioned'
+RETIRED = 'bet_history_unpartitioned'
+MIRROR = 'bet_history_mirror'
+
+PARTITION_NAME = re.compile(r'^bet_history_y\d{4}m\d{2}$')
+BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+INDEX_DEF = re.compile(r'^CREATE INDEX (\S+) ON (?:ONLY )?\S+ ')
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT}_y{month.year}m{month.month:02d}"
+
+
+def _require_postgres():
+    if db.engine.dialect.name != 'postgresql':
+        raise PartitioningError("Partitioning bet_history needs PostgreSQL")
+
+
+def _exists(name):
+    return db.session.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {'name': name}).scalar()
+
+
+def is_partitioned(table=PARENT):
+    return bool(db.session.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {'table': table}).scalar())
+
+
+def partitions(table=PARENT):
+    """[(name, from, to)] of the table's partitions, oldest first; from and
+    to are None for a DEFAULT partition."""
+    rows = db.session.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+    """), {'table': table})
+    found = []
+    for name, bound in rows:
+        match = BOUNDS.search(bound)
+        low, high = (datetime.fromisoformat(match[1]), datetime.fromisoformat(match[2])) if match else (None, None)
+        found.append((name, low, high))
+    return sorted(found, key=lambda partition: partition[1] or datetime.min)
+
+
+def create_partitions(first_month, last_month, table=PARENT, echo=print):
+    """Add the missing monthly partitions from first_month to last_month.
+
+    Each one is created on its own and then attached, which locks the
+    parent in SHARE UPDATE EXCLUSIVE mode, so bets keep being written.
+    """
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        name = partition_name(month)
+        if not _exists(name):
+            bounds = f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            db.session.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+            db.session.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+            db.session.commit()
+            echo(f"Created {name}")
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_partitions(months_ahead=3, echo=print):
+    """Partitions for this month and the next months_ahead ones."""
+    _require_postgres()
+    if not is_partitioned():
+        raise PartitioningError("bet_history is not partitioned; run `flask partition-bet-history` first")
+    this_month = month_start(datetime.utcnow())
+    return create_partitions(this_month, add_months(this_month, months_ahead), echo=echo)
+
+
+def _columns():
+    return [name for (name,) in db.session.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table
+        ORDER BY ordinal_position
+    """), {'table': PARENT})]
+
+
+def _create_staging(oldest, months_ahead, echo):
+    """The partitioned twin of bet_history, with its indexes and foreign keys."""
+    if db.session.execute(text(
+            "SELECT 1 FROM pg_constraint WHERE confrelid = to_regclass(:table)"), {'table': PARENT}).scalar():
+        raise PartitioningError("Other tables reference bet_history; drop those foreign keys first")
+
+    indexes = db.session.execute(text("""
+        SELECT i.indexname, i.indexdef FROM pg_indexes i
+        WHERE i.schemaname = current_schema() AND i.tablename = :table
+          AND i.indexname NOT IN (SELECT conname FROM pg_constraint
+                                  WHERE conrelid = to_regclass(:table) AND contype = 'p')
+    """), {'table': PARENT}).all()
+    for name, definition in indexes:
+        if not INDEX_DEF.match(definition):
+            raise PartitioningError(f"Cannot carry index {name} over to a partitioned table: {definition}")
+    foreign_keys = db.session.execute(text("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(:table) AND contype = 'f'
+    """), {'table': PARENT}).all()
+
+    db.session.execute(text(
+        f"CREATE TABLE {STAGING} (LIKE {PARENT} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"))
+    db.session.execute(text(f"ALTER TABLE {STAGING} ALTER COLUMN created_at SET NOT NULL"))
+    db.session.execute(text(f"ALTER TABLE {STAGING} ADD CONSTRAINT {STAGING}_pkey PRIMARY KEY (id, created_at)"))
+    for name, definition in indexes:
+        db.session.execute(text(INDEX_DEF.sub(f"CREATE INDEX {_staged(name)} ON {STAGING} ", definition)))
+    for name, definition in foreign_keys:
+        db.session.execute(text(f"ALTER TABLE {STAGING} ADD CONSTRAINT {name} {definition}"))
+    db.session.commit()
+    echo(f"Created {STAGING} with {len(indexes)} indexes")
+
+    this_month = month_start(datetime.utcnow())
+    create_partitions(oldest, add_months(this_month, months_ahead), table=STAGING, echo=echo)
+
+
+def _staged(index_name):
+    return f"{index_name[:58]}_part"
+
+
+def _retired(index_name):
+    return f"{index_name[:49]}_unpartitioned"
+
+
+def _install_mirror(columns, oldest):
+    """Copy every write to bet_history into the staging table, in the same
+    transaction. Upserts win over the batch copy, which never overwrites."""
+    fallback = f"'{oldest.isoformat()}'::timestamp"
+    new = [f"COALESCE(NEW.created_at, {fallback})" if c == 'created_at' else f"NEW.{c}" for c in columns]
+    updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in columns if c not in ('id', 'created_at'))
+    db.session.execute(text(f"""
+        CREATE OR REPLACE FUNCTION {MIRROR}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND (TG_OP = 'DELETE' OR NEW.created_at IS DISTINCT FROM OLD.created_at) THEN
+                DELETE FROM {STAGING} WHERE id = OLD.id AND created_at = COALESCE(OLD.created_at, {fallback});
+            END IF;
+            IF TG_OP = 'DELETE' THEN
+                RETURN OLD;
+            END IF;
+            INSERT INTO {STAGING} ({', '.join(columns)}) VALUES ({', '.join(new)})
+            ON CONFLICT (id, created_at) DO UPDATE SET {updates};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+    db.session.execute(text(f"DROP TRIGGER IF EXISTS {MIRROR} ON {PARENT}"))
+    db.session.execute(text(
+        f"CREATE TRIGGER {MIRROR} AFTER INSERT OR UPDATE OR DELETE ON {PARENT} "
+        f"FOR EACH ROW EXECUTE FUNCTION {MIRROR}()"))
+    db.session.commit()
+
+
+def _copy(columns, oldest, low, high, batch_size, pause, echo):
+    """Copy ids low to high in batches. The rows of a batch are locked
+    against deletes until it commits, or a bet deleted meanwhile would be
+    copied back after the mirror had deleted it."""
+    values = ', '.join(f"COALESCE(created_at, '{oldest.isoformat()}'::timestamp)" if c == 'created_at' else c
+                       for c in columns)
+    copy = text(f"""
+        INSERT INTO {STAGING} ({', '.join(columns)})
+        SELECT {values} FROM {PARENT} WHERE id BETWEEN :low AND :high
+        FOR KEY SHARE
+        ON CONFLICT DO NOTHING
+    """)
+    for start in range(low, high + 1, batch_size):
+        end = min(start + batch_size - 1, high)
+        copied = db.session.execute(copy, {'low': start, 'high': end}).rowcount
+        db.session.commit()
+        echo(f"Copied ids {start}-{end} ({copied} rows)")
+        if pause:
+            time.sleep(pause)
+
+
+def _verify():
+    """Both tables, counted in one snapshot, hold the same number of rows."""
+    db.session.execute(text("SET LOCAL statement_timeout = 0"))
+    live, staged = db.session.execute(text(
+        f"SELECT (SELECT count(*) FROM {PARENT}), (SELECT count(*) FROM {STAGING})")).one()
+    db.session.commit()
+    if live != staged:
+        raise PartitioningError(f"{STAGING} has {staged} rows, {PARENT} has {live}; not swapping")
+    return live
+
+
+def _swap(lock_timeout, attempts, echo):
+    """Put the partitioned table in bet_history's place, in one transaction."""
+    indexes = [name for (name,) in db.session.execute(text("""
+        SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table
+          AND indexname NOT IN (SELECT conname FROM pg_constraint
+                                WHERE conrelid = to_regclass(:table) AND contype = 'p')
+    """), {'table': PARENT})]
+    sequence = db.session.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': PARENT}).scalar()
+    db.session.rollback()
+
+    for attempt in range(1, attempts + 1):
+        try:
+            db.session.execute(text(f"SET LOCAL lock_timeout = '{int(lock_timeout * 1000)}ms'"))
+            db.session.execute(text(f"LOCK TABLE {PARENT}, {STAGING} IN ACCESS EXCLUSIVE MODE"))
+            break
+        except OperationalError as e:
+            db.session.rollback()
+            echo(f"Could not lock {PARENT} within {lock_timeout:g}s (attempt {attempt}/{attempts}): {e.orig}")
+            if attempt == attempts:
+                raise PartitioningError("Gave up swapping the tables; rerun once long transactions have finished")
+            time.sleep(lock_timeout)
+
+    db.session.execute(text(f"DROP TRIGGER {MIRROR} ON {PARENT}"))
+    db.session.execute(text(f"DROP FUNCTION {MIRROR}()"))
+    db.session.execute(text(f"ALTER TABLE {PARENT} RENAME TO {RETIRED}"))
+    db.session.execute(text(f"ALTER TABLE {RETIRED} RENAME CONSTRAINT {PARENT}_pkey TO {RETIRED}_pkey"))
+    for name in indexes:
+        db.session.execute(text(f"ALTER INDEX {name} RENAME TO {_retired(name)}"))
+    db.session.execute(text(f"ALTER TABLE {STAGING} RENAME TO {PARENT}"))
+    db.session.execute(text(f"ALTER TABLE {PARENT} RENAME CONSTRAINT {STAGING}_pkey TO {PARENT}_pkey"))
+    for name in indexes:
+        db.session.execute(text(f"ALTER INDEX {_staged(name)} RENAME TO {name}"))
+    if sequence:
+        db.session.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT}.id"))
+    db.session.commit()
+
+
+def abandon_partitioning(echo=print):
+    """Drop the mirror trigger and the staging table of an unfinished run."""
+    _require_postgres()
+    db.session.execute(text(f"DROP TRIGGER IF EXISTS {MIRROR} ON {PARENT}"))
+    db.session.execute(text(f"DROP FUNCTION IF EXISTS {MIRROR}()"))
+    db.session.execute(text(f"DROP TABLE IF EXISTS {STAGING}"))
+    db.session.commit()
+    echo(f"Dropped {STAGING} and its mirror trigger")
+
+
+def partition_bet_history(batch_size=10000, pause=0.0, months_ahead=3, start_id=None, verify=True,
+                          lock_timeout=5.0, attempts=10, echo=print):
+    """Convert bet_history to monthly partitions while the app keeps running.
+
+    Rows without created_at are filed under the oldest month. An interrupted
+    run can be rerun, from start_id to skip the ids it already copied, or
+    undone with abandon_partitioning().
+    """
+    _require_postgres()
+    if is_partitioned():
+        raise PartitioningError("bet_history is already partitioned")
+    if _exists(RETIRED):
+        raise PartitioningError(f"{RETIRED} is left from an earlier conversion; drop it first")
+
+    low, high, oldest = db.session.execute(text(
+        f"SELECT min(id), max(id), min(created_at) FROM {PARENT}")).one()
+    oldest = month_start(oldest or datetime.utcnow())
+    if not _exists(STAGING):
+        _create_staging(oldest, months_ahead, echo)
+    else:
+        echo(f"Resuming with the existing {STAGING}")
+        first = partitions(STAGING)[0][1]
+        if month_start(first) > oldest:
+            raise PartitioningError(f"{STAGING} starts at {first:%Y-%m}, after the oldest bet; drop it and rerun")
+
+    # Writes from here on reach both tables; rows up to the current max id
+    # are copied in batches
+    columns = _columns()
+    _install_mirror(columns, oldest)
+    high = db.session.execute(text(f"SELECT max(id) FROM {PARENT}")).scalar()
+    db.session.commit()
+    if high is not None:
+        _copy(columns, oldest, max(low or 1, start_id or 1), high, batch_size, pause, echo)
+
+    if verify:
+        echo(f"{_verify()} rows in both tables")
+    _swap(lock_timeout, attempts, echo)
+    echo(f"bet_history is partitioned; drop {RETIRED} once you are satisfied")
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from _plan_nodes(child)
+
+
+def _explain(engine, statement, parameters):
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql('EXPLAIN (ANALYZE, FORMAT JSON) ' + statement, parameters).scalar()
+        conn.rollback()
+    return plan[0]['Plan']
+
+
+def check_pruning(app, user_id, limit=50):
+    """EXPLAIN ANALYZE the statements /history (first and second page) and
+    /stats run for user_id. Returns (report lines, problems).
+
+    A first /history page must read the partitions newest first and stop
+    at the limit, not sort all of them. A later page must not read any
+    partition newer than its cursor. /stats reads the rollup, never
+    bet_history.
+    """
+    bounds = {name: (low, high) for name, low, high in partitions()}
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if PARENT in statement:
+            captured.append((conn.engine, statement, parameters))
+
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+    client = app.test_client()
+
+    def run(url):
+        del captured[:]
+        response = client.get(url, headers=headers)
+        if response.status_code != 200:
+            raise PartitioningError(f"{url} answered {response.status_code}: {response.get_json()}")
+        return response, list(captured)
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response, statements = run(f'/history?limit={limit}')
+        checks = [('/history', None, statements)]
+        cursor = response.get_json()['next_cursor']
+        if cursor:
+            checks.append(('/history next page', decode_cursor(cursor, datetime, int)[0],
+                           run(f'/history?limit={limit}&cursor={cursor}')[1]))
+        checks.append(('/stats', None, run('/stats')[1]))
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', capture)
+
+    lines, problems = [], []
+    for label, before, statements in checks:
+        if label == '/stats':
+            lines.append(f"{label}: {len(statements)} statements on bet_history")
+            if statements:
+                problems.append("/stats reads bet_history instead of the rollup")
+            continue
+        for engine, statement, parameters in statements:
+            nodes = list(_plan_nodes(_explain(engine, statement, parameters)))
+            planned = [node['Relation Name'] for node in nodes if node.get('Relation Name') in bounds]
+            scanned = [node['Relation Name'] for node in nodes
+                       if node.get('Relation Name') in bounds and node.get('Actual Loops', 0) > 0]
+            lines.append(f"{label}: {len(planned)} of {len(bounds)} partitions planned, {len(scanned)} read")
+            if any(node['Node Type'] == 'Sort' for node in nodes):
+                problems.append(f"{label} sorts bet_history instead of reading the partitions in order")
+            newer = [name for name in planned if before is not None and bounds[name][0] and bounds[name][0] > before]
+            if newer:
+                problems.append(f"{label} plans partitions newer than its cursor: {', '.join(newer)}")
+    return lines, problems
+
+
+def check_partitions(app, months_ahead=1, user_id=None, echo=print):
+    """Problems with bet_history's partitions, as a list of strings."""
+    _require_postgres()
+    if not is_partitioned():
+        return ["bet_history is not partitioned; run `flask partition-bet-history`"]
+    found = partitions()
+    problems = []
+    for name, low, high in found:
+        echo(f"{name:<24} {f'{low:%Y-%m-%d} to {high:%Y-%m-%d}' if low else 'DEFAULT'}")
+        if low is None or not PARTITION_NAME.match(name):
+            problems.append(f"{name} is not a monthly partition")
+    this_month = month_start(datetime.utcnow())
+    needed = partition_name(add_months(this_month, months_ahead))
+    if not any(name == needed for name, low, high in found):
+        problems.append(f"{needed} is missing; run `flask create-partitions`")
+
+    if user_id is None:
+        user_id = db.session.execute(text(f"SELECT user_id FROM {PARENT} ORDER BY id DESC LIMIT 1")).scalar()
+    db.session.commit()
+    if user_id is None:
+        echo("No bets yet, pruning not checked")
+        return problems
+    lines, pruning = check_pruning(app, user_id)
+    for line in lines:
+        echo(line)
+    return problems + pruning
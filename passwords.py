@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """Every slot of the hashing pool is taken; the caller should retry later."""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(pw_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+    except ValueError:  # not a bcrypt hash
+        return False
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification in a bounded process pool.
+
+    bcrypt is slow on purpose; run in the request it holds the worker and,
+    under gevent, every other request of that worker. Here the work runs in
+    ``workers`` processes and a request only waits on the result. At most
+    ``max_pending`` calls may be queued or running; a call that cannot get a
+    slot within ``wait`` seconds raises PasswordHasherBusy so the route can
+    shed load instead of queueing without bound. ``workers=0`` hashes inline.
+
+    Hashes are compatible with Flask-Bcrypt. ``rounds`` is the work factor
+    for new hashes; needs_rehash() reports hashes made with another one.
+    """
+
+    def __init__(self, rounds=12, workers=None, max_pending=None, wait=2.0):
+        self.rounds = rounds
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 8
+        self.wait = wait
+        self.rejected = 0
+        self._pending = 0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def _executor(self):
+        # Created on the first hash and per process, so each forked worker
+        # has its own and importing app.py (CLI commands, tests, scripts)
+        # forks nothing. Forked, not spawned: spawn and forkserver start
+        # multiprocessing's resource tracker, which cannot be stopped again
+        # once gevent has patched os. Under gevent the app's threads are
+        # greenlets, parked at the fork rather than holding OS-level locks
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.wait):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy()
+        with self._lock:
+            self._pending += 1
+        try:
+            return self._executor().submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check(self, pw_hash, password):
+        return self._run(_check, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """True for hashes that are not $2b$ bcrypt at the current work factor."""
+        parts = pw_hash.split('$')
+        return len(parts) < 4 or parts[1] != '2b' or parts[2] != f'{self.rounds:02d}'
+
+    def queue_depth(self):
+        """Calls waiting for or running in the pool."""
+        return self._pending
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
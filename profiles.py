@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from extensions import db
+
+# Immutable snapshot of the profile columns of a users row
+ProfileSnapshot = namedtuple('ProfileSnapshot', ['id', 'username', 'email', 'balance', 'created_at'])
+
+# session.info key under which wallet collects the users whose balance changed
+BALANCE_CHANGED = 'balance_changed'
+
+
+def balance_changed(user_ids):
+    """Note users whose balance the current transaction moved; their cached
+    profiles are dropped once it commits."""
+    db.session.info.setdefault(BALANCE_CHANGED, set()).update(int(user_id) for user_id in user_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _drop_committed(session):
+    user_ids = session.info.pop(BALANCE_CHANGED, None)
+    if user_ids and has_app_context():
+        cache = current_app.extensions.get('profile_cache')
+        if cache is not None:
+            cache.committed(user_ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop(BALANCE_CHANGED, None)
+
+
+class ProfileCache:
+    """Process-local LRU of profile snapshots, each kept for ``ttl`` seconds.
+
+    It backs flask_jwt_extended's current_user, so an authenticated request
+    costs at most one users read and a client polling /profile usually none.
+    Entries are dropped after a commit that changed the user's balance (see
+    balance_changed); once attached to an EventHub the drop is sent to every
+    worker. The TTL bounds staleness if such a message is lost.
+
+    A snapshot read while a balance change was being committed is not
+    stored, so an invalidation cannot be undone by a slower reader.
+    """
+
+    SEND_BATCH = 500  # user ids per hub message, within a NOTIFY payload
+
+    def __init__(self, ttl=2.0, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # user_id -> (snapshot, expires_at)
+        self._versions = OrderedDict()  # user_id -> invalidations seen
+        self._lock = threading.Lock()
+        self._hub = None
+
+    def attach(self, hub):
+        self._hub = hub
+        hub.on('profiles', lambda payload: self.invalidate(payload['user_ids']))
+
+    def committed(self, user_ids):
+        """Drop the profiles of users whose balance change just committed."""
+        user_ids = sorted(user_ids)
+        self.invalidate(user_ids)
+        if self._hub is not None:
+            for i in range(0, len(user_ids), self.SEND_BATCH):
+                self._hub.send('profiles', {'user_ids': user_ids[i:i + self.SEND_BATCH]})
+
+    @staticmethod
+    def _load(user_id):
+        from models import User
+
+        row = db.session.query(User.id, User.username, User.email, User.balance, User.created_at) \
+            .filter(User.id == user_id).first()
+        return ProfileSnapshot(*row) if row else None
+
+    def get(self, user_id):
+        """Profile of user_id, or None if there is no such user."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            version = self._versions.get(user_id, 0)
+
+        snapshot = self._load(user_id)
+        if snapshot is None or self.ttl <= 0:
+            return snapshot
+        with self._lock:
+            if self._versions.get(user_id, 0) == version:
+                self._entries[user_id] = (snapshot, now + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                self._versions.move_to_end(user_id)
+            while len(self._versions) > self.maxsize:
+                self._versions.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,133 @@
+"""SQL statement counting, query budgets per route and N+1 detection.
+
+A route declares how many statements a request may run with
+@query_budget(n). With QUERY_BUDGETS set to "raise" (tests) or "warn"
+(staging) every request is checked after it ran: it fails, or is logged,
+when it went over its budget or ran the same statement more than
+QUERY_REPEAT_LIMIT times, which is what a query in a loop looks like.
+
+QueryCounter does the same for any block of code:
+
+    with QueryCounter() as queries:
+        client.get('/history', headers=headers)
+    queries.check(budget=2)
+
+and the query_counter fixture in tests/conftest.py wraps a whole test in one.
+"""
+from collections import Counter
+from contextvars import ContextVar
+
+from flask import current_app, request
+from sqlalchemy import event
+
+from extensions import db
+
+REPEAT_LIMIT = 3
+
+# Statements of the current request while budgets are checked
+_request_statements = ContextVar('request_statements', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(statements):
+    """Declare the most SQL statements one request of this route may run."""
+    def decorator(view):
+        view.query_budget = statements
+        return view
+    return decorator
+
+
+def problems(statements, budget=None, repeat_limit=REPEAT_LIMIT):
+    """Why a list of executed statements breaks the budget or repeats, if it does."""
+    found = []
+    if budget is not None and len(statements) > budget:
+        found.append(f"{len(statements)} statements, budget is {budget}")
+    for statement, times in Counter(statements).most_common():
+        if times <= repeat_limit:
+            break
+        found.append(f"ran {times} times: {' '.join(statement.split())[:200]}")
+    return found
+
+
+class QueryCounter:
+    """Records the SQL statements run on some engines (by default every
+    engine of the current app) while the block runs, from any thread.
+
+    executemany() is one statement, as it is one round trip.
+    """
+
+    def __init__(self, engines=None):
+        self.engines = engines
+        self.statements = []
+
+    def __enter__(self):
+        if self.engines is None:
+            self.engines = list(db.engines.values())
+        elif not isinstance(self.engines, (list, tuple)):
+            self.engines = [self.engines]
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def reset(self):
+        self.statements = []
+
+    def repeated(self, repeat_limit=REPEAT_LIMIT):
+        """Statements run more than repeat_limit times, with their counts."""
+        return {statement: times for statement, times in Counter(self.statements).items() if times > repeat_limit}
+
+    def check(self, budget=None, repeat_limit=REPEAT_LIMIT):
+        found = problems(self.statements, budget, repeat_limit)
+        if found:
+            raise QueryBudgetExceeded('; '.join(found))
+
+
+def _record_request_statement(conn, cursor, statement, parameters, context, executemany):
+    statements = _request_statements.get()
+    if statements is not None:
+        statements.append(statement)
+
+
+def _start_request():
+    _request_statements.set([])
+
+
+def _check_request(response):
+    statements = _request_statements.get()
+    if statements is None:
+        return response
+    _request_statements.set(None)
+    view = current_app.view_functions.get(request.endpoint)
+    found = problems(statements, getattr(view, 'query_budget', None), current_app.config['QUERY_REPEAT_LIMIT'])
+    if found:
+        message = f"{request.method} {request.path}: {'; '.join(found)}"
+        if current_app.config['QUERY_BUDGETS'] == 'raise':
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning("Query budget: %s", message)
+    return response
+
+
+def init_app(app):
+    """Check every request against its route's budget if QUERY_BUDGETS is set."""
+    if not app.config.get('QUERY_BUDGETS'):
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _record_request_statement)
+    app.before_request(_start_request)
+    app.after_request(_check_request)
+
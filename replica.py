@@ -0,0 +1,140 @@
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+
+# Seconds the replica is behind; 0 when it has replayed everything it
+# received, NULL (-> 0) on a server that is not a standby
+PG_REPLICA_LAG = text("""
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END
+""")
+
+
+class ReplicaGuard:
+    """Decides whether a read-only request may be served by the replica.
+
+    It may not if the user committed a write less than ``read_your_writes``
+    seconds ago (their own change might not have been replayed yet), or if
+    the replica was more than ``max_lag`` seconds behind, or unreachable, at
+    the last check. Lag is checked at most every ``check_interval`` seconds.
+
+    Writes are noted per process; once attached to an EventHub they are
+    sent to every worker, so the next request of the user is routed right
+    whichever worker serves it.
+    """
+
+    def __init__(self, read_your_writes=5.0, max_lag=5.0, check_interval=1.0):
+        self.read_your_writes = read_your_writes
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._writers = {}  # user id -> monotonic time until which reads go to the primary
+        self._lag = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._hub = None
+
+    def attach(self, hub):
+        self._hub = hub
+        hub.on('replica_writes', lambda payload: self._note(payload['user_ids']))
+
+    def _note(self, user_ids):
+        until = time.monotonic() + self.read_your_writes
+        with self._lock:
+            for user_id in user_ids:
+                self._writers[str(user_id)] = until
+
+    def wrote(self, user_id):
+        """The user just committed a write."""
+        self._note([user_id])
+        if self._hub is not None:
+            self._hub.send('replica_writes', {'user_ids': [str(user_id)]})
+
+    def recently_wrote(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            until = self._writers.get(str(user_id))
+            if until is not None and until <= now:
+                del self._writers[str(user_id)]
+                until = None
+            if len(self._writers) > 10000:
+                self._writers = {k: v for k, v in self._writers.items() if v > now}
+        return until is not None
+
+    def lag(self, engine):
+        """Replica lag in seconds from the last check, or None if it failed."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._lag
+        self._checked_at = now
+        if engine.dialect.name != 'postgresql':
+            self._lag = 0.0
+            return self._lag
+        try:
+            with engine.connect() as conn:
+                self._lag = float(conn.execute(PG_REPLICA_LAG).scalar() or 0)
+        except SQLAlchemyError as e:
+            current_app.logger.warning("Replica lag check failed, reading from the primary: %s", e)
+            self._lag = None
+        return self._lag
+
+    def use_replica(self, user_id):
+        engine = db.engines.get('replica')
+        if engine is None:
+            return False
+        if user_id is not None and self.recently_wrote(user_id):
+            return False
+        lag = self.lag(engine)
+        return lag is not None and lag <= self.max_lag
+
+
+def read_replica(view):
+    """Serve a read-only route from the replica when ReplicaGuard allows it.
+
+    Goes below @jwt_required(), so the user is known. The choice holds for
+    the whole request, including a streamed response.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        guard = current_app.extensions.get('replica_guard')
+        g.read_replica = guard is not None and guard.use_replica(get_jwt_identity())
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(db.session, 'after_flush')
+def _note_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _note_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _note_committed_write(session):
+    if not session.info.pop('wrote', False) or not has_request_context():
+        return
+    guard = current_app.extensions.get('replica_guard')
+    if guard is None or 'replica' not in db.engines:
+        return
+    try:
+        user_id = get_jwt_identity()
+    except RuntimeError:  # no JWT on this request (register, login)
+        return
+    if user_id is not None:
+        guard.wrote(user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
@@ -0,0 +1,203 @@
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+class LiveRound:
+    """State of one Russian Roulette round that the routes act on."""
+
+    __slots__ = ('roulette_id', 'multiplayer_id', 'room_id', 'game_id',
+                 'bullet_position', 'current_position', 'status', 'lock')
+
+    def __init__(self, roulette_id, multiplayer_id, room_id, game_id, bullet_position, current_position, status):
+        self.roulette_id = roulette_id
+        self.multiplayer_id = multiplayer_id
+        self.room_id = room_id
+        self.game_id = game_id
+        self.bullet_position = bullet_position
+        self.current_position = current_position
+        self.status = status
+        self.lock = threading.Lock()
+
+
+class RoomEngine:
+    """Russian Roulette rounds, with every action on a round serialized.
+
+    With ``write_behind`` the process holds the authoritative state of its
+    live rounds: a trigger pull that does not end the round touches no
+    database row in the request. Its chamber position is queued and
+    written by a background thread every ``flush_interval`` seconds,
+    coalesced per round. Anything that moves money (bets, settlement) is
+    still written synchronously by the route. After a crash the rounds are
+    rebuilt from the last checkpoint; a lost checkpoint only repeats empty
+    chambers, since the bullet position is stored when the round starts.
+
+    This needs every request for a round to reach the same process, so it
+    is only for a single worker. Without write_behind each action loads the
+    round with one locking query and writes it back in the request's
+    transaction, which is safe with any number of workers.
+    """
+
+    def __init__(self, write_behind=False, flush_interval=0.05):
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self._rounds = {}   # roulette_id -> LiveRound
+        self._dirty = {}    # roulette_id -> chamber position to checkpoint
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._app = None
+
+    def start(self, app):
+        """Start the checkpoint writer (write_behind only)."""
+        if not self.write_behind or self._app is not None:
+            return
+        self._app = app
+        threading.Thread(target=self._write_loop, name='room-checkpoints', daemon=True).start()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def _query(for_update=False):
+        from models import GameSession, Multiplayer, RussianRoulette
+
+        game_id = db.select(GameSession.game_id) \
+            .where(GameSession.multiplayer_id == RussianRoulette.multiplayer_id, GameSession.status == 'active') \
+            .limit(1) \
+            .scalar_subquery()
+        query = db.session.query(
+            RussianRoulette.id, RussianRoulette.multiplayer_id, Multiplayer.session_id, game_id,
+            RussianRoulette.bullet_position, RussianRoulette.current_position, RussianRoulette.status,
+        ).join(Multiplayer, Multiplayer.id == RussianRoulette.multiplayer_id)
+        if for_update:
+            query = query.with_for_update(of=RussianRoulette)
+        return query
+
+    def _load(self, roulette_id, for_update=False):
+        from models import RussianRoulette
+
+        row = self._query(for_update).filter(RussianRoulette.id == roulette_id).first()
+        return LiveRound(*row) if row else None
+
+    @contextmanager
+    def round(self, roulette_id):
+        """Yield the round with its lock held, or None if it does not exist."""
+        try:
+            roulette_id = int(roulette_id)
+        except (TypeError, ValueError):
+            yield None
+            return
+
+        if not self.write_behind:
+            yield self._load(roulette_id, for_update=True)
+            return
+
+        live = self._rounds.get(roulette_id)
+        if live is None:
+            live = self._load(roulette_id)
+            if live is None:
+                yield None
+                return
+            if live.status == 'active' and live.game_id is not None:
+                with self._lock:
+                    live = self._rounds.setdefault(roulette_id, live)
+        with live.lock:
+            yield live
+
+    def checkpoint(self, live):
+        """Persist the chamber position of a round that is still running."""
+        if self.write_behind:
+            with self._lock:
+                self._dirty[live.roulette_id] = live.current_position
+            self._wake.set()
+        else:
+            self._write({live.roulette_id: live.current_position})
+
+    def forget(self, live):
+        """Drop a finished round; its final state was written by the caller."""
+        with self._lock:
+            self._rounds.pop(live.roulette_id, None)
+            self._dirty.pop(live.roulette_id, None)
+
+    def revalidate(self, room_id):
+        """Reload whether anyone still plays the room's held rounds.
+
+        Called after players left or the room closed. The chamber position
+        held in memory is kept; a round nobody plays any more is dropped, so
+        the next action on it loads it from the database like write-through.
+        """
+        if not self.write_behind:
+            return
+        for live in [live for live in list(self._rounds.values()) if live.room_id == room_id]:
+            with live.lock:
+                fresh = self._load(live.roulette_id)
+                live.game_id = fresh.game_id if fresh else None
+                live.status = fresh.status if fresh else 'missing'
+                if live.game_id is None or live.status != 'active':
+                    with self._lock:
+                        self._rounds.pop(live.roulette_id, None)
+
+    @staticmethod
+    def _write(positions):
+        from models import RussianRoulette
+
+        table = RussianRoulette.__table__
+        # Only rounds still active: a finished round was written synchronously
+        stmt = table.update() \
+            .where(table.c.id == db.bindparam('roulette_id'), table.c.status == 'active') \
+            .values(current_position=db.bindparam('position'))
+        db.session.connection().execute(
+            stmt, [{'roulette_id': k, 'position': v} for k, v in positions.items()])
+
+    def flush(self):
+        """Write queued checkpoints in one transaction."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty or self._app is None:
+            return
+        try:
+            with self._app.app_context():
+                self._write(dirty)
+                db.session.commit()
+        except SQLAlchemyError:
+            logger.exception("Room checkpoint failed; retrying")
+            with self._lock:
+                for roulette_id, position in dirty.items():
+                    self._dirty.setdefault(roulette_id, position)
+            self._wake.set()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.flush()
+            time.sleep(self.flush_interval)
+
+    def rebuild(self):
+        """Reload every active round from the database."""
+        from models import RussianRoulette
+
+        rows = self._query().filter(RussianRoulette.status == 'active').all()
+        rounds = {row[0]: LiveRound(*row) for row in rows if row[3] is not None}
+        with self._lock:
+            self._rounds = rounds
+            self._dirty = {}
+
+    def warm(self):
+        if not self.write_behind:
+            return
+        try:
+            self.rebuild()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.warning("Room engine not rebuilt: %s", e)
+
+    def live_count(self):
+        return len(self._rounds)
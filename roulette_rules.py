@@ -0,0 +1,30 @@
+"""Outcome rules of Russian Roulette, shared by pull_trigger and `flask simulate`.
+
+The functions only use comparisons and arithmetic, so they accept plain
+numbers in the routes and NumPy arrays (one entry per round) in the simulator.
+"""
+CHAMBERS = 6
+BET_TYPES = ('survival', 'elimination')
+ODDS_MULTIPLIER = 2.0  # Winning bets are paid this multiple of the stake
+
+
+def trigger(current_position, bullet_position):
+    """(is_hit, game_over) for pulling the trigger at current_position."""
+    is_hit = current_position == bullet_position
+    return is_hit, is_hit | (current_position + 1 > CHAMBERS)
+
+
+def bet_wins(bet_type, is_hit):
+    """Survival bets win if the round ended without a hit, elimination bets
+    if it ended with one."""
+    return (bet_type in BET_TYPES) & (is_hit != (bet_type == 'survival'))
+
+
+def winning_bet_type(is_hit):
+    """The bet type bet_wins pays for a round that ended with is_hit."""
+    return 'elimination' if is_hit else 'survival'
+
+
+def payout(bet_type, bet_amount, is_hit):
+    """Amount paid back for a bet when the round ends; 0 for a losing bet."""
+    return bet_amount * ODDS_MULTIPLIER * bet_wins(bet_type, is_hit)
@@ -0,0 +1,106 @@
+"""Monte Carlo estimates of RTP, volatility and risk of ruin, for `flask simulate`.
+
+A sampler is a picklable callable ``sampler(count, rng)`` returning the payout
+multiplier of ``count`` independent one-unit bets as a NumPy array. The
+samplers here are built from the same code the routes use (wheel.Paytable and
+roulette_rules), so a change to a paytable or to the roulette rules is
+simulated exactly as it will be played.
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+import roulette_rules
+
+
+def roulette_multipliers(bet_type, count, rng):
+    """Play ``count`` roulette rounds from chamber 1 and pay one bet of bet_type."""
+    bullets = rng.integers(1, roulette_rules.CHAMBERS + 1, size=count)
+    final_hit = np.zeros(count, dtype=bool)
+    active = np.ones(count, dtype=bool)
+    position = 1
+    while active.any():
+        is_hit, game_over = roulette_rules.trigger(position, bullets)
+        ended = active & game_over
+        final_hit[ended] = is_hit[ended]
+        active &= ~game_over
+        position += 1
+    return roulette_rules.payout(bet_type, 1.0, final_hit)
+
+
+def roulette_sampler(bet_type):
+    return partial(roulette_multipliers, bet_type)
+
+
+def spin_sampler(paytable):
+    return partial(_paytable_multipliers, paytable)
+
+
+def _paytable_multipliers(paytable, count, rng):
+    return paytable.draw(count, rng)
+
+
+def _moments(sampler, rounds, batch_size, seed):
+    rng = np.random.default_rng(seed)
+    n = total = total_sq = hits = 0
+    while n < rounds:
+        m = sampler(min(batch_size, rounds - n), rng)
+        n += len(m)
+        total += float(m.sum())
+        total_sq += float(np.square(m).sum())
+        hits += int(np.count_nonzero(m))
+    return n, total, total_sq, hits
+
+
+def estimate(sampler, rounds, batch_size=1_000_000, workers=1, seed=None):
+    """RTP, variance of the multiplier, its standard error and hit frequency
+    over ``rounds`` simulated bets, split across ``workers`` processes."""
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    shares = [rounds // workers + (i < rounds % workers) for i in range(workers)]
+    if workers == 1:
+        parts = [_moments(sampler, rounds, batch_size, seeds[0])]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_moments, [sampler] * workers, shares, [batch_size] * workers, seeds))
+
+    n = sum(p[0] for p in parts)
+    mean = sum(p[1] for p in parts) / n
+    variance = max(sum(p[2] for p in parts) / n - mean * mean, 0.0)
+    return {
+        'rounds': n,
+        'rtp': mean,
+        'house_edge': 1.0 - mean,
+        'variance': variance,
+        'std_dev': math.sqrt(variance),
+        'rtp_std_error': math.sqrt(variance / n),
+        'hit_frequency': sum(p[3] for p in parts) / n,
+    }
+
+
+def risk_of_ruin(sampler, bankroll, stake=1.0, paths=10000, horizon=10000,
+                 checkpoints=10, chunk=256, seed=None):
+    """Share of players starting with ``bankroll`` and betting ``stake`` every
+    round who can no longer cover the stake within t rounds.
+
+    Returns [(t, probability)] for ``checkpoints`` log-spaced t up to horizon.
+    """
+    rng = np.random.default_rng(seed)
+    balance = np.full(paths, float(bankroll))
+    ruined_at = np.full(paths, np.inf)
+    done = 0
+    while done < horizon:
+        steps = min(chunk, horizon - done)
+        net = (sampler(paths * steps, rng).reshape(paths, steps) - 1.0) * stake
+        path = balance[:, None] + np.cumsum(net, axis=1)
+        below = path < stake
+        newly = below.any(axis=1) & np.isinf(ruined_at)
+        ruined_at[newly] = done + 1 + below[newly].argmax(axis=1)
+        balance = path[:, -1]
+        done += steps
+    if bankroll < stake:
+        ruined_at[:] = 0
+
+    ts = np.unique(np.geomspace(1, horizon, checkpoints).astype(int))
+    return [(int(t), float(np.mean(ruined_at <= t))) for t in ts]
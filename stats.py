@@ -0,0 +1,203 @@
+import math
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from catalog import get_catalog
+from extensions import db
+from models import BetHistory, Game, User, UserGameStats
+
+
+def _shape(rows):
+    """Build the /stats response from (game name, bets, wagered, won) rows."""
+    games_stats = []
+    total_bets = 0
+    total_wagered = 0
+    total_won = 0
+
+    for name, game_total_bets, game_total_wagered, game_total_won in rows:
+        total_bets += game_total_bets
+        total_wagered += game_total_wagered
+        total_won += game_total_won
+
+        games_stats.append({
+            'game': name,
+            'total_bets': game_total_bets,
+            'total_wagered': game_total_wagered,
+            'total_won': game_total_won,
+            'net_profit': game_total_won - game_total_wagered
+        })
+
+    return {
+        'overall': {
+            'total_bets': total_bets,
+            'total_wagered': total_wagered,
+            'total_won': total_won,
+            'net_profit': total_won - total_wagered
+        },
+        'by_game': games_stats
+    }
+
+
+def user_stats(user_id):
+    """Overall and per-game betting totals for a user, shaped for /stats.
+
+    Reads the user_game_stats rollup, so the cost is one row per game the
+    user has played no matter how long their bet history is. Game names
+    come from the in-process catalog.
+    """
+    catalog = get_catalog()
+    rows = db.session.query(
+        UserGameStats.game_id,
+        UserGameStats.bet_count,
+        UserGameStats.total_wagered,
+        UserGameStats.total_won,
+    ).filter(UserGameStats.user_id == user_id) \
+        .order_by(UserGameStats.game_id) \
+        .all()
+
+    named_rows = []
+    for game_id, bets, wagered, won in rows:
+        name = catalog.name_of(game_id)
+        if name:
+            named_rows.append((name, bets, wagered, won))
+
+    return _shape(named_rows)
+
+
+def _bet_history_totals(user_filter):
+    return db.select(
+        BetHistory.user_id,
+        BetHistory.game_id,
+        db.func.count(BetHistory.id).label('bet_count'),
+        db.func.coalesce(db.func.sum(BetHistory.bet_amount), 0.0).label('total_wagered'),
+        db.func.coalesce(db.func.sum(BetHistory.win_amount), 0.0).label('total_won'),
+    ).where(user_filter).group_by(BetHistory.user_id, BetHistory.game_id)
+
+
+def aggregate_stats(user_id):
+    """Same as user_stats, but aggregated straight from bet_history."""
+    totals = _bet_history_totals(BetHistory.user_id == user_id).subquery()
+    rows = db.session.query(
+        Game.name,
+        totals.c.bet_count,
+        totals.c.total_wagered,
+        totals.c.total_won,
+    ).join(totals, Game.id == totals.c.game_id) \
+        .order_by(Game.id) \
+        .all()
+
+    return _shape(rows)
+
+
+# Databases whose INSERT ... ON CONFLICT the rollup is written with;
+# create_app refuses any other
+UPSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _upsert():
+    return UPSERTS[db.session.get_bind().dialect.name](UserGameStats)
+
+
+def _add_on_conflict(stmt):
+    return stmt.on_conflict_do_update(
+        index_elements=[UserGameStats.user_id, UserGameStats.game_id],
+        set_={
+            'bet_count': UserGameStats.bet_count + stmt.excluded.bet_count,
+            'total_wagered': UserGameStats.total_wagered + stmt.excluded.total_wagered,
+            'total_won': UserGameStats.total_won + stmt.excluded.total_won,
+            'net_profit': UserGameStats.net_profit + stmt.excluded.net_profit,
+            'updated_at': db.func.now(),
+        }
+    )
+
+
+def _bump(user_id, game_id, bets, wagered, won):
+    stmt = _upsert().values(
+        user_id=user_id,
+        game_id=game_id,
+        bet_count=bets,
+        total_wagered=wagered,
+        total_won=won,
+        net_profit=won - wagered,
+    )
+    db.session.execute(_add_on_conflict(stmt))
+
+
+def record_bet(user_id, game_id, bet_amount, win_amount=0):
+    """Add a new bet_history row to the rollup. Call in the same transaction."""
+    _bump(user_id, game_id, 1, bet_amount, win_amount)
+
+
+def record_bets(user_id, game_id, count, wagered, won):
+    """Add ``count`` new bet_history rows with the given totals to the rollup."""
+    _bump(user_id, game_id, count, wagered, won)
+
+
+def record_payouts(winnings):
+    """Add settled winnings to the rollup in one statement.
+
+    ``winnings`` is a SELECT of (user_id, game_id, amount) with one row per
+    user and game, e.g. a round's winning bets grouped by user.
+    """
+    won = winnings.subquery()
+    stmt = _upsert().from_select(
+        ['user_id', 'game_id', 'bet_count', 'total_wagered', 'total_won', 'net_profit'],
+        db.select(won.c.user_id, won.c.game_id, db.literal(0), db.literal(0.0), won.c.amount, won.c.amount)
+        .where(won.c.amount > 0)
+    )
+    db.session.execute(_add_on_conflict(stmt))
+
+
+def _user_batches(batch_size):
+    max_id = db.session.query(db.func.max(User.id)).scalar() or 0
+    for low in range(1, max_id + 1, batch_size):
+        yield low, low + batch_size - 1
+
+
+def rebuild_user_game_stats(batch_size=1000, echo=print):
+    """Recompute user_game_stats from bet_history, one user id range at a time.
+
+    Each batch locks its users' rows first. Every bet write also updates the
+    user's balance, so concurrent bets for those users wait until the batch
+    has been replaced and committed.
+    """
+    for low, high in _user_batches(batch_size):
+        db.session.query(User.id).filter(User.id.between(low, high)).with_for_update().all()
+        db.session.query(UserGameStats) \
+            .filter(UserGameStats.user_id.between(low, high)) \
+            .delete(synchronize_session=False)
+
+        totals = _bet_history_totals(BetHistory.user_id.between(low, high)).subquery()
+        db.session.execute(db.insert(UserGameStats).from_select(
+            ['user_id', 'game_id', 'bet_count', 'total_wagered', 'total_won', 'net_profit', 'updated_at'],
+            db.select(*totals.c, totals.c.total_won - totals.c.total_wagered, db.func.now())
+        ))
+        db.session.commit()
+        echo(f"Rebuilt stats for users {low}-{high}")
+
+
+def check_user_game_stats(batch_size=1000):
+    """Compare the rollup with bet_history and return the rows that differ.
+
+    Each mismatch is (user_id, game_id, expected, actual) where expected and
+    actual are (bet_count, total_wagered, total_won, net_profit) tuples or
+    None.
+    """
+    mismatches = []
+    for low, high in _user_batches(batch_size):
+        expected = {
+            (user_id, game_id): (bets, wagered, won, won - wagered)
+            for user_id, game_id, bets, wagered, won in db.session.execute(
+                _bet_history_totals(BetHistory.user_id.between(low, high)))
+        }
+        actual = {
+            (row.user_id, row.game_id): (row.bet_count, row.total_wagered, row.total_won, row.net_profit)
+            for row in UserGameStats.query.filter(UserGameStats.user_id.between(low, high))
+        }
+        for key in sorted(expected.keys() | actual.keys()):
+            want, got = expected.get(key), actual.get(key)
+            if want is None or got is None or want[0] != got[0] or not all(
+                    math.isclose(w, g, rel_tol=1e-9, abs_tol=1e-6) for w, g in zip(want[1:], got[1:])):
+                mismatches.append((*key, want, got))
+        db.session.rollback()
+    return mismatches
@@ -0,0 +1,121 @@
+import os
+import sys
+
+import bcrypt
+import pytest
+from flask_jwt_extended import create_access_token
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import db
+from querybudget import QueryCounter
+
+PASSWORD = 'secret'
+
+
+@pytest.fixture
+def app_config(request, tmp_path):
+    """Overrides for the test app; a test can change them before ``app`` is
+    built, or parametrize them indirectly with a dict of extra settings."""
+    return {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path}/test.db",
+        'QUERY_BUDGETS': 'raise',
+        'GAME_CATALOG_CHECK_INTERVAL': None,
+        'PASSWORD_HASH_WORKERS': 0,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'PROFILE_CACHE_TTL': 0,
+    } | getattr(request, 'param', {})
+
+
+@pytest.fixture
+def app(app_config):
+    """An app on a scratch SQLite file with both games and three users of
+    balance 1000, whose password is PASSWORD."""
+    app = create_app(app_config)
+    from models import Game, User
+
+    password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(4)).decode()
+    with app.app_context():
+        # Only the primary: a replica, if configured, is made from it by the test
+        db.create_all(bind_key=None)
+        db.session.add_all([
+            Game(name='Spin and Win', description='Spin the wheel', min_bet=1, max_bet=1000),
+            Game(name='Russian Roulette', description='Multiplayer roulette', min_bet=1, max_bet=1000),
+        ])
+        db.session.add_all([User(username=f'player{i}', email=f'player{i}@example.com',
+                                 password=password, balance=1000.0) for i in range(3)])
+        db.session.commit()
+        app.extensions['game_catalog'].refresh(force=True)
+    yield app
+    app.extensions['room_engine'].flush()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def users(app):
+    """Ids of the three users."""
+    from models import User
+
+    with app.app_context():
+        return [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+
+
+@pytest.fixture
+def auth(app):
+    """auth(user_id) -> Authorization header for that user."""
+    def headers(user_id):
+        with app.app_context():
+            return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+    return headers
+
+
+@pytest.fixture
+def game_ids(app):
+    """{'spin': id, 'roulette': id}"""
+    from models import Game
+
+    with app.app_context():
+        games = dict(db.session.query(Game.name, Game.id))
+    return {'spin': games['Spin and Win'], 'roulette': games['Russian Roulette']}
+
+
+@pytest.fixture
+def start_round(app):
+    """start_round(room_id, user_ids, bullet_position) -> roulette id.
+
+    No route starts a round yet: seat the players and load the chamber the
+    way the room's first round would.
+    """
+    from models import GameSession, Multiplayer, RussianRoulette
+
+    def start(room_id, user_ids, bullet_position=6):
+        with app.app_context():
+            multiplayer = Multiplayer.query.filter_by(session_id=room_id).one()
+            multiplayer.status = 'active'
+            db.session.add_all([GameSession(user_id=user_id, game_id=multiplayer.game_id,
+                                            multiplayer_id=multiplayer.id, status='active')
+                                for user_id in user_ids])
+            roulette = RussianRoulette(multiplayer_id=multiplayer.id, game_id=multiplayer.game_id,
+                                       bullet_position=bullet_position, current_position=1, status='active')
+            db.session.add(roulette)
+            db.session.commit()
+            return roulette.id
+    return start
+
+
+@pytest.fixture
+def query_counter(app):
+    """A QueryCounter over the app's engines, active for the whole test."""
+    with app.app_context():
+        engines = list(db.engines.values())
+    with QueryCounter(engines) as counter:
+        yield counter
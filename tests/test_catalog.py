@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+
+
+def test_misses_check_the_stamp_once_per_interval(app, game_ids, query_counter):
+    catalog = app.extensions['game_catalog']
+    with app.app_context():
+        catalog.load()
+        query_counter.reset()
+        for game_id in range(900, 950):
+            assert catalog.get(game_id) is None
+        assert catalog.by_name('Blackjack') is None
+        assert query_counter.count == 0
+
+        catalog.miss_interval = 0
+        assert catalog.get(999) is None
+        assert query_counter.count == 1
+
+
+def test_miss_finds_a_new_game(app):
+    from models import Game
+
+    catalog = app.extensions['game_catalog']
+    catalog.miss_interval = 0
+    with app.app_context():
+        catalog.load()
+        game = Game(name='Dice', description='', min_bet=1, max_bet=100)
+        db.session.add(game)
+        db.session.commit()
+        assert catalog.get(game.id).name == 'Dice'
+        assert catalog.by_name('Dice').id == game.id
+
+
+@pytest.fixture
+def orphan_bets(app, users):
+    """Bets on games that are no longer in the catalog."""
+    from models import BetHistory
+
+    start = datetime(2026, 1, 1)
+    with app.app_context():
+        db.session.add_all([BetHistory(user_id=users[0], game_id=900 + i, bet_amount=1, win_amount=0,
+                                       net_result=-1, created_at=start + timedelta(seconds=i))
+                            for i in range(20)])
+        db.session.commit()
+
+
+def test_history_of_unknown_games_stays_in_budget(app, client, users, auth, orphan_bets):
+    app.extensions['game_catalog'].miss_interval = 60
+    # QUERY_BUDGETS='raise' fails the request if the catalog queries per row
+    response = client.get('/history?limit=20', headers=auth(users[0]))
+    assert response.status_code == 200
+    # Bets on unknown games are left out
+    assert response.get_json()['gameHistory'] == []
@@ -0,0 +1,53 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from event_backends import EventBroker, UnixSocketBackend
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def broker_path(tmp_path):
+    path = str(tmp_path / 'events.sock')
+    broker = EventBroker(path)
+    threading.Thread(target=broker.serve_forever, daemon=True).start()
+    wait_for(lambda: (tmp_path / 'events.sock').exists())
+    return path
+
+
+def connect(path):
+    received = []
+    backend = UnixSocketBackend(path, reconnect_delay=0.01)
+    backend.start(received.append)
+    wait_for(lambda: backend._sock is not None)
+    return backend, received
+
+
+def test_publish_reaches_every_worker(broker_path):
+    (first, first_received), (second, second_received) = connect(broker_path), connect(broker_path)
+    # Both clients must be registered with the broker before the message
+    time.sleep(0.05)
+    first.publish({'kind': 'users', 'payload': {'n': 1}})
+    wait_for(lambda: first_received and second_received)
+    assert first_received == second_received == [{'kind': 'users', 'payload': {'n': 1}}]
+
+
+def test_publish_replaces_a_dead_socket(broker_path):
+    listener, received = connect(broker_path)
+    # No reader thread, so only publish can notice the connection died
+    publisher = UnixSocketBackend(broker_path)
+    dead = publisher._connected()
+    dead.shutdown(socket.SHUT_RDWR)
+
+    publisher.publish({'kind': 'users', 'payload': {'n': 1}})
+    assert publisher._sock is not dead
+    wait_for(lambda: received)
+    assert received == [{'kind': 'users', 'payload': {'n': 1}}]
@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+
+import pytest
+
+from events import HEARTBEAT, EventHub
+
+
+def parse(payload):
+    """(event id or None, event) of one SSE payload."""
+    if isinstance(payload, bytes):
+        payload = payload.decode()
+    fields = dict(line.split(': ', 1) for line in payload.strip().split('\n'))
+    return (int(fields['id']) if 'id' in fields else None), json.loads(fields['data'])
+
+
+def drain(sub):
+    return [parse(sub.next()) for _ in range(len(sub))]
+
+
+@pytest.fixture
+def rooms(client, users, auth, game_ids):
+    """Two rooms of the same game: users[0] is in the first, users[2] in the second."""
+    first = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(users[0]))
+    second = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(users[2]))
+    return first.get_json()['room_id'], second.get_json()['room_id']
+
+
+def join_and_leave(client, user_id, headers, room_id, game_id, times):
+    for _ in range(times):
+        client.post('/rooms/join', json={'room_id': room_id}, headers=headers)
+        client.post('/games/leave', json={'game_id': game_id}, headers=headers)
+
+
+def test_room_events_reach_and_replay_to_the_same_users(app, client, users, auth, game_ids, rooms):
+    hub = app.extensions['event_hub']
+    membership = app.extensions['room_membership']
+    inside, outside = hub.subscribe(users[0]), hub.subscribe(users[2])
+    try:
+        join_and_leave(client, users[1], auth(users[1]), rooms[0], game_ids['roulette'], 1)
+        live = drain(inside)
+        assert [event['type'] for _, event in live] == ['player_joined', 'player_left']
+        # users[2] plays the same game, but in another room
+        assert drain(outside) == []
+    finally:
+        hub.unsubscribe(inside)
+        hub.unsubscribe(outside)
+
+    # Replay from just before the join: room_created events came earlier
+    since = live[0][0] - 1
+    for user_id, expected in ((users[0], live), (users[2], [])):
+        sub = hub.subscribe(user_id, since, membership.rooms_of(user_id))
+        try:
+            assert drain(sub) == expected
+        finally:
+            hub.unsubscribe(sub)
+
+
+def read_stream(client, headers, count, last_event_id):
+    response = client.get('/events/connect', headers=dict(headers, **{'Last-Event-ID': str(last_event_id)}))
+    stream = iter(response.response)
+    try:
+        connected = parse(next(stream))[1]
+        assert connected['type'] == 'connected'
+        return [parse(next(stream)) for _ in range(count)]
+    finally:
+        response.close()
+
+
+def test_reconnect_replays_missed_room_events(app, client, users, auth, game_ids, rooms):
+    hub = app.extensions['event_hub']
+    sub = hub.subscribe(users[0])
+    try:
+        join_and_leave(client, users[1], auth(users[1]), rooms[0], game_ids['roulette'], 2)
+        seen = drain(sub)
+    finally:
+        hub.unsubscribe(sub)
+    assert len(seen) == 4
+
+    # Reconnecting after the second event gets the two after it, in order
+    assert read_stream(client, auth(users[0]), 2, seen[1][0]) == seen[2:]
+
+
+@pytest.mark.parametrize('app_config', [{'SSE_REPLAY_BUFFER': 2}], indirect=True)
+def test_reconnect_after_eviction_asks_to_resync(app, client, users, auth, game_ids, rooms):
+    hub = app.extensions['event_hub']
+    sub = hub.subscribe(users[0])
+    try:
+        join_and_leave(client, users[1], auth(users[1]), rooms[0], game_ids['roulette'], 2)
+        seen = drain(sub)
+    finally:
+        hub.unsubscribe(sub)
+
+    # The second event is gone from the buffer of two
+    replayed = read_stream(client, auth(users[0]), 3, seen[0][0])
+    assert replayed[0] == (None, {'type': 'resync', 'room_id': rooms[0]})
+    assert replayed[1:] == seen[2:]
+
+
+def test_stream_gets_published_events_without_delay():
+    hub = EventHub(heartbeat_interval=60)
+    stream = hub.stream('1', {'type': 'connected'})
+    assert parse(next(stream)) == (None, {'type': 'connected'})
+    assert hub.connection_count() == 1
+
+    received = []
+    reader = threading.Thread(target=lambda: received.append((parse(next(stream)), time.monotonic())))
+    reader.start()
+    time.sleep(0.05)
+    sent = time.monotonic()
+    hub.publish(['1', '2'], {'type': 'hello'})
+    reader.join(5)
+    assert received[0][0] == (None, {'type': 'hello'})
+    assert received[0][1] - sent < 0.5
+
+    # The client went away: the server closes the generator
+    stream.close()
+    assert hub.connection_count() == 0
+
+
+def test_heartbeats_come_from_one_shared_timer():
+    hub = EventHub(heartbeat_interval=0.02)
+    subs = [hub.subscribe(user_id) for user_id in ('1', '2')]
+    for sub in subs:
+        assert sub.next() == HEARTBEAT
+    heartbeat = hub._heartbeat
+    hub.subscribe('3')
+    assert hub._heartbeat is heartbeat
+
+
+def test_a_consumer_that_falls_behind_is_disconnected():
+    hub = EventHub(heartbeat_interval=60, queue_size=2)
+    slow, fast = hub.subscribe('1'), hub.subscribe('2')
+    for i in range(3):
+        hub.publish(['1'], {'n': i})
+    assert slow.closed
+    assert hub.connection_count() == 1
+    # What was queued is still handed out, then the stream ends so the client reconnects
+    assert [parse(slow.next())[1] for _ in range(2)] == [{'n': 0}, {'n': 1}]
+    assert slow.next() is None
+    assert not fast.closed
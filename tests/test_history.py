@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from pagination import encode_cursor
+
+PAGE = 7
+
+
+@pytest.fixture
+def bets(app, users, game_ids):
+    """40 bets of the first user, many sharing a created_at; ids newest first."""
+    from models import BetHistory
+
+    start = datetime(2026, 1, 1)
+    with app.app_context():
+        rows = [BetHistory(user_id=users[0], game_id=game_ids['spin'], bet_amount=1, win_amount=0,
+                           net_result=-1, created_at=start + timedelta(seconds=i // 4)) for i in range(40)]
+        # Someone else's bets must not show up
+        rows += [BetHistory(user_id=users[1], game_id=game_ids['spin'], bet_amount=1,
+                            created_at=start + timedelta(seconds=i)) for i in range(5)]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [bet.id for bet in sorted(rows[:40], key=lambda bet: (bet.created_at, bet.id), reverse=True)]
+
+
+def test_pages_cover_every_bet_once_in_constant_queries(client, users, auth, bets, query_counter):
+    headers = auth(users[0])
+    seen, counts, cursor = [], [], None
+    while True:
+        query_counter.reset()
+        url = f'/history?limit={PAGE}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        counts.append(query_counter.count)
+        page = response.get_json()
+        seen += [bet['id'] for bet in page['gameHistory']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert seen == bets
+    assert len(counts) == -(-len(bets) // PAGE)
+    assert len(set(counts)) == 1
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor',
+    base64.urlsafe_b64encode(b'{"created_at": 1}').decode(),
+    base64.urlsafe_b64encode(json.dumps(['2026-01-01T00:00:00']).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps(['yesterday', 5]).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps(['2026-01-01T00:00:00', 'five']).encode()).decode(),
+    encode_cursor(datetime(2026, 1, 1), 5)[:-3],
+])
+def test_invalid_cursor(client, users, auth, cursor):
+    response = client.get('/history', query_string={'cursor': cursor}, headers=auth(users[0]))
+    assert response.status_code == 400
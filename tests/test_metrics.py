@@ -0,0 +1,14 @@
+def test_sse_queue_gauges(app, client, users):
+    hub = app.extensions['event_hub']
+    first, second, other = hub.subscribe(users[0]), hub.subscribe(users[0]), hub.subscribe(users[1])
+    for sub, count in ((first, 3), (second, 2), (other, 1)):
+        for i in range(count):
+            sub.push(f'event {i}')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert 'gamehub_sse_connections 3' in lines
+    assert 'gamehub_sse_queued_events 6' in lines
+    # The fullest connection, not the user with the most queued across connections
+    assert 'gamehub_sse_queue_depth_max 3' in lines
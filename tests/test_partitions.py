@@ -0,0 +1,115 @@
+import os
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import partitions
+from extensions import db
+
+# A scratch PostgreSQL database; its public schema is wiped for every test
+POSTGRES_URI = os.getenv('TEST_POSTGRES_URI')
+postgres = pytest.mark.skipif(not POSTGRES_URI, reason='needs TEST_POSTGRES_URI')
+on_postgres = pytest.mark.parametrize('app_config', [{'SQLALCHEMY_DATABASE_URI': POSTGRES_URI}], indirect=True)
+
+
+@pytest.fixture
+def app_config(app_config):
+    if app_config['SQLALCHEMY_DATABASE_URI'] == POSTGRES_URI:
+        engine = create_engine(POSTGRES_URI)
+        with engine.begin() as conn:
+            conn.execute(text('DROP SCHEMA public CASCADE'))
+            conn.execute(text('CREATE SCHEMA public'))
+        engine.dispose()
+    return app_config
+
+
+@pytest.mark.parametrize('month, count, expected', [
+    (date(2026, 1, 1), 1, date(2026, 2, 1)),
+    (date(2026, 11, 1), 2, date(2027, 1, 1)),
+    (date(2026, 1, 1), -1, date(2025, 12, 1)),
+    (date(2026, 12, 1), 13, date(2028, 1, 1)),
+])
+def test_add_months(month, count, expected):
+    assert partitions.add_months(month, count) == expected
+
+
+def test_partition_names():
+    assert partitions.month_start(datetime(2026, 3, 31, 23, 59)) == date(2026, 3, 1)
+    assert partitions.partition_name(date(2026, 3, 1)) == 'bet_history_y2026m03'
+    assert partitions.PARTITION_NAME.match(partitions.partition_name(date(2026, 3, 1)))
+
+
+@pytest.mark.parametrize('command', [['partition-bet-history'], ['create-partitions'], ['check-partitions']])
+def test_commands_refuse_sqlite(app, command):
+    result = app.test_cli_runner().invoke(args=command)
+    assert result.exit_code != 0
+    assert 'needs PostgreSQL' in result.output
+
+
+def months_back(count):
+    return datetime.combine(partitions.add_months(partitions.month_start(datetime.utcnow()), -count),
+                            datetime.min.time())
+
+
+@postgres
+@on_postgres
+def test_conversion_keeps_every_bet_and_prunes(app, client, users, auth, game_ids):
+    from models import BetHistory
+
+    with app.app_context():
+        # Enough bets over three months that the planner reads partitions by index
+        db.session.execute(db.insert(BetHistory).from_select(
+            ['user_id', 'game_id', 'bet_amount', 'win_amount', 'net_result', 'created_at'],
+            db.select(db.literal(users[1]), db.literal(game_ids['spin']), db.literal(1.0), db.literal(0.0),
+                      db.literal(-1.0), db.literal(months_back(2)) + db.func.make_interval(
+                          0, 0, 0, 0, 0, 0, db.text('n * 100')))
+            .select_from(db.func.generate_series(1, 60000).table_valued('n').render_derived())))
+        db.session.add_all([BetHistory(user_id=users[i % 3], game_id=game_ids['spin'], bet_amount=1 + i,
+                                       win_amount=0, net_result=-1 - i, created_at=months_back(i % 3))
+                            for i in range(30)])
+        db.session.commit()
+        before = [(bet.id, bet.created_at) for bet in BetHistory.query.order_by(BetHistory.id)]
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['partition-bet-history', '--batch-size', '5000', '--months-ahead', '2'])
+    assert result.exit_code == 0, result.output
+
+    with app.app_context():
+        assert partitions.is_partitioned()
+        assert [name for name, _, _ in partitions.partitions()] == [
+            partitions.partition_name(partitions.month_start(months_back(i))) for i in range(2, -3, -1)]
+        assert [(bet.id, bet.created_at) for bet in BetHistory.query.order_by(BetHistory.id)] == before
+        db.session.commit()
+
+    # The app keeps writing to, and reading from, the partitioned table
+    response = client.post('/games/spin-and-win/play', json={'bet_amount': 10}, headers=auth(users[0]))
+    assert response.status_code == 200
+    assert len(client.get('/history?limit=100', headers=auth(users[0])).get_json()['gameHistory']) == 11
+    with app.app_context():
+        db.session.execute(text('ANALYZE bet_history'))
+        db.session.commit()
+
+    result = runner.invoke(args=['create-partitions', '--months-ahead', '4'])
+    assert result.exit_code == 0, result.output
+    assert result.output.count('Created') == 2
+    result = runner.invoke(args=['check-partitions', '--user-id', str(users[1])])
+    assert result.exit_code == 0, result.output
+
+    result = runner.invoke(args=['partition-bet-history'])
+    assert result.exit_code != 0
+    assert 'already partitioned' in result.output
+
+
+@postgres
+@on_postgres
+def test_check_fails_without_partitions_ahead(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['check-partitions'])
+    assert result.exit_code == 1
+    assert 'not partitioned' in result.output
+
+    assert runner.invoke(args=['partition-bet-history', '--months-ahead', '0']).exit_code == 0
+    result = runner.invoke(args=['check-partitions', '--months-ahead', '1'])
+    assert result.exit_code == 1
+    assert 'create-partitions' in result.output
@@ -0,0 +1,23 @@
+import pytest
+
+from passwords import PasswordHasher
+
+
+@pytest.mark.parametrize('app_config', [{'PASSWORD_HASH_WORKERS': 2}], indirect=True)
+def test_pool_is_forked_on_first_hash(app):
+    hasher = app.extensions['password_hasher']
+    assert hasher._pool is None
+    try:
+        pw_hash = hasher.hash('secret')
+        assert hasher._pool is not None
+        assert hasher.check(pw_hash, 'secret')
+        assert not hasher.check(pw_hash, 'wrong')
+    finally:
+        hasher.shutdown()
+
+
+def test_needs_rehash():
+    hasher = PasswordHasher(rounds=4, workers=0)
+    assert not hasher.needs_rehash(hasher.hash('secret'))
+    assert hasher.needs_rehash(PasswordHasher(rounds=5, workers=0).hash('secret'))
+    assert not hasher.check('not a bcrypt hash', 'secret')
@@ -0,0 +1,86 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+import wheel
+
+SKEWED = [(0.0, 0.5), (1.5, 0.3), (3.0, 0.15), (10.0, 0.049), (100.0, 0.001)]
+
+
+@pytest.mark.parametrize('segments, message', [
+    ([], 'no segments'),
+    ([(1.0, -0.5), (1.0, 1.5)], 'probability must be a finite number >= 0'),
+    ([(-1.0, 1.0)], 'multiplier must be a finite number >= 0'),
+    ([(0.0, 1.0), (5.0, 0.0)], 'probability > 0'),
+    ([(0.0, 0.0), (5.0, 0.0)], 'probability > 0'),
+    ([(0.0, 0.5), (5.0, 0.4)], 'sum to'),
+    ([(0.0, float('nan')), (5.0, 1.0)], 'finite'),
+    ([(0.0, True)], 'finite'),
+])
+def test_invalid_paytables_are_rejected(segments, message):
+    with pytest.raises(wheel.InvalidPaytable, match=message):
+        wheel.Paytable(segments)
+
+
+@pytest.mark.parametrize('data', [{'multiplier': 1, 'probability': 1}, [{'multiplier': 1}], [[1, 1]]])
+def test_invalid_json_is_rejected(data):
+    with pytest.raises(wheel.InvalidPaytable):
+        wheel.Paytable.from_json(data)
+
+
+@pytest.mark.parametrize('segments', [wheel.SEGMENTS, SKEWED, [(2.0, 1.0)], [(1.0, 0.25)] * 4])
+def test_alias_tables_give_each_segment_its_probability(segments):
+    paytable = wheel.Paytable(segments)
+    n = len(segments)
+    # Column i is picked with 1/n, then keeps i with prob[i] or hands over to alias[i]
+    implied = [paytable._prob[i] / n for i in range(n)]
+    for i in range(n):
+        implied[paytable._alias[i]] += (1.0 - paytable._prob[i]) / n
+    assert implied == pytest.approx([p for _, p in segments], abs=1e-12)
+    assert paytable.rtp == pytest.approx(sum(m * p for m, p in segments))
+
+
+def test_spins_follow_the_paytable():
+    paytable = wheel.Paytable(SKEWED)
+    count = 200_000
+    rng = random.Random(1)
+    singles = np.array([paytable.spin(rng) for _ in range(count)])
+    batch = paytable.draw(count, np.random.default_rng(1))
+    for draws in (singles, batch):
+        for multiplier, probability in SKEWED:
+            observed = np.count_nonzero(draws == multiplier) / count
+            # Five standard errors of a binomial proportion
+            assert abs(observed - probability) < 5 * (probability * (1 - probability) / count) ** 0.5
+        assert draws.mean() == pytest.approx(paytable.rtp, rel=0.05)
+
+
+def test_paytable_route(app, client, users, auth, game_ids):
+    response = client.get(f"/games/{game_ids['spin']}/paytable", headers=auth(users[0]))
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['segments'] == wheel.DEFAULT_PAYTABLE.to_json()
+    assert body['rtp'] == pytest.approx(wheel.DEFAULT_PAYTABLE.rtp)
+
+    segments = [{'multiplier': m, 'probability': p} for m, p in SKEWED]
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['set-paytable', 'Spin and Win', '-'], input=json.dumps(segments))
+    assert result.exit_code == 0, result.output
+    response = client.get(f"/games/{game_ids['spin']}/paytable", headers=auth(users[0]))
+    assert response.get_json()['segments'] == segments
+
+    assert client.get('/games/999/paytable', headers=auth(users[0])).status_code == 404
+
+
+def test_set_paytable_rejects_invalid_files(app):
+    runner = app.test_cli_runner()
+    segments = [{'multiplier': 0, 'probability': 1}, {'multiplier': 5, 'probability': 0}]
+    result = runner.invoke(args=['set-paytable', 'Spin and Win', '-'], input=json.dumps(segments))
+    assert result.exit_code != 0
+    assert 'Invalid paytable' in result.output
+    result = runner.invoke(args=['set-paytable', 'Spin and Win', '-'], input='not json')
+    assert 'Invalid paytable' in result.output
+    with app.app_context():
+        from models import Game
+        assert Game.query.filter_by(name='Spin and Win').one().paytable is None
@@ -0,0 +1,34 @@
+import pytest
+
+from extensions import db
+
+
+def test_play_batch_settles_every_spin(app, client, users, auth):
+    from models import BetHistory, User
+
+    response = client.post('/games/spin-and-win/play-batch', json={'bet_amount': 2, 'spins': 20},
+                           headers=auth(users[0]))
+    assert response.status_code == 200
+    with app.app_context():
+        bets = BetHistory.query.filter_by(user_id=users[0]).all()
+        assert len(bets) == 20
+        assert db.session.get(User, users[0]).balance == pytest.approx(
+            1000 + sum(bet.net_result for bet in bets))
+
+
+@pytest.mark.parametrize('payload', [
+    {'bet_amount': 1, 'spins': True},
+    {'bet_amount': 1, 'spins': 0},
+    {'bet_amount': 1, 'spins': 10_000},
+    {'bet_amount': 1, 'spins': 2.5},
+    {'bet_amount': True, 'spins': 5},
+    {'bet_amount': 0, 'spins': 5},
+    {'bet_amount': '1', 'spins': 5},
+])
+def test_play_batch_rejects_invalid_input(app, client, users, auth, payload):
+    from models import BetHistory
+
+    response = client.post('/games/spin-and-win/play-batch', json=payload, headers=auth(users[0]))
+    assert response.status_code == 400
+    with app.app_context():
+        assert BetHistory.query.count() == 0
@@ -0,0 +1,78 @@
+
+import pytest
+from sqlalchemy import exc as sa_exc
+
+from dbpool import InstrumentedQueuePool, engine_options
+from extensions import db
+
+POOL = {'DB_POOL_SIZE': 3, 'DB_MAX_OVERFLOW': 2, 'DB_POOL_TIMEOUT': 10.0, 'DB_POOL_RECYCLE': 1800,
+        'DB_POOL_PRE_PING': True, 'DB_STATEMENT_TIMEOUT': 5000, 'DB_PGBOUNCER': False}
+
+
+def test_engine_options_for_postgres():
+    options = engine_options(dict(POOL, SQLALCHEMY_DATABASE_URI='postgresql://u@db/gamehub'))
+    assert options == {
+        'poolclass': InstrumentedQueuePool, 'pool_size': 3, 'max_overflow': 2, 'pool_timeout': 10.0,
+        'pool_recycle': 1800, 'pool_pre_ping': True,
+        'connect_args': {'options': '-c statement_timeout=5000'},
+    }
+
+
+def test_pgbouncer_sends_no_startup_options():
+    options = engine_options(dict(POOL, SQLALCHEMY_DATABASE_URI='postgresql://u@pgbouncer/gamehub',
+                                  DB_PGBOUNCER=True))
+    assert 'connect_args' not in options
+    assert options['pool_size'] == 3
+
+
+def test_in_memory_sqlite_keeps_the_default_pool():
+    assert engine_options(dict(POOL, SQLALCHEMY_DATABASE_URI='sqlite://')) == {}
+
+
+@pytest.fixture
+def app_config(app_config):
+    return dict(app_config, DB_POOL_SIZE=1, DB_MAX_OVERFLOW=0, DB_POOL_TIMEOUT=0.05)
+
+
+def test_pool_stats_count_checkouts_and_timeouts(app, client):
+    with app.app_context():
+        engine = db.engine
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+
+    with engine.connect():
+        stats = client.get('/internal/pool').get_json()['default']
+        assert (stats['size'], stats['checked_out'], stats['overflow']) == (1, 1, 0)
+        # The only connection is taken
+        with pytest.raises(sa_exc.TimeoutError):
+            engine.connect()
+
+    stats = client.get('/internal/pool').get_json()['default']
+    assert stats['checked_out'] == 0
+    assert stats['wait_seconds']['timeouts'] == 1
+    assert stats['wait_seconds']['count'] >= 2
+
+
+def test_open_event_stream_holds_no_connection(app, client, users, auth):
+    with app.app_context():
+        engine = db.engine
+    response = client.get('/events/connect', headers=auth(users[0]))
+    stream = iter(response.response)
+    next(stream)
+    try:
+        assert engine.pool.checkedout() == 0
+        # With pool_size 1, another request still gets the connection
+        assert client.get('/profile', headers=auth(users[0])).status_code == 200
+    finally:
+        response.close()
+
+
+@pytest.mark.parametrize('app_config', [{'INTERNAL_TOKEN': 's3cret'}], indirect=True)
+def test_internal_token(client):
+    assert client.get('/internal/pool').status_code == 403
+    assert client.get('/internal/pool', headers={'X-Internal-Token': 'wrong'}).status_code == 403
+    assert client.get('/internal/pool', headers={'X-Internal-Token': 's3cret'}).status_code == 200
+
+
+def test_internal_endpoints_refuse_remote_clients(client):
+    response = client.get('/internal/pool', environ_overrides={'REMOTE_ADDR': '203.0.113.9'})
+    assert response.status_code == 403
@@ -0,0 +1,59 @@
+import pytest
+
+import wallet
+from extensions import db
+
+pytestmark = pytest.mark.parametrize('app_config', [{'PROFILE_CACHE_TTL': 60}], indirect=True)
+
+
+def balance(client, headers):
+    return client.get('/profile', headers=headers).get_json()['balance']
+
+
+@pytest.mark.parametrize('url, payload, delta', [
+    ('/deposit', {'amount': 50}, 50),
+    ('/withdraw', {'amount': 30}, -30),
+    ('/games/spin-and-win/play', {'bet_amount': 10}, None),
+])
+def test_balance_changes_refresh_the_profile(app, client, users, auth, url, payload, delta):
+    headers = auth(users[0])
+    assert balance(client, headers) == 1000
+    cache = app.extensions['profile_cache']
+    hits = cache.hits
+    assert balance(client, headers) == 1000
+    assert cache.hits > hits
+
+    body = client.post(url, json=payload, headers=headers).get_json()
+    if delta is None:
+        delta = body['win_amount'] - payload['bet_amount']
+    assert balance(client, headers) == pytest.approx(1000 + delta)
+
+
+def test_a_settled_round_refreshes_every_winner(client, users, auth, game_ids, start_round):
+    room = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(users[0]))
+    roulette_id = start_round(room.get_json()['room_id'], users[:2], bullet_position=1)
+    for user_id in users[:2]:
+        client.post('/games/place-bet', headers=auth(user_id), json={
+            'roulette_id': roulette_id, 'bet_amount': 100, 'bet_type': 'elimination'})
+        assert balance(client, auth(user_id)) == 900
+
+    # The first pull fires: elimination bets pay out
+    result = client.post('/games/pull-trigger', json={'roulette_id': roulette_id}, headers=auth(users[0]))
+    assert result.get_json()['game_over']
+    for user_id in users[:2]:
+        assert balance(client, auth(user_id)) == 1100
+
+
+def test_a_rolled_back_change_keeps_the_profile(app, client, users, auth):
+    headers = auth(users[0])
+    assert balance(client, headers) == 1000
+    cache = app.extensions['profile_cache']
+    with app.app_context():
+        wallet.adjust_balance(users[0], 500)
+        db.session.rollback()
+        # Nothing left over for the next commit to drop either
+        db.session.commit()
+    assert len(cache) == 1
+    hits = cache.hits
+    assert balance(client, headers) == 1000
+    assert cache.hits == hits + 1
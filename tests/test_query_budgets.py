@@ -0,0 +1,83 @@
+"""Routes run within their @query_budget; the app fixture sets QUERY_BUDGETS=raise,
+so a request over its budget or repeating a statement fails the test."""
+import pytest
+
+from querybudget import QueryBudgetExceeded, QueryCounter, query_budget
+
+
+def test_history_and_stats(client, users, auth):
+    headers = auth(users[0])
+    client.post('/games/spin-and-win/play', json={'bet_amount': 1}, headers=headers)
+    assert client.get('/history', headers=headers).status_code == 200
+    assert client.get('/stats', headers=headers).status_code == 200
+
+
+def test_play_batch(client, users, auth):
+    response = client.post('/games/spin-and-win/play-batch', json={'bet_amount': 1, 'spins': 50},
+                           headers=auth(users[0]))
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('app_config', [{'ROOM_WRITE_BEHIND': False}, {'ROOM_WRITE_BEHIND': True}],
+                         ids=['write-through', 'write-behind'], indirect=True)
+def test_room_routes_and_pull_trigger(client, users, auth, game_ids, start_round):
+    creator, *others = users
+    response = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(creator))
+    assert response.status_code == 200
+    room_id = response.get_json()['room_id']
+    for user_id in others:
+        assert client.post('/rooms/join', json={'room_id': room_id}, headers=auth(user_id)).status_code == 200
+
+    roulette_id = start_round(room_id, users, bullet_position=3)
+    for i, user_id in enumerate(users):
+        response = client.post('/games/place-bet', headers=auth(user_id), json={
+            'roulette_id': roulette_id, 'bet_amount': 5, 'bet_type': ('survival', 'elimination')[i % 2]})
+        assert response.status_code == 200
+
+    results = [client.post('/games/pull-trigger', json={'roulette_id': roulette_id}, headers=auth(creator))
+               for _ in range(3)]
+    assert [r.status_code for r in results] == [200, 200, 200]
+    assert results[-1].get_json()['game_over']
+
+    response = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(others[1]))
+    client.post('/rooms/join', json={'room_id': response.get_json()['room_id']}, headers=auth(others[0]))
+    response = client.post('/games/leave', json={'game_id': game_ids['roulette']}, headers=auth(others[0]))
+    assert response.status_code == 200
+
+
+def test_query_in_a_loop_raises(app, client, users):
+    from models import User
+
+    @app.route('/test/n-plus-one')
+    @query_budget(10)
+    def n_plus_one():
+        # One query per user, as a loop over ids would do
+        return {'names': [User.query.filter_by(id=user_id).one().username for user_id in users + users[:1]]}
+
+    with pytest.raises(QueryBudgetExceeded, match='ran 4 times'):
+        client.get('/test/n-plus-one')
+
+
+def test_over_budget_raises(app, client, users):
+    from models import User
+
+    @app.route('/test/over-budget')
+    @query_budget(1)
+    def over_budget():
+        return {'users': User.query.count(), 'first': User.query.first().id}
+
+    with pytest.raises(QueryBudgetExceeded, match='2 statements, budget is 1'):
+        client.get('/test/over-budget')
+
+
+def test_query_counter_check(app, users):
+    from models import User
+
+    with app.app_context():
+        with QueryCounter() as queries:
+            for user_id in users + users[:1]:
+                User.query.filter_by(id=user_id).one()
+        assert queries.count == 4
+        assert list(queries.repeated().values()) == [4]
+        with pytest.raises(QueryBudgetExceeded):
+            queries.check(budget=10)
@@ -0,0 +1,70 @@
+import shutil
+import time
+
+import pytest
+
+from extensions import db
+
+
+@pytest.fixture
+def app_config(app_config, tmp_path):
+    # An indirect parameter still wins
+    return dict({'REPLICA_DATABASE_URI': f"sqlite:///{tmp_path}/replica.db", 'REPLICA_READ_YOUR_WRITES': 0.2},
+                **app_config)
+
+
+@pytest.fixture
+def replica(app, tmp_path):
+    """Make the replica a copy of the primary as it is now; later writes to
+    the primary are not replayed, so a read shows which one served it."""
+    with app.app_context():
+        db.engines['replica'].dispose()
+    shutil.copy(tmp_path / 'test.db', tmp_path / 'replica.db')
+
+
+def add_bet(app, user_id, game_id):
+    """A bet written straight to the primary, outside any request."""
+    from models import BetHistory
+
+    with app.app_context():
+        db.session.add(BetHistory(user_id=user_id, game_id=game_id, bet_amount=5, win_amount=0, net_result=-5))
+        db.session.commit()
+
+
+def history(client, headers):
+    return client.get('/history', headers=headers).get_json()['gameHistory']
+
+
+def test_reads_go_to_the_replica(app, client, users, auth, game_ids, replica):
+    add_bet(app, users[1], game_ids['spin'])
+    assert history(client, auth(users[1])) == []
+    assert client.get('/stats', headers=auth(users[1])).get_json()['overall']['total_bets'] == 0
+    assert len(client.get('/users', headers=auth(users[1])).get_json()) == len(users)
+
+
+def test_own_writes_are_read_from_the_primary(app, client, users, auth, game_ids, replica):
+    response = client.post('/games/spin-and-win/play', json={'bet_amount': 10}, headers=auth(users[0]))
+    assert response.status_code == 200
+    add_bet(app, users[1], game_ids['spin'])
+
+    # users[0] just wrote: the replica might not have their bet yet
+    assert len(history(client, auth(users[0]))) == 1
+    assert history(client, auth(users[1])) == []
+
+    time.sleep(0.25)
+    assert history(client, auth(users[0])) == []
+
+
+def test_a_failed_write_keeps_the_replica(app, client, users, auth, replica):
+    # Rejected before anything is committed
+    response = client.post('/withdraw', json={'amount': 10**6}, headers=auth(users[0]))
+    assert response.status_code == 400
+    assert not app.extensions['replica_guard'].recently_wrote(users[0])
+
+
+@pytest.mark.parametrize('app_config', [{'REPLICA_DATABASE_URI': None}], indirect=True)
+def test_without_a_replica_reads_use_the_primary(app, client, users, auth, game_ids):
+    with app.app_context():
+        assert 'replica' not in db.engines
+    add_bet(app, users[1], game_ids['spin'])
+    assert len(history(client, auth(users[1]))) == 1
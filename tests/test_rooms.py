@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+
+
+@pytest.fixture
+def room(client, users, auth, game_ids):
+    response = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(users[0]))
+    return response.get_json()['room_id']
+
+
+def test_join_twice_is_a_conflict(client, users, auth, room):
+    assert client.post('/rooms/join', json={'room_id': room}, headers=auth(users[1])).status_code == 200
+    response = client.post('/rooms/join', json={'room_id': room}, headers=auth(users[1]))
+    assert response.status_code == 409
+
+
+# The competing join's statements run inside this request and would count against its budget
+@pytest.mark.parametrize('app_config', [{'QUERY_BUDGETS': None}], indirect=True)
+def test_racing_joins_take_one_seat(app, client, users, auth, room):
+    """A second join by the same user lands between this join's check and
+    its insert; the unique index turns this one into a 409."""
+    from models import Multiplayer, RoomSession
+
+    with app.app_context():
+        engine = db.engine
+        seats = Multiplayer.query.filter_by(session_id=room).one().current_players
+
+    raced = []
+
+    def race(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE multiplayer') and not raced:
+            raced.append(statement)
+            with engine.begin() as other:
+                other.execute(db.update(Multiplayer).where(Multiplayer.session_id == room)
+                              .values(current_players=Multiplayer.current_players + 1))
+                other.execute(db.insert(RoomSession).values(room_id=room, user_id=users[1], status='active'))
+
+    event.listen(engine, 'before_cursor_execute', race)
+    try:
+        response = client.post('/rooms/join', json={'room_id': room}, headers=auth(users[1]))
+    finally:
+        event.remove(engine, 'before_cursor_execute', race)
+    assert response.status_code == 409
+
+    with app.app_context():
+        assert RoomSession.query.filter_by(room_id=room, user_id=users[1], status='active').count() == 1
+        assert Multiplayer.query.filter_by(session_id=room).one().current_players == seats + 1
+
+
+def test_leaving_gives_the_seat_back(app, client, users, auth, game_ids, room):
+    from models import Multiplayer, Room
+
+    # More join/leave cycles than the room has seats
+    for _ in range(8):
+        assert client.post('/rooms/join', json={'room_id': room}, headers=auth(users[1])).status_code == 200
+        response = client.post('/games/leave', json={'game_id': game_ids['roulette']}, headers=auth(users[1]))
+        assert response.status_code == 200
+    assert client.post('/rooms/join', json={'room_id': room}, headers=auth(users[2])).status_code == 200
+    with app.app_context():
+        multiplayer = Multiplayer.query.filter_by(session_id=room).one()
+        assert (multiplayer.current_players, multiplayer.status) == (2, 'waiting')
+
+    for user_id in (users[2], users[0]):
+        client.post('/games/leave', json={'game_id': game_ids['roulette']}, headers=auth(user_id))
+    with app.app_context():
+        multiplayer = Multiplayer.query.filter_by(session_id=room).one()
+        assert (multiplayer.current_players, multiplayer.status) == (0, 'abandoned')
+        assert db.session.get(Room, room).status == 'abandoned'
+
+
+@pytest.mark.parametrize('app_config', [{'ROOM_WRITE_BEHIND': False}, {'ROOM_WRITE_BEHIND': True}],
+                         indirect=True, ids=['write-through', 'write-behind'])
+def test_no_bets_once_every_player_left(client, users, auth, game_ids, room, start_round):
+    client.post('/rooms/join', json={'room_id': room}, headers=auth(users[1]))
+    roulette_id = start_round(room, users[:2])
+    bet = {'roulette_id': roulette_id, 'bet_amount': 10, 'bet_type': 'survival'}
+    # Loads the round into the room engine
+    assert client.post('/games/place-bet', json=bet, headers=auth(users[0])).status_code == 200
+
+    client.post('/games/leave', json={'game_id': game_ids['roulette']}, headers=auth(users[1]))
+    assert client.post('/games/place-bet', json=bet, headers=auth(users[0])).status_code == 200
+
+    client.post('/games/leave', json={'game_id': game_ids['roulette']}, headers=auth(users[0]))
+    response = client.post('/games/place-bet', json=bet, headers=auth(users[0]))
+    assert response.status_code == 404
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import roulette_rules
+import simulate
+import wheel
+
+
+def play_round(bullet_position, bet_type):
+    """One round the way pull_trigger plays it, one pull per request."""
+    position = 1
+    while True:
+        is_hit, game_over = roulette_rules.trigger(position, bullet_position)
+        position += 1
+        if game_over:
+            return roulette_rules.payout(bet_type, 1.0, is_hit)
+
+
+@pytest.mark.parametrize('bet_type', roulette_rules.BET_TYPES)
+def test_roulette_batches_play_like_the_route(bet_type):
+    count = 1000
+    bullets = np.random.default_rng(3).integers(1, roulette_rules.CHAMBERS + 1, size=count)
+    multipliers = simulate.roulette_multipliers(bet_type, count, np.random.default_rng(3))
+    assert multipliers.tolist() == [play_round(int(bullet), bet_type) for bullet in bullets]
+
+
+def test_spin_estimate_matches_the_paytable():
+    paytable = wheel.DEFAULT_PAYTABLE
+    result = simulate.estimate(simulate.spin_sampler(paytable), 400_000, batch_size=50_000, seed=5)
+    expected_variance = sum(m * m * p for m, p in paytable.segments) - paytable.rtp ** 2
+
+    assert result['rounds'] == 400_000
+    assert abs(result['rtp'] - paytable.rtp) < 5 * result['rtp_std_error']
+    assert result['house_edge'] == pytest.approx(1 - result['rtp'])
+    assert result['variance'] == pytest.approx(expected_variance, rel=0.05)
+    assert result['hit_frequency'] == pytest.approx(1 - dict(wheel.SEGMENTS)[0.0], abs=0.005)
+
+
+def test_workers_split_the_rounds():
+    sampler = simulate.spin_sampler(wheel.DEFAULT_PAYTABLE)
+    result = simulate.estimate(sampler, 100_001, batch_size=10_000, workers=2, seed=5)
+    assert result['rounds'] == 100_001
+    assert abs(result['rtp'] - wheel.DEFAULT_PAYTABLE.rtp) < 5 * result['rtp_std_error']
+
+
+def always(multiplier):
+    return lambda count, rng: np.full(count, multiplier)
+
+
+def test_risk_of_ruin():
+    # Losing every bet ruins a bankroll of 5 stakes at the fifth round
+    curve = simulate.risk_of_ruin(always(0.0), bankroll=5, paths=10, horizon=100, checkpoints=20)
+    assert curve == [(t, float(t >= 5)) for t, _ in curve]
+    assert simulate.risk_of_ruin(always(1.0), bankroll=5, paths=10, horizon=100)[-1] == (100, 0.0)
+    # Nobody can place the first bet
+    assert all(p == 1.0 for _, p in simulate.risk_of_ruin(always(1.0), bankroll=0.5, paths=10, horizon=10))
+
+
+def test_simulate_command(app):
+    result = app.test_cli_runner().invoke(args=[
+        'simulate', 'spin-and-win', '--rounds', '10000', '--paths', '10', '--horizon', '10', '--seed', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'RTP:' in result.output and 'risk of ruin' in result.output
+
+    result = app.test_cli_runner().invoke(args=['simulate', 'spin-and-win', '--game', 'Blackjack'])
+    assert result.exit_code != 0
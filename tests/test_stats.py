@@ -0,0 +1,100 @@
+import pytest
+
+from app import create_app
+from extensions import db
+
+
+@pytest.fixture
+def played(app, client, users, auth, game_ids, start_round):
+    """Spins, a batch and a settled roulette round, all through the routes."""
+    for user_id in users:
+        client.post('/games/spin-and-win/play', json={'bet_amount': 10}, headers=auth(user_id))
+    client.post('/games/spin-and-win/play-batch', json={'bet_amount': 2, 'spins': 20}, headers=auth(users[0]))
+
+    response = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(users[0]))
+    room_id = response.get_json()['room_id']
+    for user_id in users[1:]:
+        client.post('/rooms/join', json={'room_id': room_id}, headers=auth(user_id))
+    roulette_id = start_round(room_id, users, bullet_position=2)
+    for i, user_id in enumerate(users):
+        response = client.post('/games/place-bet', headers=auth(user_id), json={
+            'roulette_id': roulette_id, 'bet_amount': 5 + i, 'bet_type': ('survival', 'elimination')[i % 2]})
+        assert response.status_code == 200
+    while not client.post('/games/pull-trigger', json={'roulette_id': roulette_id},
+                          headers=auth(users[0])).get_json().get('game_over'):
+        pass
+
+
+def test_rollup_matches_bet_history(app, client, users, auth, played):
+    from stats import aggregate_stats, check_user_game_stats
+
+    with app.app_context():
+        assert check_user_game_stats() == []
+        for user_id in users:
+            got = client.get('/stats', headers=auth(user_id)).get_json()
+            expected = aggregate_stats(user_id)
+            assert got['overall'] == pytest.approx(expected['overall'])
+            assert [game.pop('game') for game in got['by_game']] == [game.pop('game') for game in expected['by_game']]
+            assert got['by_game'] == [pytest.approx(game) for game in expected['by_game']]
+
+
+def per_row_stats(user_id):
+    """/stats the way it was computed before: every bet loaded and summed per game."""
+    from models import BetHistory, Game
+
+    bets = BetHistory.query.filter_by(user_id=user_id).all()
+    by_game = []
+    for game in Game.query.order_by(Game.id).all():
+        game_bets = [bet for bet in bets if bet.game_id == game.id]
+        if game_bets:
+            wagered, won = sum(bet.bet_amount for bet in game_bets), sum(bet.win_amount for bet in game_bets)
+            by_game.append({'game': game.name, 'total_bets': len(game_bets), 'total_wagered': wagered,
+                            'total_won': won, 'net_profit': won - wagered})
+    wagered, won = sum(bet.bet_amount for bet in bets), sum(bet.win_amount for bet in bets)
+    return {'overall': {'total_bets': len(bets), 'total_wagered': wagered, 'total_won': won,
+                        'net_profit': won - wagered},
+            'by_game': by_game}
+
+
+def test_stats_match_summing_every_bet(app, client, users, auth, game_ids, start_round, played):
+    # A bet of a round still running counts as wagered, not yet won or lost
+    response = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(users[2]))
+    roulette_id = start_round(response.get_json()['room_id'], users[2:])
+    client.post('/games/place-bet', headers=auth(users[2]), json={
+        'roulette_id': roulette_id, 'bet_amount': 40, 'bet_type': 'survival'})
+
+    with app.app_context():
+        for user_id in users:
+            got = client.get('/stats', headers=auth(user_id)).get_json()
+            expected = per_row_stats(user_id)
+            assert got['overall'] == pytest.approx(expected['overall'])
+            assert [game.pop('game') for game in got['by_game']] == [game.pop('game') for game in expected['by_game']]
+            assert got['by_game'] == [pytest.approx(game) for game in expected['by_game']]
+
+
+def test_stats_without_bets(client, users, auth):
+    assert client.get('/stats', headers=auth(users[0])).get_json() == {
+        'overall': {'total_bets': 0, 'total_wagered': 0, 'total_won': 0, 'net_profit': 0},
+        'by_game': [],
+    }
+
+
+@pytest.mark.parametrize('column', ['bet_count', 'total_wagered', 'total_won', 'net_profit'])
+def test_check_finds_drift_and_rebuild_repairs_it(app, users, played, column):
+    from models import UserGameStats
+    from stats import check_user_game_stats, rebuild_user_game_stats
+
+    with app.app_context():
+        UserGameStats.query.filter_by(user_id=users[1]).update(
+            {column: getattr(UserGameStats, column) + 1}, synchronize_session=False)
+        db.session.commit()
+        mismatches = check_user_game_stats()
+        assert mismatches and {user_id for user_id, *_ in mismatches} == {users[1]}
+
+        rebuild_user_game_stats(echo=lambda line: None)
+        assert check_user_game_stats() == []
+
+
+def test_unsupported_database_is_refused():
+    with pytest.raises(ValueError, match="Unsupported database 'mysql'"):
+        create_app({'SQLALCHEMY_DATABASE_URI': 'mysql://user@localhost/gamehub'})
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+
+import pytest
+
+from extensions import db
+
+USERS = 50
+
+
+@pytest.fixture
+def app_config(app_config):
+    return dict(app_config, USERS_MAX_PAGE_SIZE=20, USERS_EXPORT_BATCH_SIZE=7)
+
+
+@pytest.fixture
+def everyone(app, users):
+    """Ids of USERS users, in id order."""
+    from models import User
+
+    with app.app_context():
+        db.session.add_all([User(username=f'extra{i}', email=f'extra{i}@example.com', password='x', balance=i)
+                            for i in range(USERS - len(users))])
+        db.session.commit()
+        return [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+
+
+def test_pages_cover_every_user_once(client, users, auth, everyone):
+    seen = []
+    url = '/users?limit=8'
+    while url:
+        response = client.get(url, headers=auth(users[0]))
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= 8
+        seen += [user['id'] for user in page]
+        url = response.headers.get('Link', '').partition('>')[0].lstrip('<') or None
+        if url:
+            assert url.endswith(response.headers['X-Next-Cursor'])
+    assert seen == everyone
+
+
+def test_page_size_is_capped(client, users, auth, everyone):
+    assert len(client.get('/users?limit=1000', headers=auth(users[0])).get_json()) == 20
+
+
+def test_invalid_cursor(client, users, auth):
+    response = client.get('/users?cursor=nonsense', headers=auth(users[0]))
+    assert response.status_code == 400
+
+
+def export(client, headers, export_format):
+    response = client.get(f'/users/export?format={export_format}', headers=headers)
+    assert response.status_code == 200
+    chunks = [chunk.decode() for chunk in response.response]
+    response.close()
+    return response, chunks
+
+
+def test_ndjson_export_streams_every_user(client, users, auth, everyone):
+    response, chunks = export(client, auth(users[0]), 'ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    # One chunk per batch of 7 rows, written as the cursor yields them
+    assert len(chunks) == -(-USERS // 7)
+    rows = [json.loads(line) for line in ''.join(chunks).splitlines()]
+    assert [row['id'] for row in rows] == everyone
+    listed = client.get('/users?limit=20', headers=auth(users[0])).get_json()
+    assert rows[:20] == listed
+
+
+def test_csv_export(client, users, auth, everyone):
+    response, chunks = export(client, auth(users[0]), 'csv')
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=users.csv'
+    rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+    assert [int(row['id']) for row in rows] == everyone
+    assert set(rows[0]) == {'id', 'username', 'email', 'balance', 'created_at'}
+
+
+def test_unknown_export_format(client, users, auth):
+    assert client.get('/users/export?format=xml', headers=auth(users[0])).status_code == 400
@@ -0,0 +1,90 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from extensions import db
+
+START = 1000.0
+REQUESTS = 200
+
+
+@pytest.fixture
+def app_config(app_config):
+    # Writers queue on SQLite's file lock instead of failing with "database is locked"
+    return dict(app_config, SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}})
+
+
+def test_concurrent_balance_changes_add_up(app, client, users, auth, game_ids, start_round):
+    response = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(users[0]))
+    room_id = response.get_json()['room_id']
+    for user_id in users[1:]:
+        client.post('/rooms/join', json={'room_id': room_id}, headers=auth(user_id))
+    roulette_id = start_round(room_id, users)
+
+    headers = {user_id: auth(user_id) for user_id in users}
+    rng = random.Random(7)
+    calls = []
+    for _ in range(REQUESTS):
+        user_id = rng.choice(users)
+        kind = rng.choice(['deposit', 'withdraw', 'spin', 'bet'])
+        amount = rng.randint(1, 400)
+        if kind == 'deposit':
+            calls.append((user_id, '/deposit', {'amount': amount}, amount))
+        elif kind == 'withdraw':
+            calls.append((user_id, '/withdraw', {'amount': amount}, -amount))
+        elif kind == 'spin':
+            calls.append((user_id, '/games/spin-and-win/play', {'bet_amount': amount}, None))
+        else:
+            calls.append((user_id, '/games/place-bet', {
+                'roulette_id': roulette_id, 'bet_amount': amount, 'bet_type': 'survival'}, -amount))
+
+    def call(user_id, url, payload, delta):
+        response = app.test_client().post(url, json=payload, headers=headers[user_id])
+        body = response.get_json()
+        if response.status_code == 400:
+            assert 'Insufficient' in str(body)
+            return user_id, 0.0, None
+        assert response.status_code == 200, body
+        if delta is None:
+            delta = body['win_amount'] - payload['bet_amount']
+        return user_id, delta, body['new_balance']
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda args: call(*args), calls))
+
+    expected = dict.fromkeys(users, START)
+    for user_id, delta, new_balance in results:
+        expected[user_id] += delta
+        assert new_balance is None or new_balance >= 0
+
+    from models import BetHistory, Transaction, User
+
+    with app.app_context():
+        for user_id in users:
+            balance = db.session.get(User, user_id).balance
+            transactions = db.session.query(db.func.coalesce(db.func.sum(db.case(
+                (Transaction.type == 'deposit', Transaction.amount), else_=-Transaction.amount)), 0.0)) \
+                .filter(Transaction.user_id == user_id).scalar()
+            # Open roulette bets have only been debited so far
+            bets = db.session.query(db.func.coalesce(db.func.sum(db.case(
+                (BetHistory.status == 'active', -BetHistory.bet_amount), else_=BetHistory.net_result)), 0.0)) \
+                .filter(BetHistory.user_id == user_id).scalar()
+            assert balance >= 0
+            assert balance == pytest.approx(expected[user_id])
+            assert balance == pytest.approx(START + transactions + bets)
+
+
+@pytest.mark.parametrize('bet_amount', [0, -5, '10', None, True, [5]])
+def test_place_bet_rejects_invalid_amount(app, client, users, auth, game_ids, start_round, bet_amount):
+    from models import BetHistory, User
+
+    response = client.post('/rooms/create', json={'game_id': game_ids['roulette']}, headers=auth(users[0]))
+    roulette_id = start_round(response.get_json()['room_id'], users[:1])
+    response = client.post('/games/place-bet', headers=auth(users[0]), json={
+        'roulette_id': roulette_id, 'bet_amount': bet_amount, 'bet_type': 'survival'})
+    assert response.status_code == 400
+    assert response.get_json() == {'msg': 'Invalid bet amount'}
+    with app.app_context():
+        assert db.session.get(User, users[0]).balance == START
+        assert BetHistory.query.count() == 0
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from extensions import db
+from models import Transaction, User
+from profiles import balance_changed
+
+
+class WalletError(Exception):
+    pass
+
+
+class UserNotFound(WalletError):
+    pass
+
+
+class InsufficientFunds(WalletError):
+    pass
+
+
+def adjust_balance(user_id, delta, required=None):
+    """Add delta to a user's balance in one conditional UPDATE ... RETURNING.
+
+    The update only applies if the balance is at least ``required`` (by
+    default the amount being debited), so concurrent requests can neither
+    lose updates nor overdraw. Returns the new balance; raises UserNotFound
+    or InsufficientFunds when no row was updated. Commit is up to the caller,
+    so the change lands in the same transaction as the rows that explain it.
+    """
+    if required is None:
+        required = max(-delta, 0)
+    balance = db.func.coalesce(User.balance, 0.0)
+
+    stmt = db.update(User).where(User.id == user_id)
+    if required > 0:
+        stmt = stmt.where(balance >= required)
+    stmt = stmt.values(balance=balance + delta, updated_at=datetime.utcnow()) \
+        .returning(User.balance) \
+        .execution_options(synchronize_session=False)
+
+    new_balance = db.session.execute(stmt).scalar()
+    if new_balance is None:
+        if db.session.query(User.id).filter(User.id == user_id).first() is None:
+            raise UserNotFound(user_id)
+        raise InsufficientFunds(user_id)
+    balance_changed([user_id])
+    return new_balance
+
+
+def credit_many(amounts):
+    """Credit many users in one UPDATE ... FROM.
+
+    ``amounts`` is a SELECT with user_id and amount columns; rows for the
+    same user are added up first.
+    """
+    rows = amounts.subquery()
+    per_user = db.select(rows.c.user_id, db.func.sum(rows.c.amount).label('amount')) \
+        .group_by(rows.c.user_id) \
+        .subquery()
+    credited = db.session.execute(
+        db.update(User)
+        .where(User.id == per_user.c.user_id)
+        .values(balance=db.func.coalesce(User.balance, 0.0) + per_user.c.amount, updated_at=datetime.utcnow())
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    balance_changed(credited)
+
+
+def deposit(user_id, amount):
+    """Credit amount and record a completed deposit transaction."""
+    new_balance = adjust_balance(user_id, amount)
+    db.session.add(Transaction(user_id=user_id, type='deposit', amount=amount, status='completed'))
+    return new_balance
+
+
+def withdraw(user_id, amount):
+    """Debit amount if the balance covers it and record the withdrawal."""
+    new_balance = adjust_balance(user_id, -amount)
+    db.session.add(Transaction(user_id=user_id, type='withdraw', amount=amount, status='completed'))
+    return new_balance
@@ -0,0 +1,118 @@
+import math
+import random
+import threading
+
+import numpy as np
+
+# Default Spin and Win wheel, used by games without a paytable of their own:
+# (payout multiplier of the stake, probability)
+SEGMENTS = (
+    (0.0, 0.6),   # Lose
+    (1.0, 0.2),   # Break even
+    (2.0, 0.15),  # 2x
+    (5.0, 0.05),  # 5x
+)
+
+
+class InvalidPaytable(ValueError):
+    pass
+
+
+def _number(value, what):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+        raise InvalidPaytable(f"{what} must be a finite number >= 0, got {value!r}")
+    return float(value)
+
+
+class Paytable:
+    """A wheel compiled into Vose alias tables.
+
+    Drawing a segment costs one uniform index plus one coin flip whatever
+    the number of segments, instead of a scan over cumulative probabilities.
+    Instances are immutable and safe to share between threads.
+    """
+
+    TOLERANCE = 1e-9
+
+    def __init__(self, segments):
+        segments = [(_number(m, 'multiplier'), _number(p, 'probability')) for m, p in segments]
+        if not segments:
+            raise InvalidPaytable("paytable has no segments")
+        # A segment that can never come up is almost certainly a typo
+        if any(p == 0 for _, p in segments):
+            raise InvalidPaytable("every segment needs a probability > 0")
+        total = math.fsum(p for _, p in segments)
+        if abs(total - 1.0) > self.TOLERANCE:
+            raise InvalidPaytable(f"probabilities sum to {total!r}, not 1")
+
+        self.segments = tuple(segments)
+        self.rtp = math.fsum(m * p for m, p in segments)
+
+        n = len(segments)
+        scaled = [p * n / total for _, p in segments]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, q in enumerate(scaled) if q < 1.0]
+        large = [i for i, q in enumerate(scaled) if q >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s], alias[s] = scaled[s], l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left is 1 up to rounding error and keeps prob 1.0
+
+        self._multipliers = [m for m, _ in segments]
+        self._prob = prob
+        self._alias = alias
+        self._np_multipliers = np.array(self._multipliers)
+        self._np_prob = np.array(prob)
+        self._np_alias = np.array(alias)
+
+    @classmethod
+    def from_json(cls, data):
+        """Build from a list of {"multiplier": ..., "probability": ...}."""
+        if not isinstance(data, list):
+            raise InvalidPaytable("paytable must be a list of segments")
+        try:
+            return cls((segment['multiplier'], segment['probability']) for segment in data)
+        except (KeyError, TypeError) as e:
+            raise InvalidPaytable("every segment needs a multiplier and a probability") from e
+
+    def to_json(self):
+        return [{'multiplier': m, 'probability': p} for m, p in self.segments]
+
+    def spin(self, rng=random):
+        """Payout multiplier of one spin."""
+        i = rng.randrange(len(self._prob))
+        return self._multipliers[i] if rng.random() < self._prob[i] else self._multipliers[self._alias[i]]
+
+    def draw(self, count, rng=None):
+        """Payout multipliers of ``count`` independent spins as a NumPy array."""
+        rng = rng or np.random.default_rng()
+        i = rng.integers(len(self._prob), size=count)
+        picked = np.where(rng.random(count) < self._np_prob[i], i, self._np_alias[i])
+        return self._np_multipliers[picked]
+
+
+DEFAULT_PAYTABLE = Paytable(SEGMENTS)
+
+_compiled = {}  # game id -> (updated_at, Paytable)
+_compiled_lock = threading.Lock()
+
+
+def paytable_for(game):
+    """Compiled paytable of a catalog game, rebuilt only when the game changes."""
+    if not game.paytable:
+        return DEFAULT_PAYTABLE
+    cached = _compiled.get(game.id)
+    if cached is not None and cached[0] == game.updated_at:
+        return cached[1]
+    paytable = Paytable.from_json(game.paytable)
+    with _compiled_lock:
+        _compiled[game.id] = (game.updated_at, paytable)
+    return paytable
+
+
+def result_label(multiplier):
+    """The spin_and_win.result text for a multiplier, e.g. "2.0x"."""
+    return f"{float(multiplier)}x"